@@ -16,6 +16,7 @@ from django.contrib.auth import get_user_model
 from django.contrib.sessions.models import Session
 from analytics.models import SystemHealthLog, PDFGenerationLog
 from processos.models import Processo
+from processos.services.pdf_scratch import scratch_space
 from pacientes.models import Paciente
 
 
@@ -121,6 +122,7 @@ def measure_pdf_memory_usage():
             details={
                 'percent_used': round(percent_used, 2),
                 'path_checked': shm_path if os.path.exists(shm_path) else 'system_memory',
+                'scratch': get_pdf_scratch_usage(),
                 'timestamp': timezone.now().isoformat()
             }
         )
@@ -140,6 +142,20 @@ def measure_pdf_memory_usage():
         return 0
 
 
+def get_pdf_scratch_usage():
+    """
+    Get the PDF scratch quota usage shared by all workers (see processos.services.pdf_scratch)
+    
+    Returns:
+        dict: current_bytes, peak_bytes, rejected (reservations sent to disk),
+        reservations and quota_bytes
+    """
+    try:
+        return scratch_space.stats()
+    except Exception as e:
+        return {'error': str(e)}
+
+
 def measure_api_response_time():
     """
     Measure API response time by timing a simple view operation
@@ -297,6 +313,7 @@ def collect_all_health_metrics():
     metrics = {
         'database_performance': measure_database_performance(),
         'pdf_memory_usage': measure_pdf_memory_usage(),
+        'pdf_scratch': get_pdf_scratch_usage(),
         'api_response_time': measure_api_response_time(),
         'error_rate': calculate_error_rate(),
         'active_users': get_active_users_count(),
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-17 03:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0002_make_user_nullable_in_activity_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfgenerationlog',
+            name='stage_timings',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='pdfgenerationlog',
+            name='template_count',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
@@ -19,6 +19,9 @@ class PDFGenerationLog(models.Model):
     generated_at = models.DateTimeField(default=timezone.now)
     generation_time_ms = models.IntegerField(null=True, blank=True)  # Time taken to generate
     file_size_bytes = models.IntegerField(null=True, blank=True)
+    template_count = models.IntegerField(null=True, blank=True)
+    # Per-stage timings: [{"stage": "fill", "ms": 41.2, "template": "sadt.pdf", ...}, ...]
+    stage_timings = models.JSONField(default=list, blank=True)
     success = models.BooleanField(default=True)
     error_message = models.TextField(blank=True)
     
@@ -6,7 +6,8 @@ from django.utils import timezone
 from django.contrib.auth import get_user_model
 from django.conf import settings
 from analytics.models import UserActivityLog, PDFGenerationLog
-from processos.models import Processo
+from processos.models import Doenca, Processo
+from processos.services.pdf_spans import PDFSpanRecorder, recording
 import logging
 
 logger = logging.getLogger(__name__)
@@ -138,9 +139,84 @@ def log_user_signup(sender, instance, created, **kwargs):
 # Patient and Process metrics are calculated via management command, not signals
 
 
+def _pdf_generation_targets(processo, processo_id, cid):
+    """Resolve the processo/paciente/doenca/clinica ids a PDF generation log row points to."""
+    if processo is None and processo_id:
+        processo = Processo.objects.filter(pk=processo_id).first()
+    if processo is not None:
+        return {
+            'processo_id': processo.pk,
+            'paciente_id': processo.paciente_id,
+            'doenca_id': processo.doenca_id,
+            'clinica_id': processo.clinica_id,
+        }
+    doenca_id = Doenca.objects.filter(cid=cid).values_list('pk', flat=True).first() if cid else None
+    return {'doenca_id': doenca_id}
+
+
+def persist_pdf_spans(spans: PDFSpanRecorder):
+    """
+    Store the spans recorded after track_pdf_generation returned (streamed
+    fills, saving the response) with the generation's log row.
+    """
+    if not spans.log_id:
+        return
+    try:
+        PDFGenerationLog.objects.filter(pk=spans.log_id).update(
+            stage_timings=spans.spans,
+            file_size_bytes=spans.attributes.get('file_size_bytes'),
+            template_count=spans.attributes.get('template_count'),
+        )
+    except Exception as e:
+        logger.error(f"Error updating PDF generation spans: {e}")
+
+
+def log_batch_pdf_generation(user, processo_ids, errors, spans: PDFSpanRecorder, generation_time_ms, pdf_type='renewal'):
+    """
+    Log a merged batch generation (PrescriptionPDFService.generate_batch_pdf)
+    as one PDFGenerationLog row per processo.
+
+    The rows share the batch's spans and total time; file size is left empty
+    since a merged PDF cannot be split per document. errors holds one error
+    message per processo, None for the ones generated.
+    """
+    if not user:
+        logger.warning(f"PDF generation tracking skipped - no user found for {pdf_type} batch")
+        return
+    try:
+        targets = {
+            row['pk']: row
+            for row in Processo.objects.filter(pk__in=processo_ids).values('pk', 'paciente_id', 'doenca_id', 'clinica_id')
+        }
+        PDFGenerationLog.objects.bulk_create([
+            PDFGenerationLog(
+                user=user,
+                processo_id=processo_id if processo_id in targets else None,
+                paciente_id=targets.get(processo_id, {}).get('paciente_id'),
+                doenca_id=targets.get(processo_id, {}).get('doenca_id'),
+                clinica_id=targets.get(processo_id, {}).get('clinica_id'),
+                generation_time_ms=generation_time_ms,
+                stage_timings=spans.spans,
+                success=error is None,
+                error_message=error or '',
+                pdf_type=pdf_type,
+            )
+            for processo_id, error in zip(processo_ids, errors)
+        ])
+    except Exception as e:
+        logger.error(f"Error tracking batch PDF generation: {e}")
+
+
 # PDF generation tracking will be done via decorator
 def track_pdf_generation(pdf_type='prescription'):
-    """Decorator to track PDF generation"""
+    """
+    Decorator to track PDF generation.
+
+    The decorated call runs inside a span recording (processos.services.pdf_spans):
+    stage timings, template count and output size are stored with the log row.
+    Returned responses carry the recorder as response.pdf_spans so later
+    stages can be added with persist_pdf_spans.
+    """
     def decorator(func):
         def wrapper(*args, **kwargs):
             start_time = time.time()
@@ -172,7 +248,8 @@ def track_pdf_generation(pdf_type='prescription'):
             result = None
             
             try:
-                result = func(*args, **kwargs)
+                with recording() as spans:
+                    result = func(*args, **kwargs)
             except Exception as e:
                 success = False
                 error_message = str(e)
@@ -185,11 +262,11 @@ def track_pdf_generation(pdf_type='prescription'):
                     if user:
                         log_entry = PDFGenerationLog.objects.create(
                             user=user,
-                            processo=processo,
-                            paciente=processo.paciente if processo else None,
-                            doenca=processo.doenca if processo else None,
-                            clinica=processo.emissor.clinica if processo and processo.emissor else None,
+                            **_pdf_generation_targets(processo, kwargs.get('processo_id'), spans.attributes.get('cid')),
                             generation_time_ms=generation_time_ms,
+                            file_size_bytes=spans.attributes.get('file_size_bytes'),
+                            template_count=spans.attributes.get('template_count'),
+                            stage_timings=spans.spans,
                             success=success,
                             error_message=error_message or '',
                             pdf_type=pdf_type,
@@ -197,6 +274,10 @@ def track_pdf_generation(pdf_type='prescription'):
                             user_agent=get_user_agent(request) if request else ''
                         )
                         
+                        spans.log_id = log_entry.pk
+                        if result is not None and hasattr(result, 'status_code'):
+                            result.pdf_spans = spans
+                        
                         # Note: Daily PDF metrics updated via management command, not real-time
                     else:
                         logger.warning(f"PDF generation tracking skipped - no user found for {pdf_type}")
@@ -183,12 +183,13 @@ CACHES = {
         }
     },
     'pdf_cache': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'pdf-cache',
+        # Content-addressed generated PDFs, on tmpfs so every uwsgi worker shares them
+        'BACKEND': 'processos.services.pdf_cache.SharedLRUFileCache',
+        'LOCATION': os.environ.get('PDF_CACHE_DIR', '/dev/shm/autocusto_pdf_cache'),
         'TIMEOUT': 300,   # 5 minutes - short-lived for immediate serving
         'OPTIONS': {
             'MAX_ENTRIES': 100,   # Small cache for immediate PDF serving
-            'CULL_FREQUENCY': 2,  # Quick cleanup when full
+            'CULL_FREQUENCY': 4,  # Evict the least recently used quarter when full
         }
     }
 }
@@ -209,6 +210,19 @@ MESSAGE_TAGS = {
 LOGIN_REDIRECT_URL = "home"
 LOGIN_URL = "login-redirect"
 
+# Prescription forms
+# Build the protocol form classes in the uwsgi master (shared by workers); needs REFERENCE_DATA_CACHE_ENABLED
+PROTOCOL_FORM_PRELOAD = os.environ.get('PROTOCOL_FORM_PRELOAD', 'True').lower() == 'true'
+
+# Reference data: per-worker snapshot of diseases, protocols and medications (processos.services.reference_data)
+REFERENCE_DATA_CACHE_ENABLED = os.environ.get('REFERENCE_DATA_CACHE_ENABLED', 'True').lower() == 'true'
+# Generation bumped on every edit, shared by all uwsgi workers (tmpfs)
+REFERENCE_DATA_GENERATION_FILE = os.environ.get('REFERENCE_DATA_GENERATION_FILE', '/dev/shm/autocusto_reference_generation')
+REFERENCE_DATA_CHECK_SECONDS = float(os.environ.get('REFERENCE_DATA_CHECK_SECONDS', '1'))  # Max staleness after an edit
+# Disease autocomplete (processos.services.disease_search): results per query and browser cache lifetime
+DISEASE_SEARCH_LIMIT = int(os.environ.get('DISEASE_SEARCH_LIMIT', '20'))
+DISEASE_SEARCH_MAX_AGE = int(os.environ.get('DISEASE_SEARCH_MAX_AGE', '300'))  # Seconds
+
 # PDFs
 
 def get_static_path(*args):
@@ -223,6 +237,71 @@ PATH_RELATORIO = get_static_path("processos", "relatorio_modelo.pdf")
 PATH_EXAMES = get_static_path("processos", "sadt.pdf")
 PATH_PDF_DIR = get_static_path("protocolos")
 
+# PDF fill backend: "pypdf" fills in-process, "pdftk" forks the pdftk binary
+PDF_FILL_BACKEND = os.environ.get('PDF_FILL_BACKEND', 'pypdf')
+# Parse every PDF template in the uwsgi master (shared copy-on-write by workers)
+PDF_TEMPLATE_PRELOAD = os.environ.get('PDF_TEMPLATE_PRELOAD', 'True').lower() == 'true'
+# Opt-in parallel template filling in a forked process pool (pypdf backend only)
+PDF_PARALLEL_FILL = os.environ.get('PDF_PARALLEL_FILL', 'False').lower() == 'true'
+PDF_PARALLEL_POOL_SIZE = int(os.environ.get('PDF_PARALLEL_POOL_SIZE', '2'))  # Fill processes per uwsgi worker thread
+PDF_PARALLEL_PER_REQUEST = int(os.environ.get('PDF_PARALLEL_PER_REQUEST', '3'))  # Templates in flight per document
+PDF_PARALLEL_GLOBAL_LIMIT = int(os.environ.get('PDF_PARALLEL_GLOBAL_LIMIT', '4'))  # Templates in flight across all workers
+PDF_PARALLEL_TIMEOUT = int(os.environ.get('PDF_PARALLEL_TIMEOUT', '30'))  # Seconds before a hung pool is killed
+# Global fill slots held by each uwsgi worker (tmpfs), reclaimed when a worker dies
+PDF_PARALLEL_SLOTS_FILE = os.environ.get('PDF_PARALLEL_SLOTS_FILE', '/dev/shm/autocusto_fill_slots.sqlite3')
+# pdftk runs (pdftk backend and fallbacks) are killed, with their process group, after this many seconds
+PDF_PDFTK_TIMEOUT = int(os.environ.get('PDF_PDFTK_TIMEOUT', '30'))
+# JAVA_TOOL_OPTIONS for pdftk-java: fast JVM start-up for short-lived pdftk runs
+PDF_PDFTK_JAVA_OPTIONS = os.environ.get(
+    'PDF_PDFTK_JAVA_OPTIONS', '-XX:TieredStopAtLevel=1 -XX:+UseSerialGC -Xshare:auto'
+)
+# tmpfs scratch files (pdftk fills/concats, qpdf rewrites) are reserved against a quota shared by
+# all workers; when it is reached a fill writes to disk (after waiting up to PDF_SCRATCH_WAIT_SECONDS
+# for space, 0: no wait)
+PDF_SCRATCH_DIR = os.environ.get('PDF_SCRATCH_DIR', '/dev/shm/autocusto_scratch')
+PDF_SCRATCH_QUOTA_BYTES = int(os.environ.get('PDF_SCRATCH_QUOTA_BYTES', str(64 * 1024 * 1024)))  # 0: unbounded
+PDF_SCRATCH_WAIT_SECONDS = float(os.environ.get('PDF_SCRATCH_WAIT_SECONDS', '0'))
+PDF_SCRATCH_FALLBACK_DIR = os.environ.get('PDF_SCRATCH_FALLBACK_DIR', '/tmp')
+# Reuse identical prescriptions from the 'pdf_cache' alias instead of regenerating them
+PDF_RESULT_CACHE_ENABLED = os.environ.get('PDF_RESULT_CACHE_ENABLED', 'True').lower() == 'true'
+# Fields whose values are per-doctor/clinic constants: templates filled only with
+# these (or without fields, e.g. most consent forms) are flattened once per worker
+PDF_STATIC_FIELDS = frozenset({
+    'nome_medico', 'crm_medico', 'cns_medico', 'crm',
+    'nome_clinica', 'cns_clinica', 'end_clinica', 'endereco_clinica',
+    'cidade_clinica', 'cep_clinica', 'telefone_clinica',
+})
+PDF_STATIC_CACHE_SIZE = int(os.environ.get('PDF_STATIC_CACHE_SIZE', '64'))  # Flattened renditions per worker
+# Linearize ("fast web view") generated PDFs with qpdf so viewers render page 1 while
+# the rest downloads; static protocols are linearized by `manage.py linearize_protocols`
+PDF_LINEARIZE = os.environ.get('PDF_LINEARIZE', 'False').lower() == 'true'
+PDF_QPDF_BINARY = os.environ.get('PDF_QPDF_BINARY', 'qpdf')
+PDF_LINEARIZE_TIMEOUT = int(os.environ.get('PDF_LINEARIZE_TIMEOUT', '30'))  # Seconds per qpdf run
+# Store fonts/images shared by merged templates once (pypdf merge)
+PDF_DEDUPLICATE_RESOURCES = os.environ.get('PDF_DEDUPLICATE_RESOURCES', 'True').lower() == 'true'
+# Pack generated PDFs into compressed object streams with an xref stream (qpdf)
+PDF_OBJECT_STREAMS = os.environ.get('PDF_OBJECT_STREAMS', 'False').lower() == 'true'
+# Write generated PDFs to their storage file as each template is filled (pypdf backend).
+# Lowers peak memory only: the link is returned once the whole file is written. Streamed
+# output skips linearization, object streams and cross-document resource deduplication
+PDF_STREAMING_OUTPUT = os.environ.get('PDF_STREAMING_OUTPUT', 'False').lower() == 'true'
+# Queue PDF generation for AJAX prescription/renewal requests instead of blocking the
+# uwsgi worker; requires `python manage.py process_pdf_jobs` running alongside uwsgi
+PDF_ASYNC_GENERATION = os.environ.get('PDF_ASYNC_GENERATION', 'False').lower() == 'true'
+PDF_BATCH_RENEWAL_MAX = int(os.environ.get('PDF_BATCH_RENEWAL_MAX', '50'))  # Processes per batch renewal request
+# Generated PDFs are stored under opaque ids and served through signed links valid for this long
+PDF_OUTPUT_DIR = os.environ.get('PDF_OUTPUT_DIR', '/tmp')
+PDF_LINK_TTL_SECONDS = int(os.environ.get('PDF_LINK_TTL_SECONDS', '900'))
+# Expired files are reaped in-process (see GeneratedPDFStore); least recently used files
+# are evicted beyond this many bytes
+PDF_OUTPUT_MAX_BYTES = int(os.environ.get('PDF_OUTPUT_MAX_BYTES', str(100 * 1024 * 1024)))
+PDF_REAP_INTERVAL_SECONDS = int(os.environ.get('PDF_REAP_INTERVAL_SECONDS', '30'))  # Per worker process
+# Directory of the generated file indexes: kept out of PDF_OUTPUT_DIR, which nginx aliases
+PDF_OUTPUT_INDEX_DIR = os.environ.get('PDF_OUTPUT_INDEX_DIR', '/dev/shm/autocusto_pdf_index')
+# Internal nginx location aliasing PDF_OUTPUT_DIR (e.g. "/protected-pdf/"): Django authorizes the
+# download and nginx sends the file via X-Accel-Redirect. Empty: stream it with FileResponse
+PDF_ACCEL_REDIRECT_PREFIX = os.environ.get('PDF_ACCEL_REDIRECT_PREFIX', '')
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 
@@ -472,7 +551,7 @@ else:
 
 # Django-crontab configuration
 CRONJOBS = [
-    ('0 3 * * *', 'django.core.management.call_command', ['cleanup_pdfs']),
+    ('0 3 * * *', 'django.core.management.call_command', ['cleanup_pdfs']),  # Legacy pdf_final_* files
     ('0 2 * * *', 'django.core.management.call_command', ['dbbackup']),
     ('15 2 * * *', 'django.core.management.call_command', ['upload_backup']),
     ('30 1 * * *', 'django.core.management.call_command', ['calculate_daily_metrics']),
@@ -15,3 +15,27 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "autocusto.settings")
 
 # English: application
 application = get_wsgi_application()
+
+# Parse PDF templates before uwsgi forks so every worker shares them copy-on-write
+from django.conf import settings
+
+if settings.PDF_TEMPLATE_PRELOAD:
+    from processos.services.pdf_templates import template_registry
+    template_registry.warm()
+
+if settings.REFERENCE_DATA_CACHE_ENABLED:
+    # Load the reference data snapshot and build the protocol form classes once
+    # for all workers; the master's database connection must not be inherited
+    # by the forked workers
+    from django.db import connections
+    from processos.forms.form_factories import form_classes
+    from processos.services.disease_search import disease_search
+    try:
+        disease_search.index()  # Loads the snapshot
+        if settings.PROTOCOL_FORM_PRELOAD:
+            form_classes.prebuild()
+    except Exception as e:
+        import logging
+        logging.getLogger('processos').warning(f"Reference data preload skipped: {e}")
+    finally:
+        connections.close_all()
@@ -1,16 +1,25 @@
-from django.db.models import Q
+from django.conf import settings
 from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
-from .models import Doenca, Protocolo
+from django.utils.cache import get_conditional_response, patch_cache_control, set_response_etag
+from .models import Protocolo
+from .services.disease_search import disease_search
+from .services.reference_data import reference_data
 
 # search_diseases
 def busca_doencas(request):
     """
     AJAX endpoint for disease search functionality.
     
-    Searches diseases by CID code or name using case-insensitive partial matching.
+    Searches diseases by CID code or name using case- and accent-insensitive
+    partial matching, best matches first (see processos.services.disease_search;
+    a plain icontains query in CID order when the reference data snapshot is
+    disabled), at most settings.DISEASE_SEARCH_LIMIT results.
     Used for autocomplete functionality in the prescription forms.
     
+    Responses are cacheable by the browser for DISEASE_SEARCH_MAX_AGE seconds
+    and carry an ETag, so repeated prefixes are not searched again.
+    
     Security: No authorization check needed as this only returns public disease information.
     However, it could be enhanced with rate limiting to prevent abuse.
     """
@@ -21,16 +30,17 @@ def busca_doencas(request):
     if not doenca:
         return JsonResponse([], safe=False)
         
-    # search_results (filtered disease queryset)
-    b = Doenca.objects.filter(Q(cid__icontains=doenca) | Q(nome__icontains=doenca))
     # diseases (list of disease dictionaries for JSON response)
-    doencas = []
-    for r in b:
-        # new_disease (disease dictionary with CID and name)
-        nova_doenca = {"cid": r.cid, "nome": r.nome}
-        doencas.append(nova_doenca)
+    doencas = [
+        {"cid": cid, "nome": nome}
+        for cid, nome in disease_search.search(doenca, settings.DISEASE_SEARCH_LIMIT)
+    ]
 
-    return JsonResponse(doencas, safe=False)
+    response = JsonResponse(doencas, safe=False)
+    # Public reference data: the browser reuses the answer for the same keyword
+    patch_cache_control(response, public=True, max_age=settings.DISEASE_SEARCH_MAX_AGE)
+    set_response_etag(response)
+    return get_conditional_response(request, etag=response["ETag"], response=response)
 
 
 # verify_first_time
@@ -54,7 +64,10 @@ def verificar_1_vez(request):
     
     try:
         # protocol (protocol object associated with the disease)
-        protocolo = Protocolo.objects.get(doenca__cid=cid_recebido)
+        if reference_data.enabled:
+            protocolo = reference_data.get_protocol(cid_recebido)
+        else:
+            protocolo = Protocolo.objects.get(doenca__cid=cid_recebido)
         
         # Check if "1_vez" key exists in conditional data
         if "1_vez" in protocolo.dados_condicionais:
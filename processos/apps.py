@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class ProcessosConfig(AppConfig):
     name = "processos"
+
+    def ready(self):
+        import processos.signals
@@ -1,6 +1,6 @@
 # Import all forms and utilities to maintain backward compatibility
 from .form_utilities import mostrar_med, ajustar_campos_condicionais
-from .validation_forms import PreProcesso, RenovacaoRapidaForm
+from .validation_forms import PreProcesso, RenovacaoRapidaForm, RenovacaoLoteForm
 from .prescription_forms import NovoProcesso, RenovarProcesso
 from .form_factories import extrair_campos_condicionais, fabricar_formulario
 
@@ -10,6 +10,7 @@ __all__ = [
     'ajustar_campos_condicionais', 
     'PreProcesso',
     'RenovacaoRapidaForm',
+    'RenovacaoLoteForm',
     'NovoProcesso',
     'RenovarProcesso',
     'extrair_campos_condicionais',
@@ -4,11 +4,21 @@ Form Factories - Dynamic form generation and field extraction
 This module contains functions for dynamic form creation and field manipulation:
 - fabricar_formulario: Creates dynamic forms based on disease protocols
 - extrair_campos_condicionais: Extracts conditional fields from forms
+
+Form classes are built once per worker and kept in form_classes for the
+Protocolo instance they were built from: the reference data snapshot hands
+out the same instance until it is reloaded after an edit in any worker, so
+a protocol whose "fields" change gets a new class on its next request, in
+every worker. Without the snapshot the protocol is queried on every call
+and its class rebuilt, and nothing is cached.
 """
 
 import logging
-from processos.models import Protocolo
+import threading
+
+from processos.models import Doenca, Protocolo
 from processos.services.pdf_strategies import get_conditional_fields
+from processos.services.reference_data import reference_data
 
 logger = logging.getLogger('processos')
 
@@ -33,13 +43,93 @@ def extrair_campos_condicionais(formulario):
     return campos_condicionais
 
 
+def _build_form_class(modelo_base, protocolo):
+    # Try new data-driven approach first, fallback to empty fields for unmigrated protocols
+    campos = get_conditional_fields(protocolo)
+    if not campos:
+        # Legacy protocols without data-driven configuration will have no conditional fields
+        # This maintains backward compatibility until all protocols are migrated
+        campos = {}
+        logger.debug(f"No conditional fields configured for {protocolo.nome} - protocol needs migration")
+    else:
+        logger.debug(f"Using data-driven conditional fields for {protocolo.nome}")
+
+    # Create dynamic form class with protocol-specific fields
+    # This uses Python's type() function to create a new class at runtime
+    # The resulting class inherits from the base form and adds conditional fields
+    form_class = type("SuperForm", (modelo_base,), campos)
+    form_class.prepare_base_fields()
+    return form_class
+
+
+class FormClassCache:
+    """Per-worker dynamic form classes, keyed by (cid, renovar) (see module docstring)."""
+
+    def __init__(self):
+        self._classes = {}  # (cid, renovar) -> (protocolo, form class)
+        self._lock = threading.Lock()
+
+    def get(self, cid, renovar, protocolo):
+        """Form class of protocolo for cid, built on first use or for a new protocolo instance."""
+        from .prescription_forms import RenovarProcesso, NovoProcesso
+
+        # Select base form based on operation type
+        modelo_base = RenovarProcesso if renovar else NovoProcesso
+        if not reference_data.enabled:
+            # A new protocolo instance per call: a class kept for it would never be used again
+            return _build_form_class(modelo_base, protocolo)
+
+        key = (cid, bool(renovar))
+        entry = self._classes.get(key)
+        if entry is not None and entry[0] is protocolo:
+            return entry[1]
+
+        form_class = _build_form_class(modelo_base, protocolo)
+        with self._lock:
+            self._classes[key] = (protocolo, form_class)
+        logger.debug(f"FormClassCache: Built {modelo_base.__name__} form for CID {cid}")
+        return form_class
+
+    def invalidate(self):
+        """Drop every cached class (rebuilt on next use)."""
+        with self._lock:
+            self._classes.clear()
+
+    def prebuild(self):
+        """
+        Build the new and renewal form classes of every disease with a protocol.
+
+        The classes are kept for the snapshot's protocol instances; without
+        the snapshot they are only built, which validates the configurations.
+
+        Returns:
+            dict: {(cid, renovar): form class}
+        """
+        if reference_data.enabled:
+            protocolos = sorted(reference_data.snapshot().protocols.items())
+        else:
+            doencas = Doenca.objects.filter(protocolo__isnull=False).select_related("protocolo").order_by("cid")
+            protocolos = [(doenca.cid, doenca.protocolo) for doenca in doencas]
+
+        built = {}
+        for cid, protocolo in protocolos:
+            for renovar in (False, True):
+                built[(cid, renovar)] = self.get(cid, renovar, protocolo)
+        return built
+
+
+form_classes = FormClassCache()
+
+
 def fabricar_formulario(cid, renovar):
     """
     Dynamically create form classes based on disease protocol and operation type.
     
     This factory function creates specialized form classes by combining base forms
     with protocol-specific conditional fields. It supports both new prescriptions
-    and renewal operations.
+    and renewal operations. Classes are cached in form_classes; the protocol
+    comes from the reference data snapshot, or its configuration is read from
+    the database when the snapshot is disabled.
     
     Args:
         cid (str): Disease CID code to determine protocol
@@ -49,32 +139,15 @@ def fabricar_formulario(cid, renovar):
         type: Dynamically created form class with protocol-specific fields
     """
     from .prescription_forms import RenovarProcesso, NovoProcesso
-    
-    # Select base form based on operation type
-    if renovar:
-        modelo_base = RenovarProcesso
-    else:
-        modelo_base = NovoProcesso
 
     # Get protocol for the disease
-    try:
-        protocolo = Protocolo.objects.get(doenca__cid=cid)
-    except Protocolo.DoesNotExist:
+    if reference_data.enabled:
+        protocolo = reference_data.snapshot().protocols.get(cid)
+    else:
+        protocolo = Protocolo.objects.filter(doenca__cid=cid).only("nome", "dados_condicionais").first()
+    if protocolo is None:
         logger.warning(f"No protocol found for CID {cid}")
         # Return base form without conditional fields
-        return modelo_base
+        return RenovarProcesso if renovar else NovoProcesso
 
-    # Try new data-driven approach first, fallback to empty fields for unmigrated protocols
-    campos = get_conditional_fields(protocolo)
-    if not campos:
-        # Legacy protocols without data-driven configuration will have no conditional fields
-        # This maintains backward compatibility until all protocols are migrated
-        campos = {}
-        logger.debug(f"No conditional fields configured for {protocolo.nome} - protocol needs migration")
-    else:
-        logger.debug(f"Using data-driven conditional fields for {protocolo.nome}")
-
-    # Create dynamic form class with protocol-specific fields
-    # This uses Python's type() function to create a new class at runtime
-    # The resulting class inherits from the base form and adds conditional fields
-    return type("SuperForm", (modelo_base,), campos)
\ No newline at end of file
+    return form_classes.get(cid, renovar, protocolo)
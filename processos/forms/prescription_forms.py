@@ -7,9 +7,11 @@ This module contains the main prescription forms with simplified validation logi
 """
 
 import logging
+import threading
 from django import forms
 from django.db import transaction
 from django.forms.models import model_to_dict
+from django.forms.forms import DeclarativeFieldsMetaclass
 from processos.models import Processo, Doenca
 from clinicas.models import Emissor
 from .form_validators import MedicationValidator
@@ -21,8 +23,112 @@ logger = logging.getLogger('processos')
 # Constants for form choices
 REPETIR_ESCOLHAS = [(True, "Sim"), (False, "Não")]
 
+# Serializes the one-time styling of a form class's base_fields
+_prepare_lock = threading.Lock()
 
-class NovoProcesso(PrescriptionBaseMixin, forms.Form):
+
+def _form_helper():
+    """Crispy helper of a prescription form instance."""
+    helper = FormHelper()
+    helper.form_method = "POST"
+    helper.attrs = {'novalidate': True}
+    helper.form_show_errors = False  # Don't show inline error messages
+    helper.error_text_inline = False  # Don't show error text but keep visual indicators
+    helper.form_tag = False  # Don't wrap in form tags since we're using individual fields
+    return helper
+
+
+def _medication_fields():
+    """
+    Generates the medication-related form fields of NovoProcesso to eliminate code duplication.
+    
+    This function creates a comprehensive set of medication fields for up to 4 different medications,
+    each with 6 months of dosage tracking. The dynamic approach prevents hundreds of lines of
+    repetitive field definitions while maintaining flexibility for different medication scenarios.
+    
+    Field Structure per medication:
+    - id_med{i}: Medication selection dropdown
+    - med{i}_repetir_posologia: Whether to repeat the same dosage across months
+    - med{i}_posologia_mes{month}: Dosage instructions for each month (1-6)
+    - qtd_med{i}_mes{month}: Quantity needed for each month (1-6)
+    
+    Business Rules:
+    - Only med1 fields are required (Brazilian regulations require at least one medication)
+    - med2-4 are optional for combination therapies
+    - 6-month tracking aligns with Brazilian prescription renewal cycles
+    """
+    campos = {}
+    # Generate fields for up to 4 different medications
+    for i in range(1, 5):
+        # Medication selection dropdown - populated later with available medications
+        campos[f"id_med{i}"] = forms.ChoiceField(
+            widget=forms.Select(attrs={"class": "custom-select"}),
+            choices=[],  # Populated in NovoProcesso.__init__ with actual medication options
+            label="Nome",
+            error_messages={'required': 'Por favor, selecione um medicamento.'}
+        )
+        
+        # Dosage repetition control - determines if same dosage applies to all months
+        campos[f"med{i}_repetir_posologia"] = forms.ChoiceField(
+            required=True,
+            initial=True,  # Default to repeating dosage (most common case)
+            choices=REPETIR_ESCOLHAS,
+            label="Repetir posologia?",
+            widget=forms.Select(attrs={"class": "custom-select"}),
+            error_messages={'required': 'Por favor, selecione uma opção.'}
+        )
+        
+        # Generate dosage and quantity fields for 6-month prescription cycle
+        for month in range(1, 7):
+            # Business rule: Only first medication (med1) is mandatory
+            is_required = (i == 1)
+            
+            # Dosage instructions for each month
+            campos[f"med{i}_posologia_mes{month}"] = forms.CharField(
+                required=is_required,
+                label="Posologia",
+                error_messages={'required': 'Por favor, insira a posologia.'}
+            )
+            
+            # Quantity needed for each month
+            campos[f"qtd_med{i}_mes{month}"] = forms.CharField(
+                required=is_required,
+                label=f"Qtde. {month} mês",
+                error_messages={'required': 'Por favor, insira a quantidade.'}
+            )
+    
+    # Administration route field - only needed for the primary medication
+    campos["med1_via"] = forms.CharField(
+        required=True,
+        label="Via administração",
+        error_messages={'required': 'Por favor, insira a via de administração.'}
+    )
+    return campos
+
+
+class MedicationFieldsMetaclass(DeclarativeFieldsMetaclass):
+    """
+    Declares the medication block (_medication_fields) on every prescription form class.
+
+    Each class gets its own field instances, after the fields it declares or
+    inherits (the order the forms always had), so classes built at runtime
+    by fabricar_formulario never share or mutate their parent's fields.
+    """
+
+    def __new__(mcs, name, bases, attrs):
+        new_class = super().__new__(mcs, name, bases, attrs)
+        medication_fields = _medication_fields()
+        declared_fields = {
+            field_name: field for field_name, field in new_class.declared_fields.items()
+            if field_name not in medication_fields
+        }
+        declared_fields.update(medication_fields)
+        new_class.base_fields = declared_fields
+        new_class.declared_fields = declared_fields
+        return new_class
+
+
+class NovoProcesso(PrescriptionBaseMixin, forms.Form, metaclass=MedicationFieldsMetaclass):
     """
     New prescription form with simplified validation and extracted business logic.
     
@@ -31,94 +137,40 @@ class NovoProcesso(PrescriptionBaseMixin, forms.Form):
     """
     
     def __init__(self, escolhas, medicamentos, *args, **kwargs):
+        # Fields and widget attributes are prepared once per class;
+        # an instance only deep-copies base_fields and sets its choices
+        type(self).prepare_base_fields()
         super(NovoProcesso, self).__init__(*args, **kwargs)
-        
-        # Dynamically create medication fields to avoid repetition
-        self._create_medication_fields()
-        
-        self.helper = FormHelper()
-        self.helper.form_method = "POST"
-        self.helper.attrs = {'novalidate': True}
-        self.helper.form_show_errors = False  # Don't show inline error messages
-        self.helper.error_text_inline = False  # Don't show error text but keep visual indicators
-        self.helper.form_tag = False  # Don't wrap in form tags since we're using individual fields
-        
-        # Apply form-control to all fields by default and ensure proper error styling
-        for field_name, field in self.fields.items():
-            if not isinstance(field.widget, (forms.CheckboxInput, forms.RadioSelect, forms.ClearableFileInput)):
-                field.widget.attrs['class'] = field.widget.attrs.get('class', '') + ' form-control'
-            # Ensure field supports error styling
-            field.widget.attrs['data-crispy-field'] = 'true'
 
+        self.helper = _form_helper()
         self.fields["clinicas"].choices = escolhas
         for i in range(1, 5):
             self.fields[f"id_med{i}"].choices = medicamentos
         self.request = kwargs.pop("request", None)
-    
-    def _create_medication_fields(self):
+
+    @classmethod
+    def prepare_base_fields(cls):
         """
-        Dynamically generates medication-related form fields to eliminate code duplication.
-        
-        This method creates a comprehensive set of medication fields for up to 4 different medications,
-        each with 6 months of dosage tracking. The dynamic approach prevents hundreds of lines of
-        repetitive field definitions while maintaining flexibility for different medication scenarios.
-        
-        Field Structure per medication:
-        - id_med{i}: Medication selection dropdown
-        - med{i}_repetir_posologia: Whether to repeat the same dosage across months
-        - med{i}_posologia_mes{month}: Dosage instructions for each month (1-6)
-        - qtd_med{i}_mes{month}: Quantity needed for each month (1-6)
-        
-        Business Rules:
-        - Only med1 fields are required (Brazilian regulations require at least one medication)
-        - med2-4 are optional for combination therapies
-        - 6-month tracking aligns with Brazilian prescription renewal cycles
+        Apply the form styling to the class's base_fields, once per class.
+
+        Subclasses built at runtime (fabricar_formulario) add their conditional
+        fields as declared fields, so they are prepared on first use.
         """
-        # Generate fields for up to 4 different medications
-        for i in range(1, 5):
-            # Medication selection dropdown - populated later with available medications
-            self.fields[f"id_med{i}"] = forms.ChoiceField(
-                widget=forms.Select(attrs={"class": "custom-select"}),
-                choices=[],  # Will be populated in __init__ with actual medication options
-                label="Nome",
-                error_messages={'required': 'Por favor, selecione um medicamento.'}
-            )
-            
-            # Dosage repetition control - determines if same dosage applies to all months
-            self.fields[f"med{i}_repetir_posologia"] = forms.ChoiceField(
-                required=True,
-                initial=True,  # Default to repeating dosage (most common case)
-                choices=REPETIR_ESCOLHAS,
-                label="Repetir posologia?",
-                widget=forms.Select(attrs={"class": "custom-select"}),
-                error_messages={'required': 'Por favor, selecione uma opção.'}
-            )
-            
-            # Generate dosage and quantity fields for 6-month prescription cycle
-            for month in range(1, 7):
-                # Business rule: Only first medication (med1) is mandatory
-                is_required = (i == 1)
-                
-                # Dosage instructions for each month
-                self.fields[f"med{i}_posologia_mes{month}"] = forms.CharField(
-                    required=is_required,
-                    label="Posologia",
-                    error_messages={'required': 'Por favor, insira a posologia.'}
-                )
-                
-                # Quantity needed for each month
-                self.fields[f"qtd_med{i}_mes{month}"] = forms.CharField(
-                    required=is_required,
-                    label=f"Qtde. {month} mês",
-                    error_messages={'required': 'Por favor, insira a quantidade.'}
-                )
-        
-        # Administration route field - only needed for the primary medication
-        self.fields["med1_via"] = forms.CharField(
-            required=True,
-            label="Via administração",
-            error_messages={'required': 'Por favor, insira a via de administração.'}
-        )
+        if cls.__dict__.get("_base_fields_prepared"):
+            return
+        with _prepare_lock:
+            if cls.__dict__.get("_base_fields_prepared"):
+                return
+            # Apply form-control to all fields by default and ensure proper error styling
+            for field in cls.base_fields.values():
+                if not isinstance(field.widget, (forms.CheckboxInput, forms.RadioSelect, forms.ClearableFileInput)):
+                    css_classes = field.widget.attrs.get('class', '')
+                    # Inherited declared fields are shared with the parent class, which may have styled them already
+                    if 'form-control' not in css_classes.split():
+                        field.widget.attrs['class'] = css_classes + ' form-control'
+                # Ensure field supports error styling
+                field.widget.attrs['data-crispy-field'] = 'true'
+            cls._base_fields_prepared = True
 
     # Patient data fields
     cpf_paciente = forms.CharField(
@@ -421,4 +473,9 @@ class RenovarProcesso(NovoProcesso):
         # Partial renewal - update only the date  
         # Use ProcessRepository for quick date update instead of direct database operations
         registration_service = ProcessService()
-        registration_service.update_process_date_only(processo_id, dados['data_1'], meds_ids)
\ No newline at end of file
+        registration_service.update_process_date_only(processo_id, dados['data_1'], meds_ids)
+
+
+NovoProcesso.prepare_base_fields()
+RenovarProcesso.prepare_base_fields()
+
@@ -4,9 +4,11 @@ Validation Forms - Simple forms for validation and quick operations
 This module contains straightforward forms focused on specific validation tasks:
 - PreProcesso: CPF and CID validation for process initiation
 - RenovacaoRapidaForm: Quick renewal validation
+- RenovacaoLoteForm: Batch renewal validation
 """
 
 from django import forms
+from django.conf import settings
 from processos.models import Doenca
 from autocusto.validation import isCpfValid
 from crispy_forms.helper import FormHelper
@@ -119,4 +121,49 @@ class RenovacaoRapidaForm(forms.Form):
             raise forms.ValidationError("Data é obrigatória")
         
         # Could add additional date validation here (e.g., not in the past)
-        return nova_data
\ No newline at end of file
+        return nova_data
+
+
+class RenovacaoLoteForm(forms.Form):
+    """
+    Form for batch renewal validation.
+    
+    Several processes are renewed with the same date. Process IDs are sent
+    as repeated processo_ids fields or as one comma-separated value.
+    """
+    processo_ids = forms.CharField(
+        required=True,
+        label="IDs dos Processos",
+        error_messages={'required': 'Selecione ao menos um processo para renovar.'}
+    )
+    data_1 = forms.DateField(
+        required=True,
+        label="Nova Data",
+        widget=forms.DateInput(format="%d/%m/%Y"),
+        input_formats=["%d/%m/%Y"],
+        error_messages={'required': 'Data é obrigatória.'}
+    )
+    
+    def __init__(self, data=None, *args, **kwargs):
+        if data is not None and hasattr(data, 'getlist'):
+            # Accept repeated fields as well as a comma-separated value
+            data = data.copy()
+            data['processo_ids'] = ",".join(data.getlist('processo_ids'))
+        super().__init__(data, *args, **kwargs)
+    
+    def clean_processo_ids(self):
+        """Validate process IDs are integers, without duplicates and within the batch limit."""
+        raw_ids = [value.strip() for value in self.cleaned_data["processo_ids"].split(",") if value.strip()]
+        if not raw_ids:
+            raise forms.ValidationError("Selecione ao menos um processo para renovar")
+        
+        try:
+            processo_ids = list(dict.fromkeys(int(value) for value in raw_ids))
+        except ValueError:
+            raise forms.ValidationError("ID do processo inválido")
+        
+        if len(processo_ids) > settings.PDF_BATCH_RENEWAL_MAX:
+            raise forms.ValidationError(
+                f"Selecione no máximo {settings.PDF_BATCH_RENEWAL_MAX} processos por renovação em lote"
+            )
+        return processo_ids
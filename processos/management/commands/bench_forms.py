@@ -0,0 +1,48 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from processos.forms import NovoProcesso, RenovarProcesso, fabricar_formulario
+from processos.services.pdf_benchmark import summarize
+
+# Choices of a typical doctor: a few clinics, the medications of one protocol
+CLINICAS = [(str(i), f"Clínica {i}") for i in range(1, 4)]
+MEDICAMENTOS = [("nenhum", "Escolha o medicamento...")] + [
+    (str(i), f"Medicamento {i} - 500mg - 30 comprimidos") for i in range(1, 21)
+]
+DADOS = {"cpf_paciente": "11144477735", "cid": "G35", "id_med1": "1", "med1_posologia_mes1": "1 cp ao dia"}
+
+
+class Command(BaseCommand):
+    help = 'Time the construction of the prescription forms (unbound and bound) and print the results as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=1000, help='Forms constructed per measurement')
+        parser.add_argument('--cid', help='Also measure the protocol form of this CID (uses the database)')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be at least 1')
+
+        form_classes = {'NovoProcesso': NovoProcesso, 'RenovarProcesso': RenovarProcesso}
+        if options['cid']:
+            form_classes[f"protocolo_{options['cid']}"] = fabricar_formulario(options['cid'], False)
+
+        results = {'iterations': options['iterations'], 'forms': {}}
+        for name, form_class in form_classes.items():
+            form_class(CLINICAS, MEDICAMENTOS)  # Warm up
+            results['forms'][name] = {
+                'unbound': summarize(self._time(lambda: form_class(CLINICAS, MEDICAMENTOS), options['iterations'])),
+                'bound': summarize(self._time(lambda: form_class(CLINICAS, MEDICAMENTOS, data=DADOS), options['iterations'])),
+            }
+        self.stdout.write(json.dumps(results, indent=2, ensure_ascii=False))
+
+    @staticmethod
+    def _time(construct, iterations):
+        durations = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            construct()
+            durations.append(time.perf_counter() - start)
+        return durations
@@ -0,0 +1,42 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from processos.services.pdf_benchmark import MODES, PDFBenchmark
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the prescription PDF pipeline with synthetic payloads and print the results as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=10, help='Measured runs of every synthetic prescription')
+        parser.add_argument('--concurrency', type=int, default=1, help='Prescriptions generated at the same time')
+        parser.add_argument(
+            '--mode', choices=MODES, default='thread',
+            help='Run concurrent prescriptions in threads (one uwsgi worker) or processes (several workers)'
+        )
+        parser.add_argument('--warmup', type=int, default=1, help='Unmeasured runs before the measurement')
+        parser.add_argument('--backend', help='Fill backend (default: settings.PDF_FILL_BACKEND)')
+        parser.add_argument('--cid', action='append', dest='cids', help='Only benchmark this CID (repeatable)')
+        parser.add_argument('--output', help='Also write the JSON results to this file')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--iterations and --concurrency must be at least 1')
+
+        benchmark = PDFBenchmark(
+            iterations=options['iterations'],
+            concurrency=options['concurrency'],
+            backend=options['backend'],
+            cids=options['cids'],
+            warmup=options['warmup'],
+            mode=options['mode'],
+        )
+        if not benchmark.cases():
+            raise CommandError('No protocol with dados_condicionais to benchmark')
+
+        results = json.dumps(benchmark.run(), indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(results + '\n')
+        self.stdout.write(results)
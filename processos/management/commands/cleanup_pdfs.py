@@ -1,46 +1,47 @@
+import glob
 import os
 import time
-import glob
+
 from django.core.management.base import BaseCommand
 
+from processos.services.pdf_storage import GeneratedPDFStore
+
 
 class Command(BaseCommand):
-    help = 'Clean up old PDF files from /tmp directory'
+    help = (
+        'Delete expired generated PDFs (and LRU files over PDF_OUTPUT_MAX_BYTES) using the file index, '
+        'and legacy pdf_final_* files older than --max-age-minutes'
+    )
 
     def add_arguments(self, parser):
         parser.add_argument(
             '--max-age-minutes',
             type=int,
             default=5,
-            help='Maximum age of PDF files in minutes (default: 5)'
+            help='Maximum age of legacy pdf_final_* files in minutes (default: 5)'
         )
 
     def handle(self, *args, **options):
-        max_age_minutes = options['max_age_minutes']
-        max_age_seconds = max_age_minutes * 60
-        
-        self.stdout.write(f'Cleaning up PDFs older than {max_age_minutes} minutes...')
-        
-        # Find all PDF files in /tmp that match our naming pattern
-        pdf_files = glob.glob("/tmp/pdf_final_*.pdf")
-        
-        if not pdf_files:
-            self.stdout.write('No PDF files found in /tmp')
-            return
-        
+        store = GeneratedPDFStore()
+
+        self.stdout.write(f'Reaping generated PDFs in {store.directory}...')
+        deleted_count = store.reap(max_batches=None)
+
+        self.stdout.write(
+            f'Cleanup complete: Deleted {deleted_count} PDF files, '
+            f'{store.index.total_bytes()} bytes remain'
+        )
+
+        # Legacy files served by serve_pdf are not indexed: glob them until that route is gone
+        max_age_seconds = options['max_age_minutes'] * 60
         current_time = time.time()
-        deleted_count = 0
-        
-        for pdf_file in pdf_files:
+        legacy_deleted = 0
+        for pdf_file in glob.glob("/tmp/pdf_final_*.pdf"):
             try:
-                file_age = current_time - os.path.getmtime(pdf_file)
-                
-                if file_age > max_age_seconds:
+                if current_time - os.path.getmtime(pdf_file) > max_age_seconds:
                     os.remove(pdf_file)
-                    self.stdout.write(f'Deleted: {pdf_file}')
-                    deleted_count += 1
-                    
-            except Exception as e:
+                    legacy_deleted += 1
+            except OSError as e:
                 self.stdout.write(f'Error processing {pdf_file}: {e}')
-        
-        self.stdout.write(f'Cleanup complete: Deleted {deleted_count} PDF files')
\ No newline at end of file
+
+        self.stdout.write(f'Deleted {legacy_deleted} legacy pdf_final_* files')
@@ -0,0 +1,48 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from processos.services.pdf_linearization import PDFLinearizer
+
+
+class Command(BaseCommand):
+    help = 'Linearize (fast web view) the static protocol PDFs in place; run once per deploy'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--directory',
+            default=settings.PATH_PDF_DIR,
+            help='Directory with the protocol PDFs (default: settings.PATH_PDF_DIR)'
+        )
+
+    def handle(self, *args, **options):
+        directory = options['directory']
+        if not os.path.isdir(directory):
+            raise CommandError(f'Directory not found: {directory}')
+
+        linearizer = PDFLinearizer()
+        if not linearizer.available:
+            raise CommandError(f'{linearizer.binary} not found, cannot linearize protocols')
+
+        self.stdout.write(f'Linearizing protocol PDFs in {directory}...')
+        linearized = skipped = failed = 0
+        for root, _, files in os.walk(directory):
+            for name in sorted(files):
+                if not name.lower().endswith('.pdf'):
+                    continue
+                path = os.path.join(root, name)
+                with open(path, 'rb') as f:
+                    already_linearized = linearizer.is_linearized(f.read(1024))
+                if already_linearized:
+                    skipped += 1
+                elif linearizer.linearize_file(path):
+                    linearized += 1
+                else:
+                    failed += 1
+                    self.stderr.write(f'Failed to linearize {path}')
+
+        self.stdout.write(
+            f'Linearization complete: {linearized} linearized, '
+            f'{skipped} already linearized, {failed} failed'
+        )
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from processos.forms.form_factories import form_classes
+
+
+class Command(BaseCommand):
+    help = (
+        'Build the prescription form classes of every protocol and list their conditional fields. '
+        'Validation only: the classes die with this process, uwsgi workers get theirs from the master '
+        '(PROTOCOL_FORM_PRELOAD, autocusto/wsgi.py)'
+    )
+
+    def handle(self, *args, **options):
+        built = form_classes.prebuild()
+        if options['verbosity'] >= 2:
+            for (cid, renovar), form_class in built.items():
+                modelo_base = form_class.__mro__[1]
+                campos = [nome for nome in form_class.base_fields if nome not in modelo_base.base_fields]
+                self.stdout.write(f'{cid} ({modelo_base.__name__}): {", ".join(campos) or "no conditional fields"}')
+
+        self.stdout.write(f'Built {len(built)} form classes for {len(built) // 2} diseases')
@@ -0,0 +1,69 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from processos.services.prescription.pdf_job_service import PDFJobService
+
+
+class Command(BaseCommand):
+    help = 'Generate queued PDFs (settings.PDF_ASYNC_GENERATION) until stopped'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the queue once and exit instead of polling'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=0.5,
+            help='Seconds to sleep when the queue is empty (default: 0.5)'
+        )
+        parser.add_argument(
+            '--stale-after',
+            type=int,
+            default=300,
+            help='Requeue running jobs older than this many seconds (default: 300)'
+        )
+        parser.add_argument(
+            '--max-attempts',
+            type=int,
+            default=3,
+            help='Fail jobs that were started this many times (default: 3)'
+        )
+
+    def handle(self, *args, **options):
+        self.running = True
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        job_service = PDFJobService()
+        processed = 0
+        last_stale_check = 0.0
+
+        self.stdout.write('Processing PDF generation jobs...')
+        while self.running:
+            if time.monotonic() - last_stale_check > options['stale_after'] / 2:
+                job_service.requeue_stale(options['stale_after'], options['max_attempts'])
+                last_stale_check = time.monotonic()
+
+            job = job_service.claim_next()
+            if job is None:
+                if options['once']:
+                    break
+                close_old_connections()
+                time.sleep(options['poll_interval'])
+                continue
+
+            job = job_service.run(job)
+            processed += 1
+            self.stdout.write(f'Job {job.pk} ({job.kind}): {job.status}')
+
+        self.stdout.write(f'Stopped: processed {processed} PDF jobs')
+
+    def _stop(self, signum, frame):
+        # Finish the current job, then exit the loop
+        self.running = False
@@ -119,3 +119,62 @@ class Processo(models.Model):
 
     def __str__(self):
         return f"{self.doenca}"
+
+
+class PDFGenerationJob(models.Model):
+    """
+    Queued PDF generation request (settings.PDF_ASYNC_GENERATION).
+
+    Request workers save the process, enqueue a job and return immediately;
+    the process_pdf_jobs management command claims pending jobs, generates the
+    PDF and stores its serving URL for the status endpoint.
+    """
+    KIND_PRESCRIPTION = "prescription"
+    KIND_RENEWAL = "renewal"
+
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+
+    # job_type (what to generate: new/updated prescription or quick renewal)
+    kind = models.CharField(
+        choices=((KIND_PRESCRIPTION, "Prescrição"), (KIND_RENEWAL, "Renovação")),
+        max_length=20,
+    )
+    status = models.CharField(
+        choices=(
+            (STATUS_PENDING, "Pendente"),
+            (STATUS_RUNNING, "Em execução"),
+            (STATUS_DONE, "Concluído"),
+            (STATUS_FAILED, "Falhou"),
+        ),
+        max_length=20,
+        default=STATUS_PENDING,
+    )
+    # user (owner of the job - only they can poll its status)
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="pdf_jobs"
+    )
+    # process the PDF belongs to
+    processo = models.ForeignKey(
+        Processo, on_delete=models.CASCADE, null=True, related_name="pdf_jobs"
+    )
+    # payload (JSON-serialized generation input, see PDFJobService)
+    payload = JSONField(default=dict)
+    # serving URL of the generated PDF once done
+    pdf_url = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Queue scan: oldest pending job first
+            models.Index(fields=["status", "created_at"], name="pdfjob_status_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"PDFGenerationJob {self.pk} ({self.kind}, {self.status})"
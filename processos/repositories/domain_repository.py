@@ -9,6 +9,7 @@ import logging
 from typing import Optional
 
 from processos.models import Doenca, Protocolo
+from processos.services.reference_data import reference_data
 from clinicas.models import Emissor, Clinica
 
 
@@ -19,6 +20,9 @@ class DomainRepository:
     This repository encapsulates domain entity lookups including:
     - Disease (Doenca) lookups by CID
     - Emissor lookups by medico and clinica
+    
+    Diseases and protocols come from the worker's reference data snapshot
+    when it is enabled (read-only instances).
     """
     
     def __init__(self):
@@ -40,7 +44,10 @@ class DomainRepository:
         self.logger.debug(f"DomainRepository: Getting disease for CID {cid}")
         
         try:
-            disease = Doenca.objects.get(cid=cid)
+            if reference_data.enabled:
+                disease = reference_data.get_disease(cid)
+            else:
+                disease = Doenca.objects.get(cid=cid)
             self.logger.debug(f"DomainRepository: Found disease: {disease.nome}")
             return disease
         except Doenca.DoesNotExist:
@@ -97,7 +104,10 @@ class DomainRepository:
         self.logger.debug(f"DomainRepository: Getting protocol for CID {cid}")
         
         try:
-            protocolo = Protocolo.objects.get(doenca__cid=cid)
+            if reference_data.enabled:
+                protocolo = reference_data.get_protocol(cid)
+            else:
+                protocolo = Protocolo.objects.get(doenca__cid=cid)
             self.logger.debug(f"DomainRepository: Found protocol: {protocolo.nome} (ID: {protocolo.id})")
             return protocolo
         except Protocolo.DoesNotExist:
@@ -8,10 +8,11 @@ Extracted from helpers.py to follow repository pattern principles.
 """
 
 import logging
-from typing import List, Tuple, Dict, Any
+from typing import List, Tuple, Dict, Any, Optional
 from django.db.models import QuerySet
 
 from processos.models import Medicamento, Protocolo, Processo
+from processos.services.reference_data import reference_data
 
 
 class MedicationRepository:
@@ -44,8 +45,12 @@ class MedicationRepository:
         
         try:
             # Get protocol associated with the CID
-            protocol = Protocolo.objects.get(doenca__cid=cid)
-            medications = protocol.medicamentos.all()
+            if reference_data.enabled:
+                protocol = reference_data.get_protocol(cid)
+                medications = reference_data.get_medications(protocol)
+            else:
+                protocol = Protocolo.objects.get(doenca__cid=cid)
+                medications = protocol.medicamentos.all()
             
             # Build medication list with default option
             medication_list = [("nenhum", "Escolha o medicamento...")]
@@ -91,7 +96,8 @@ class MedicationRepository:
     def format_medication_dosages(
         self, 
         form_data: Dict[str, Any], 
-        medication_ids: List[str]
+        medication_ids: List[str],
+        medications: Optional[Dict[int, Medicamento]] = None
     ) -> Tuple[Dict[str, Any], List[str]]:
         """
         Retrieve medication details and format them for PDF generation.
@@ -102,6 +108,8 @@ class MedicationRepository:
         Args:
             form_data: The main dictionary of form data (modified in-place)
             medication_ids: List of medication IDs selected in the form
+            medications: Optional preloaded medications by ID (e.g. from in_bulk),
+                avoiding one query per medication
             
         Returns:
             tuple: (updated_form_data, cleaned_medication_ids)
@@ -115,7 +123,9 @@ class MedicationRepository:
                 cleaned_ids.append(med_id)
                 
                 try:
-                    medication = Medicamento.objects.get(id=med_id)
+                    medication = medications.get(int(med_id)) if medications and str(med_id).isdigit() else None
+                    if medication is None:
+                        medication = Medicamento.objects.get(id=med_id)
                     formatted_med = f"{medication.nome} {medication.dosagem} ({medication.apres})"
                     form_data[f"med{index}"] = formatted_med
                     
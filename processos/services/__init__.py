@@ -17,6 +17,9 @@ Infrastructure Services:
 - PDFGenerator: Pure PDF technical operations
 - PDFResponseBuilder: HTTP response creation for PDFs
 - PDFFileService: File I/O operations for PDFs
+- PypdfBackend / PdftkBackend: PDF fill engines (in-process / subprocess)
+- PDFTemplateRegistry: Per-worker cache of parsed PDF templates
+- PDFResultCache: Content-addressed cache of generated PDFs (pdf_cache alias)
 
 Strategy Services:
 - DataDrivenStrategy: Protocol-based template selection
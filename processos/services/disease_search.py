@@ -0,0 +1,148 @@
+"""
+Disease Search - Infrastructure Layer
+
+In-memory index answering the disease autocomplete (processos.ajax.busca_doencas)
+without a query per keystroke.
+
+Matching keeps the semantics of the former `cid__icontains | nome__icontains`
+filter, on accent-folded text ("esclerose multipla" finds "Esclerose
+Múltipla"), and ranks the matches:
+
+    0  exact CID                  "G35"
+    1  CID prefix                 "G3"
+    2  name prefix                "escl"
+    3  prefix of a word of name   "multi"
+    4  anywhere in CID or name    "ltipla"
+
+ties in CID order, so the same query always returns the same list. Prefix
+matches (0-3) are found by bisecting sorted keys; matches inside words are
+only looked for when there are fewer prefix matches than requested, among
+candidates from a trigram index (queries shorter than a trigram scan every
+entry).
+
+The index is built from the reference data snapshot (and rebuilt when the
+snapshot is reloaded). When the snapshot is disabled, searches run the
+former icontains query instead (ordered by CID, limited, without accent
+folding or ranking): building the index per keystroke would cost far more.
+"""
+
+import heapq
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+from itertools import islice
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple
+
+from django.db.models import Q
+
+from processos.models import Doenca
+from processos.services.reference_data import reference_data
+
+
+NGRAM = 3
+
+
+def fold(text: str) -> str:
+    """Lowercase text without accents and with single spaces."""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ' '.join(''.join(c for c in decomposed if not unicodedata.combining(c)).casefold().split())
+
+
+def _ngrams(text: str) -> set:
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+
+class DiseaseIndex:
+    """Ranked substring search over (cid, nome) pairs (see module docstring)."""
+
+    def __init__(self, diseases: Iterable[Tuple[str, str]]):
+        self.entries: List[Tuple[str, str]] = sorted(set(diseases))
+        self._cids = [fold(cid) for cid, _ in self.entries]
+        self._names = [fold(nome) for _, nome in self.entries]
+
+        # Ranks 0-3 are prefix matches, answered by bisecting sorted keys:
+        # the CIDs, and every suffix of a name starting at a word
+        self._cid_keys = sorted((cid, i) for i, cid in enumerate(self._cids))
+        self._word_keys = sorted(
+            (nome[start:], i)
+            for i, nome in enumerate(self._names)
+            for start in [0] + [k + 1 for k, c in enumerate(nome) if c == ' ']
+        )
+
+        postings = defaultdict(set)
+        for i, (cid, nome) in enumerate(zip(self._cids, self._names)):
+            for ngram in _ngrams(cid) | _ngrams(nome):
+                postings[ngram].add(i)
+        self._postings: Dict[str, FrozenSet[int]] = {ngram: frozenset(ids) for ngram, ids in postings.items()}
+
+    def search(self, query: str, limit: int) -> List[Tuple[str, str]]:
+        """The best limit (cid, nome) matches of query, best first."""
+        folded = fold(query)
+        if not folded or limit < 1:
+            return []
+
+        ranks: Dict[int, int] = {}
+        for i in _prefixed(self._cid_keys, folded):
+            ranks[i] = 0 if self._cids[i] == folded else 1
+        for i in _prefixed(self._word_keys, folded):
+            if i not in ranks:
+                ranks[i] = 2 if self._names[i].startswith(folded) else 3
+
+        if len(ranks) < limit:
+            # Not enough prefix matches: add the matches inside words, in CID order
+            inside = (
+                i for i in sorted(self._candidates(folded))
+                if i not in ranks and (folded in self._cids[i] or folded in self._names[i])
+            )
+            for i in islice(inside, limit - len(ranks)):
+                ranks[i] = 4
+
+        best = heapq.nsmallest(limit, ranks, key=lambda i: (ranks[i], i))
+        return [self.entries[i] for i in best]
+
+    def _candidates(self, folded: str) -> Iterable[int]:
+        if len(folded) < NGRAM:
+            return range(len(self.entries))
+        postings = sorted((self._postings.get(ngram, frozenset()) for ngram in _ngrams(folded)), key=len)
+        return postings[0].intersection(*postings[1:])
+
+
+def _prefixed(keys: List[Tuple[str, int]], prefix: str) -> Iterator[int]:
+    """Entry ids of the sorted (key, id) pairs whose key starts with prefix."""
+    for position in range(bisect_left(keys, (prefix,)), len(keys)):
+        key, i = keys[position]
+        if not key.startswith(prefix):
+            return
+        yield i
+
+
+class DiseaseSearch:
+    """The worker's DiseaseIndex, kept in step with the reference data snapshot."""
+
+    def __init__(self):
+        self._index: Optional[DiseaseIndex] = None
+        self._source = None  # Snapshot the index was built from
+        self._lock = threading.Lock()
+
+    def index(self) -> DiseaseIndex:
+        """The index of the current snapshot (the snapshot must be enabled)."""
+        snapshot = reference_data.snapshot()
+        if self._source is not snapshot:
+            with self._lock:
+                if self._source is not snapshot:
+                    self._index = DiseaseIndex((d.cid, d.nome) for d in snapshot.diseases.values())
+                    self._source = snapshot
+        return self._index
+
+    def search(self, query: str, limit: int) -> List[Tuple[str, str]]:
+        if not reference_data.enabled:
+            query = query.strip()
+            if not query or limit < 1:
+                return []
+            matches = Doenca.objects.filter(Q(cid__icontains=query) | Q(nome__icontains=query))
+            return list(matches.order_by('cid').values_list('cid', 'nome')[:limit])
+        return self.index().search(query, limit)
+
+
+disease_search = DiseaseSearch()
@@ -9,7 +9,10 @@ separate from business logic.
 import os
 import logging
 from django.http import HttpResponse
-from django.urls import reverse
+
+from analytics.signals import persist_pdf_spans
+from processos.services.pdf_spans import current_recorder
+from processos.services.pdf_storage import GeneratedPDFStore
 
 pdf_logger = logging.getLogger('processos.pdf')
 
@@ -25,14 +28,22 @@ class PDFFileService:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
     
-    def save_pdf_and_get_url(self, pdf_response: HttpResponse, cpf_paciente: str, cid: str) -> str:
+    def save_pdf_and_get_url(self, pdf_response: HttpResponse, user) -> str:
         """
-        Save PDF response to filesystem and return serving URL.
+        Save PDF response to filesystem and return its signed serving URL.
+        
+        The file is stored under an opaque per-generation id (see
+        GeneratedPDFStore); the URL is only valid for user and expires after
+        settings.PDF_LINK_TTL_SECONDS. Streaming responses are written to
+        the file chunk by chunk as the PDF is generated, which bounds memory
+        use; the URL is only returned once the whole document is written.
+        
+        The save is recorded as a 'save' span of the generation that produced
+        pdf_response (response.pdf_spans) and stored with its log row.
         
         Args:
-            pdf_response: HttpResponse containing PDF content
-            cpf_paciente: Patient CPF for filename
-            cid: Disease CID for filename
+            pdf_response: HttpResponse or StreamingHttpResponse containing PDF content
+            user: The user the link is issued to
             
         Returns:
             str: URL path for serving the PDF file
@@ -41,22 +52,22 @@ class PDFFileService:
             Exception: If file save operation fails
         """
         try:
-            # Generate filename
-            nome_final_pdf = f"pdf_final_{cpf_paciente}_{cid}.pdf"
-            tmp_pdf_path = f"/tmp/{nome_final_pdf}"
-            
-            # Save PDF content to file
-            with open(tmp_pdf_path, 'wb') as f:
-                f.write(pdf_response.content)
-            
-            pdf_logger.info(f"PDFFileService: PDF saved to {tmp_pdf_path}")
+            store = GeneratedPDFStore()
+            spans = getattr(pdf_response, 'pdf_spans', None) or current_recorder()
+            with spans.span('save', streamed=pdf_response.streaming):
+                if pdf_response.streaming:
+                    doc_id = store.save_stream(pdf_response.streaming_content)
+                else:
+                    doc_id = store.save(pdf_response.content)
+            spans.annotate(file_size_bytes=os.path.getsize(store.path(doc_id)))
+            persist_pdf_spans(spans)
             
             # Generate serving URL
-            path_pdf_final = reverse('processos-serve-pdf', kwargs={'filename': nome_final_pdf})
+            path_pdf_final = store.url(doc_id, user)
             
-            pdf_logger.info(f"PDFFileService: Generated serving URL: {path_pdf_final}")
+            pdf_logger.info(f"PDFFileService: Generated serving URL for document {doc_id}")
             return path_pdf_final
             
         except Exception as e:
             pdf_logger.error(f"PDFFileService: Failed to save PDF: {e}", exc_info=True)
-            raise
\ No newline at end of file
+            raise
@@ -0,0 +1,291 @@
+"""
+PDF Pipeline Benchmark
+
+Measures the prescription PDF path stage by stage (used by the bench_pdf
+management command and its tests), so runs can be compared before and
+after engine changes instead of reading pdf.log timing lines.
+
+For every protocol with dados_condicionais a fixed set of synthetic
+prescriptions is built (see build_payloads): one per configured
+medication, with the conditional fields at their initial values and the
+consent, report and exam documents requested. Each prescription then
+goes through the same path as PrescriptionPDFService:
+
+    format -> select -> PDFGenerator.fill_and_concatenate (or fill_and_stream
+    with settings.PDF_STREAMING_OUTPUT) -> GeneratedPDFStore
+
+bypassing the result cache, so every iteration does the full work, but
+with the fill pool, static template cache and streaming as configured.
+Fill, concat and optimize times come from the pdf_spans the generator
+records (see processos.services.pdf_spans); with streaming the fills run
+while the file is written and are not counted again in 'save'.
+
+Concurrency runs in threads (mode='thread': one uwsgi worker's threads,
+sharing the GIL) or in forked processes (mode='process': several uwsgi
+workers). The report holds p50/p95/p99 per stage (milliseconds),
+throughput at the requested concurrency, peak RSS and the bytes written
+to /dev/shm.
+"""
+
+import logging
+import math
+import multiprocessing
+import os
+import resource
+import shutil
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from processos.models import Doenca, Protocolo
+from processos.services.pdf_engines import get_pdf_backend
+from processos.services.pdf_operations import PDFGenerator
+from processos.services.pdf_spans import recording
+from processos.services.pdf_storage import GeneratedPDFStore
+from processos.services.prescription.data_formatting import PrescriptionDataFormatter
+from processos.services.prescription.template_selection import PrescriptionTemplateSelector
+
+
+logger = logging.getLogger(__name__)
+
+STAGES = ('format', 'select', 'fill', 'concat', 'optimize', 'save')
+# pdf_spans stages counted in each benchmark stage
+SPAN_STAGES = {'fill': ('fill', 'fill_pool'), 'concat': ('concat',), 'optimize': ('optimize',)}
+MODES = ('thread', 'process')
+PERCENTILES = (50, 95, 99)
+SHM_DIR = '/dev/shm'
+
+# Fixed patient data: payloads are identical across runs and machines
+SYNTHETIC_PRESCRIPTION = {
+    'nome_paciente': 'Paciente Sintetico da Silva',
+    'cpf_paciente': '11144477735',
+    'nome_mae': 'Mae Sintetica da Silva',
+    'peso': '70',
+    'altura': '170',
+    'data_1': '01/01/2025',
+    'nome_medico': 'Medico Sintetico',
+    'cns_medico': '123456789012345',
+    'nome_clinica': 'Clinica Sintetica',
+    'cns_clinica': '1234567',
+    'anamnese': 'Paciente em acompanhamento. ' * 10,
+    'consentimento': True,
+    'emitir_relatorio': True,
+    'relatorio': 'Relatorio medico sintetico. ' * 10,
+    'emitir_exames': True,
+    'exames': 'Hemograma completo',
+}
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of values (0.0 for no values)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    """Percentiles and mean of durations given in seconds, in milliseconds."""
+    summary = {f"p{pct}": round(percentile(values, pct) * 1000, 3) for pct in PERCENTILES}
+    summary['mean'] = round(sum(values) / len(values) * 1000, 3) if values else 0.0
+    summary['count'] = len(values)
+    return summary
+
+
+def build_payloads(protocolo: Protocolo, cid: str) -> List[Tuple[str, dict]]:
+    """
+    Build the synthetic prescriptions of protocolo as (label, payload) pairs.
+
+    One payload per medication in dados_condicionais['medications'] (so
+    medication-specific documents are exercised), or a single payload when
+    none is configured.
+    """
+    config = protocolo.dados_condicionais or {}
+    base = dict(SYNTHETIC_PRESCRIPTION, cid=cid)
+    for field in config.get('fields', []):
+        if 'name' in field:
+            base[field['name']] = field.get('initial', '')
+
+    medications = sorted(config.get('medications', {}))
+    if not medications:
+        return [(f"{protocolo.nome}/{cid}", dict(base, med1='medicamento sintetico'))]
+    return [(f"{protocolo.nome}/{cid}/{med}", dict(base, med1=med)) for med in medications]
+
+
+class MeasuredPDFGenerator(PDFGenerator):
+    """PDFGenerator that adds up the /dev/shm bytes of its temporary files before removing them."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.shm_bytes = 0
+
+    def _cleanup_temp_files(self):
+        self.shm_bytes += sum(
+            os.path.getsize(path) for path in self.temp_files
+            if path.startswith(SHM_DIR) and os.path.exists(path)
+        )
+        super()._cleanup_temp_files()
+
+
+# Benchmark of the forked worker processes (mode='process')
+_process_benchmark = None
+
+
+def _init_benchmark_process(benchmark: 'PDFBenchmark') -> None:
+    global _process_benchmark
+    _process_benchmark = benchmark
+
+
+def _run_in_process(protocolo: Protocolo, payload: dict, output_dir: str) -> dict:
+    return _process_benchmark._run_once(protocolo, payload, GeneratedPDFStore(directory=output_dir))
+
+
+class PDFBenchmark:
+    """Run the synthetic prescriptions through the PDF pipeline and report timings."""
+
+    def __init__(self, iterations: int = 10, concurrency: int = 1, backend: Optional[str] = None,
+                 cids: Optional[List[str]] = None, warmup: int = 1, mode: str = 'thread'):
+        if mode not in MODES:
+            raise ValueError(f"Unknown benchmark mode {mode!r} (expected one of {', '.join(MODES)})")
+        self.iterations = iterations
+        self.concurrency = concurrency
+        self.mode = mode
+        self.backend_name = backend
+        self.cids = cids
+        self.warmup = warmup
+        self.formatter = PrescriptionDataFormatter()
+        self.selector = PrescriptionTemplateSelector()
+
+    def cases(self) -> List[Tuple[str, Protocolo, dict]]:
+        """(label, protocol, payload) for every protocol with dados_condicionais, one CID each."""
+        diseases = (
+            Doenca.objects.select_related('protocolo')
+            .filter(protocolo__dados_condicionais__isnull=False)
+            .order_by('protocolo__nome', 'cid')
+        )
+        if self.cids:
+            diseases = diseases.filter(cid__in=self.cids)
+
+        cases = []
+        seen = set()
+        for doenca in diseases:
+            if doenca.protocolo_id in seen and not self.cids:
+                continue
+            seen.add(doenca.protocolo_id)
+            for label, payload in build_payloads(doenca.protocolo, doenca.cid):
+                cases.append((label, doenca.protocolo, payload))
+        return cases
+
+    def run(self) -> dict:
+        """Run warmup and measured iterations and return the JSON-serializable report."""
+        cases = self.cases()
+        output_dir = tempfile.mkdtemp(prefix='bench_pdf_', dir=settings.PDF_OUTPUT_DIR)
+        store = GeneratedPDFStore(directory=output_dir)
+        try:
+            for _ in range(self.warmup):
+                for _, protocolo, payload in cases:
+                    self._run_once(protocolo, payload, store)
+
+            jobs = [case for _ in range(self.iterations) for case in cases]
+            start = time.perf_counter()
+            if self.mode == 'process':
+                results = self._run_in_processes(jobs, output_dir)
+            else:
+                with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                    results = list(executor.map(lambda case: self._run_once(case[1], case[2], store), jobs))
+            wall_seconds = time.perf_counter() - start
+        finally:
+            shutil.rmtree(output_dir, ignore_errors=True)
+
+        completed = [result for result in results if result['ok']]
+        return {
+            'backend': get_pdf_backend(self.backend_name).name,
+            'iterations': self.iterations,
+            'concurrency': self.concurrency,
+            'mode': self.mode,
+            'streaming': settings.PDF_STREAMING_OUTPUT,
+            'cases': [label for label, _, _ in cases],
+            'documents': len(completed),
+            'failed': len(results) - len(completed),
+            'wall_seconds': round(wall_seconds, 3),
+            'throughput_per_second': round(len(completed) / wall_seconds, 3) if wall_seconds else 0.0,
+            'stages': {
+                stage: summarize([result['timings'][stage] for result in results if stage in result['timings']])
+                for stage in STAGES
+            },
+            'total': summarize([sum(result['timings'].values()) for result in completed]),
+            'templates_per_document': round(sum(r['templates'] for r in results) / len(results), 2) if results else 0.0,
+            'fill_sources': dict(sum((Counter(result['fill_sources']) for result in results), Counter())),
+            'output_bytes': sum(result['output_bytes'] for result in completed),
+            'shm_bytes_written': sum(result['shm_bytes'] for result in results),
+            'peak_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+            'peak_children_rss_bytes': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024,
+        }
+
+    def _run_in_processes(self, jobs: List[Tuple[str, Protocolo, dict]], output_dir: str) -> List[dict]:
+        """
+        Run jobs in self.concurrency forked processes, like separate uwsgi workers.
+
+        The workers only run the pipeline (no database access), so they can
+        be forked from this process with its templates and plans loaded.
+        """
+        executor = ProcessPoolExecutor(
+            max_workers=self.concurrency,
+            mp_context=multiprocessing.get_context('fork'),
+            initializer=_init_benchmark_process,
+            initargs=(self,),
+        )
+        with executor:
+            futures = [executor.submit(_run_in_process, protocolo, payload, output_dir) for _, protocolo, payload in jobs]
+            return [future.result() for future in futures]
+
+    def _run_once(self, protocolo: Protocolo, payload: dict, store: GeneratedPDFStore) -> dict:
+        """Run one prescription through the generation path, timing each stage."""
+        timings = {}
+        result = {
+            'ok': False, 'timings': timings, 'templates': 0, 'output_bytes': 0, 'shm_bytes': 0, 'fill_sources': {},
+        }
+        generator = MeasuredPDFGenerator(backend=get_pdf_backend(self.backend_name))
+
+        start = time.perf_counter()
+        formatted_data = self.formatter.format_prescription_date(payload)
+        timings['format'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        template_paths = self.selector.select_prescription_templates(protocolo, formatted_data, settings.PATH_LME_BASE)
+        timings['select'] = time.perf_counter() - start
+        result['templates'] = len(template_paths)
+
+        with recording() as spans:
+            chunks = generator.fill_and_stream(template_paths, formatted_data) if settings.PDF_STREAMING_OUTPUT else None
+            pdf_bytes = None if chunks is not None else generator.fill_and_concatenate(template_paths, formatted_data)
+
+            if chunks is not None or pdf_bytes:
+                generated_spans = len(spans.spans)
+                start = time.perf_counter()
+                doc_id = store.save_stream(chunks) if chunks is not None else store.save(pdf_bytes)
+                # Streamed fills run inside save_stream: keep them out of the save time
+                timings['save'] = time.perf_counter() - start - sum(
+                    span['ms'] for span in spans.spans[generated_spans:]
+                ) / 1000
+
+        for stage, span_stages in SPAN_STAGES.items():
+            stage_spans = [span['ms'] / 1000 for span in spans.spans if span['stage'] in span_stages]
+            if stage_spans:
+                timings[stage] = sum(stage_spans)
+        result['fill_sources'] = dict(Counter(span['source'] for span in spans.spans if span['stage'] == 'fill'))
+        result['shm_bytes'] = generator.shm_bytes
+        if 'save' not in timings:
+            return result
+
+        output_bytes = os.path.getsize(store.path(doc_id))
+        if os.path.realpath(store.directory).startswith(SHM_DIR):
+            result['shm_bytes'] += output_bytes
+
+        result.update(ok=True, output_bytes=output_bytes)
+        return result
@@ -0,0 +1,140 @@
+"""
+Generated PDF Cache - Infrastructure Layer
+
+Content-addressed cache for filled documents, stored in the 'pdf_cache' alias
+of settings.CACHES.
+
+The key is a hash of:
+- every selected template (path + sha256 of its bytes, from the template registry)
+- the fill backend and the settings shaping the output file (linearization,
+  object streams, resource deduplication, streaming)
+- the normalized form data
+
+so a template updated on disk, any changed field or a toggled output setting
+produces a new key (the cache outlives restarts on tmpfs), and identical
+regenerations ("generate" clicked twice) skip filling entirely.
+
+SharedLRUFileCache is the Django cache backend used for the alias: files on
+tmpfs are visible to every uwsgi worker, reads refresh the entry's mtime and
+culling evicts the least recently used entries first.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import InvalidCacheBackendError, caches
+from django.core.cache.backends.filebased import FileBasedCache
+
+from processos.services.pdf_templates import template_registry
+
+
+logger = logging.getLogger(__name__)
+pdf_logger = logging.getLogger('processos.pdf')
+
+
+class SharedLRUFileCache(FileBasedCache):
+    """
+    FileBasedCache with least-recently-used culling.
+
+    Expiry (TTL) is still stored inside each file by FileBasedCache; the file
+    mtime only tracks the last access and drives eviction order.
+    """
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, default, version)
+        if value is not default:
+            try:
+                os.utime(self._key_to_file(key, version))
+            except OSError:
+                pass  # Removed by another worker in the meantime
+        return value
+
+    def _cull(self):
+        """Evict the least recently used 1/CULL_FREQUENCY of entries once MAX_ENTRIES is reached."""
+        filelist = self._list_cache_files()
+        num_entries = len(filelist)
+        if num_entries < self._max_entries:
+            return
+        if self._cull_frequency == 0:
+            return self.clear()
+
+        def last_access(fname):
+            try:
+                return os.stat(fname).st_mtime_ns
+            except OSError:
+                return 0
+
+        for fname in sorted(filelist, key=last_access)[:max(1, num_entries // self._cull_frequency)]:
+            self._delete(fname)
+
+
+class PDFResultCache:
+    """Look up and store generated PDFs by content address."""
+
+    alias = 'pdf_cache'
+    key_prefix = 'filled_pdf'
+
+    def __init__(self):
+        try:
+            self.cache = caches[self.alias]
+        except InvalidCacheBackendError:
+            logger.warning(f"PDFResultCache: Cache alias '{self.alias}' not configured, caching disabled")
+            self.cache = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.cache is not None and getattr(settings, 'PDF_RESULT_CACHE_ENABLED', True)
+
+    def build_key(self, template_paths: List[str], form_data: Dict) -> Optional[str]:
+        """
+        Return the content address for filling template_paths with form_data.
+
+        Returns None when a template cannot be hashed (e.g. missing file), in
+        which case the result must not be cached.
+        """
+        templates = []
+        for path in template_paths:
+            template = template_registry.get(path)
+            if template is None:
+                return None
+            templates.append([path, template.content_hash])
+
+        payload = json.dumps(
+            {
+                'backend': getattr(settings, 'PDF_FILL_BACKEND', 'pypdf'),
+                'output': [
+                    getattr(settings, name, False)
+                    for name in ('PDF_LINEARIZE', 'PDF_OBJECT_STREAMS', 'PDF_DEDUPLICATE_RESOURCES', 'PDF_STREAMING_OUTPUT')
+                ],
+                'templates': templates,
+                # Same coercion PDFGenerator applies before filling
+                'data': {str(k): "" if v is None else str(v) for k, v in form_data.items()},
+            },
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return f"{self.key_prefix}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+    def get(self, key: Optional[str]) -> Optional[bytes]:
+        if key is None or not self.enabled:
+            return None
+        try:
+            pdf_bytes = self.cache.get(key)
+        except Exception as e:
+            logger.warning(f"PDFResultCache: Lookup failed: {e}")
+            return None
+        if pdf_bytes:
+            pdf_logger.info(f"PDFResultCache: Cache hit {key[-12:]} ({len(pdf_bytes)} bytes)")
+        return pdf_bytes
+
+    def set(self, key: Optional[str], pdf_bytes: bytes) -> None:
+        if key is None or not self.enabled or not pdf_bytes:
+            return
+        try:
+            self.cache.set(key, pdf_bytes)
+        except Exception as e:
+            logger.warning(f"PDFResultCache: Store failed: {e}")
@@ -0,0 +1,186 @@
+"""
+PDF Delivery - Infrastructure Layer
+
+Builds the HTTP response that sends an (already authorized) PDF file:
+
+- nginx in front (settings.PDF_ACCEL_REDIRECT_PREFIX): an empty response with
+  X-Accel-Redirect; nginx sends the file and answers Range and conditional
+  requests itself, with its own ETag built from the file's mtime and size
+  (not from the content).
+- Otherwise the file is streamed from disk with a strong ETag (sha256 of the
+  content) and Last-Modified: If-None-Match / If-Modified-Since revalidations
+  get 304, single byte ranges (Range, honoring If-Range) get 206 and
+  unsatisfiable ranges 416, so PDF viewers fetch incrementally and re-opens
+  transfer nothing.
+
+Content hashes are cached per process by (path, mtime, size), so each file
+is hashed once. Only this fallback path has content ETags: files sent by
+nginx (generated PDFs through X-Accel-Redirect, static protocols) carry
+nginx's mtime/size ETags.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+
+
+logger = logging.getLogger(__name__)
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+_etag_cache = OrderedDict()
+_etag_lock = threading.Lock()
+_ETAG_CACHE_SIZE = 512
+
+
+def content_etag(path: str) -> str:
+    """Strong ETag (quoted sha256 of the file bytes), cached by path, mtime and size."""
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    with _etag_lock:
+        etag = _etag_cache.get(key)
+        if etag is not None:
+            _etag_cache.move_to_end(key)
+            return etag
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    etag = quote_etag(digest.hexdigest())
+
+    with _etag_lock:
+        _etag_cache[key] = etag
+        while len(_etag_cache) > _ETAG_CACHE_SIZE:
+            _etag_cache.popitem(last=False)
+    return etag
+
+
+class PDFDelivery:
+    """Builds file responses with X-Accel-Redirect, conditional request and byte range support."""
+
+    def build_response(self, request, pdf_path: str, filename: str) -> Tuple[HttpResponse, int]:
+        """
+        Response sending pdf_path to the client.
+
+        Returns (response, file size in bytes). Raises OSError if the file
+        cannot be read.
+        """
+        stat = os.stat(pdf_path)
+        file_size = stat.st_size
+
+        if settings.PDF_ACCEL_REDIRECT_PREFIX:
+            response = HttpResponse(content_type='application/pdf')
+            response['X-Accel-Redirect'] = f"{settings.PDF_ACCEL_REDIRECT_PREFIX.rstrip('/')}/{os.path.basename(pdf_path)}"
+            return self._add_headers(response, filename), file_size
+
+        etag = content_etag(pdf_path)
+        last_modified = int(stat.st_mtime)
+
+        if self._not_modified(request, etag, last_modified):
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            return response, 0
+
+        byte_range = None
+        if self._if_range_passes(request, etag, last_modified):
+            byte_range = self._parse_range(request.headers.get('Range'), file_size)
+            if byte_range == 'unsatisfiable':
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f"bytes */{file_size}"
+                return response, 0
+
+        if byte_range:
+            start, end = byte_range
+            length = end - start + 1
+            response = StreamingHttpResponse(
+                self._read_range(pdf_path, start, length), status=206, content_type='application/pdf'
+            )
+            response['Content-Range'] = f"bytes {start}-{end}/{file_size}"
+            response['Content-Length'] = str(length)
+            sent = length
+        else:
+            response = FileResponse(open(pdf_path, 'rb'), content_type='application/pdf')
+            sent = file_size
+
+        response['Accept-Ranges'] = 'bytes'
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        # Patient documents: browser cache only, always revalidated
+        response['Cache-Control'] = 'private, no-cache'
+        return self._add_headers(response, filename), sent
+
+    @staticmethod
+    def _add_headers(response: HttpResponse, filename: str) -> HttpResponse:
+        # Security headers
+        response['Content-Disposition'] = f'inline; filename="{filename}"'
+        response['X-Content-Type-Options'] = 'nosniff'
+        response['X-Frame-Options'] = 'SAMEORIGIN'
+        return response
+
+    @staticmethod
+    def _not_modified(request, etag: str, last_modified: int) -> bool:
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match:
+            # Weak comparison (RFC 9110 13.1.2)
+            candidates = {tag.removeprefix('W/') for tag in parse_etags(if_none_match)}
+            return '*' in candidates or etag in candidates
+        if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+        return if_modified_since is not None and last_modified <= if_modified_since
+
+    @staticmethod
+    def _if_range_passes(request, etag: str, last_modified: int) -> bool:
+        """True when Range applies: no If-Range, or If-Range matches the current representation."""
+        if_range = request.headers.get('If-Range')
+        if not if_range:
+            return True
+        if if_range.startswith(('"', 'W/')):
+            return if_range == etag  # Strong comparison; weak tags never match
+        return parse_http_date_safe(if_range) == last_modified
+
+    @staticmethod
+    def _parse_range(header: Optional[str], size: int):
+        """
+        Parse a single-range Range header into inclusive (start, end).
+
+        Returns None when the whole file should be sent (no header, multiple
+        ranges or unparseable syntax) and 'unsatisfiable' for ranges outside
+        the file.
+        """
+        match = RANGE_RE.match(header.strip()) if header else None
+        if not match or match.group(1) == match.group(2) == '':
+            return None
+        first, last = match.groups()
+        if first == '':
+            # Suffix range: the last N bytes
+            length = int(last)
+            if length == 0 or size == 0:
+                return 'unsatisfiable'
+            return max(size - length, 0), size - 1
+        start = int(first)
+        if last and int(last) < start:
+            return None  # Invalid range: ignored (RFC 9110 14.1.1)
+        if start >= size:
+            return 'unsatisfiable'
+        return start, min(int(last), size - 1) if last else size - 1
+
+    @staticmethod
+    def _read_range(pdf_path: str, start: int, length: int):
+        with open(pdf_path, 'rb') as f:
+            f.seek(start)
+            while length > 0:
+                chunk = f.read(min(CHUNK_SIZE, length))
+                if not chunk:
+                    break
+                length -= len(chunk)
+                yield chunk
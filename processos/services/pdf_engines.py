@@ -0,0 +1,451 @@
+"""
+PDF Fill Engines - Infrastructure Layer
+
+Interchangeable backends that fill AcroForm templates and concatenate PDFs.
+Like pdf_operations, this module knows nothing about prescriptions.
+
+Backends:
+- PypdfBackend: In-process fill + flatten using pypdf (no subprocesses)
+- PdftkBackend: Original pypdftk implementation (forks one pdftk per call,
+  killed after settings.PDF_PDFTK_TIMEOUT)
+
+PDFGenerator picks a backend through get_pdf_backend(), which honours
+settings.PDF_FILL_BACKEND and falls back to pdftk when pypdf is unavailable.
+"""
+
+import logging
+import os
+import signal
+import subprocess
+from io import BytesIO
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import pypdftk
+from django.conf import settings
+
+try:
+    from pypdf import PdfReader, PdfWriter
+    from pypdf.generic import (
+        ArrayObject,
+        DecodedStreamObject,
+        DictionaryObject,
+        EncodedStreamObject,
+        NameObject,
+        StreamObject,
+    )
+    PYPDF_AVAILABLE = True
+except ImportError:  # pragma: no cover - depends on deployment
+    PYPDF_AVAILABLE = False
+
+from processos.services.pdf_templates import template_registry
+
+
+logger = logging.getLogger(__name__)
+pdf_logger = logging.getLogger('processos.pdf')
+
+# AcroForm field flag bits (PDF 32000-1:2008, table 226)
+FF_PUSHBUTTON = 1 << 16
+# Annotation flag bit for hidden annotations (table 165)
+ANNOT_HIDDEN = 1 << 1
+
+
+class PdftkTimeoutError(Exception):
+    """pdftk did not finish within settings.PDF_PDFTK_TIMEOUT and was killed."""
+
+
+class PdftkBackend:
+    """
+    Fill and concatenate PDFs through the pdftk binary (pypdftk).
+
+    Kept as the fallback backend: every call forks a pdftk process (and, for
+    pdftk-java, starts a JVM). A run that exceeds settings.PDF_PDFTK_TIMEOUT
+    has its whole process group killed and raises PdftkTimeoutError; a
+    failed run raises CalledProcessError like pypdftk.
+
+    There is no warm helper pool: pdftk (C++ or pdftk-java) handles one
+    command line per process, so a pool of forked Python helpers still paid
+    the pdftk/JVM start-up per job. Saving it needs a long-lived JVM running
+    pdftk-java in-process (see readmes/REFACTORING_PRIORITIES.md).
+    """
+
+    name = 'pdftk'
+    in_memory = False  # Works on files only (see PDFGenerator tmpfs path)
+
+    def fill_form(self, template_path: str, form_data: Dict[str, str], output_path: str) -> Optional[str]:
+        """Fill and flatten template_path into output_path. Returns the output path."""
+        xfdf_path = pypdftk.gen_xfdf(form_data)
+        try:
+            self._run([template_path, 'fill_form', xfdf_path, 'output', output_path, 'flatten'])
+        finally:
+            os.remove(xfdf_path)
+        return output_path
+
+    def concat(self, pdf_paths: List[str], output_path: str) -> Optional[str]:
+        """Concatenate pdf_paths into output_path. Returns the output path."""
+        self._run(list(pdf_paths) + ['cat', 'output', output_path])
+        return output_path
+
+    @staticmethod
+    def _run(args: List[str]) -> None:
+        """Run pdftk in its own process group, killing the whole group on timeout."""
+        command = [pypdftk.PDFTK_PATH] + args
+        env = dict(os.environ)
+        if settings.PDF_PDFTK_JAVA_OPTIONS:
+            env['JAVA_TOOL_OPTIONS'] = settings.PDF_PDFTK_JAVA_OPTIONS
+        process = subprocess.Popen(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=env,
+            start_new_session=True,  # pdftk-java runs java under a wrapper script
+        )
+        try:
+            stdout, stderr = process.communicate(timeout=settings.PDF_PDFTK_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+            process.communicate()
+            logger.error(f"PdftkBackend: pdftk killed after {settings.PDF_PDFTK_TIMEOUT}s: {' '.join(args)}")
+            raise PdftkTimeoutError(f"pdftk timed out after {settings.PDF_PDFTK_TIMEOUT}s")
+        if process.returncode:
+            raise subprocess.CalledProcessError(process.returncode, command, stdout, stderr)
+
+
+class PypdfBackend:
+    """
+    Fill, flatten and concatenate PDFs in-process with pypdf.
+
+    Text and choice fields get their appearance streams generated by pypdf;
+    checkboxes and radio groups are switched to the matching export state.
+    Flattening then paints every visible widget appearance into the page
+    content and drops the AcroForm, mirroring `pdftk ... flatten`.
+
+    Templates come pre-parsed from the per-worker template registry.
+    """
+
+    name = 'pypdf'
+    in_memory = True  # Filled documents can stay in memory until merge()
+
+    def fill_form(self, template_path: str, form_data: Dict[str, str], output_path: str) -> Optional[str]:
+        """Fill and flatten template_path into output_path. Returns the output path."""
+        writer = self.fill_in_memory(template_path, form_data)
+        with open(output_path, 'wb') as f:
+            writer.write(f)
+        return output_path
+
+    def fill_in_memory(self, template_path: str, form_data: Dict[str, str]) -> 'PdfWriter':
+        """Fill and flatten template_path, returning the unsaved document."""
+        template = template_registry.get(template_path)
+        reader = template.reader if template and template.reader else PdfReader(template_path)
+        return self.fill_to_writer(reader, form_data)
+
+    def merge(self, documents: list) -> bytes:
+        """
+        Merge filled documents into a single PDF and return its bytes.
+
+        documents may mix in-memory writers from fill_in_memory(), PDF bytes
+        (e.g. from the parallel fill pool) and PDF file paths (e.g. pdftk
+        fallback output); nothing is written to disk.
+        """
+        merged = PdfWriter()
+        for document in documents:
+            if isinstance(document, PdfWriter):
+                for page in document.pages:
+                    merged.add_page(page)
+            elif isinstance(document, bytes):
+                merged.append(BytesIO(document))
+            else:
+                merged.append(document)
+
+        buffer = BytesIO()
+        self._write_compact(merged, buffer)
+        return buffer.getvalue()
+
+    def merge_incrementally(self, documents: Iterable) -> Iterator[bytes]:
+        """
+        Merge documents like merge(), yielding the output as each one arrives.
+
+        The header goes out first; the objects of every document are written
+        as soon as the iterable produces it, so a lazily filled document list
+        streams page by page. The page tree, catalog and cross-reference
+        table - the only parts that depend on the whole document - come last.
+        Resources shared between documents are not deduplicated (each chunk
+        is final once yielded).
+        """
+        writer = PdfWriter()
+        # Page tree, catalog and info are only complete once every page was added
+        deferred = range(1, len(writer._objects) + 1)
+        written = len(writer._objects)
+        positions = {}
+
+        header = writer.pdf_header.encode() + b"\n%\xe2\xe3\xcf\xd3\n"
+        offset = len(header)
+        yield header
+
+        for document in documents:
+            for page in self._document_pages(document):
+                new_page = writer.add_page(page)
+                if settings.PDF_DEDUPLICATE_RESOURCES:
+                    new_page.compress_content_streams()
+
+            buffer = BytesIO()
+            for idnum in range(written + 1, len(writer._objects) + 1):
+                self._write_indirect_object(writer, idnum, buffer, offset, positions)
+            written = len(writer._objects)
+            chunk = buffer.getvalue()
+            offset += len(chunk)
+            if chunk:
+                yield chunk
+
+        buffer = BytesIO()
+        for idnum in deferred:
+            self._write_indirect_object(writer, idnum, buffer, offset, positions)
+        xref_location = offset + buffer.tell()
+        buffer.write(f"xref\n0 {len(writer._objects) + 1}\n0000000000 65535 f \n".encode())
+        for idnum in range(1, len(writer._objects) + 1):
+            if idnum in positions:
+                buffer.write(f"{positions[idnum]:0>10} 00000 n \n".encode())
+            else:
+                buffer.write(b"0000000000 00001 f \n")
+        writer._write_trailer(buffer, xref_location)
+        yield buffer.getvalue()
+
+    @staticmethod
+    def _document_pages(document) -> list:
+        """Pages of a filled document: an in-memory writer, PDF bytes or a PDF file path."""
+        if isinstance(document, PdfWriter):
+            return document.pages
+        if isinstance(document, bytes):
+            return PdfReader(BytesIO(document)).pages
+        return PdfReader(document).pages
+
+    @staticmethod
+    def _write_indirect_object(writer: 'PdfWriter', idnum: int, buffer, offset: int, positions: dict) -> None:
+        obj = writer._objects[idnum - 1]
+        if obj is None:
+            return
+        positions[idnum] = offset + buffer.tell()
+        buffer.write(f"{idnum} 0 obj\n".encode())
+        obj.write_to_stream(buffer)
+        buffer.write(b"\nendobj\n")
+
+    def concat(self, pdf_paths: List[str], output_path: str) -> Optional[str]:
+        """Concatenate pdf_paths into output_path. Returns the output path."""
+        writer = PdfWriter()
+        for pdf_path in pdf_paths:
+            writer.append(pdf_path)
+        with open(output_path, 'wb') as f:
+            self._write_compact(writer, f)
+        return output_path
+
+    @staticmethod
+    def _write_compact(writer: 'PdfWriter', stream) -> None:
+        """
+        Write a concatenated document, storing shared resources once.
+
+        The government templates embed the same fonts and images, so every
+        merged source brings its own copy; identical objects (compared by
+        content hash) are collapsed into one and unreferenced ones dropped.
+        Uncompressed page content (e.g. flattened widget drawing) is deflated.
+        """
+        if settings.PDF_DEDUPLICATE_RESOURCES:
+            # Before deduplication: pages must not share content streams when rewritten
+            for page in writer.pages:
+                page.compress_content_streams()
+            writer.compress_identical_objects(remove_duplicates=True, remove_unreferenced=True)
+        writer.write(stream)
+
+    def fill_to_writer(self, reader: 'PdfReader', form_data: Dict[str, str]) -> 'PdfWriter':
+        """Clone reader into a new writer with form_data filled and flattened."""
+        writer = PdfWriter(clone_from=reader)
+        acro_form = writer._root_object.get('/AcroForm')
+        if acro_form is None:
+            return writer
+
+        fields = self._collect_terminal_fields(acro_form.get_object().get('/Fields', ArrayObject()))
+
+        text_values = {}
+        for name, value in form_data.items():
+            field = fields.get(name)
+            if field is None:
+                continue
+            if field['type'] == '/Btn':
+                self._set_button_state(field, value)
+            elif field['type'] in ('/Tx', '/Ch'):
+                text_values[name] = value
+
+        if text_values:
+            writer.update_page_form_field_values(None, text_values, auto_regenerate=False)
+
+        for page in writer.pages:
+            self._flatten_page(writer, page)
+        del writer._root_object[NameObject('/AcroForm')]
+        return writer
+
+    def _collect_terminal_fields(self, field_refs, parent_name: str = '', inherited_type=None, inherited_flags: int = 0) -> dict:
+        """Map fully qualified field names to their dictionary, type and widgets."""
+        fields = {}
+        for ref in field_refs:
+            node = ref.get_object()
+            partial = node.get('/T')
+            name = f"{parent_name}.{partial}" if parent_name and partial is not None else (partial or parent_name)
+            field_type = node.get('/FT', inherited_type)
+            flags = int(node.get('/Ff', inherited_flags))
+
+            named_kids = [kid for kid in node.get('/Kids', []) if '/T' in kid.get_object()]
+            if named_kids:
+                fields.update(self._collect_terminal_fields(named_kids, name, field_type, flags))
+                continue
+
+            widgets = [kid.get_object() for kid in node.get('/Kids', [])] or [node]
+            fields[name] = {'node': node, 'type': field_type, 'flags': flags, 'widgets': widgets}
+        return fields
+
+    def _set_button_state(self, field: dict, value) -> None:
+        """Select the checkbox/radio appearance state matching value."""
+        if field['flags'] & FF_PUSHBUTTON or value in (None, ''):
+            return
+
+        state = NameObject(value if str(value).startswith('/') else f"/{value}")
+        matched = False
+        for widget in field['widgets']:
+            normal_ap = widget.get('/AP', DictionaryObject()).get('/N')
+            normal_ap = normal_ap.get_object() if normal_ap is not None else None
+            if isinstance(normal_ap, DictionaryObject) and not isinstance(normal_ap, StreamObject) and state in normal_ap:
+                widget[NameObject('/AS')] = state
+                matched = True
+            else:
+                widget[NameObject('/AS')] = NameObject('/Off')
+        field['node'][NameObject('/V')] = state if matched else NameObject('/Off')
+
+    def _flatten_page(self, writer: 'PdfWriter', page) -> None:
+        """Paint widget appearances into the page content and drop the widgets."""
+        annots = page.get('/Annots')
+        if annots is None:
+            return
+        annots = annots.get_object()
+
+        resources = page.get('/Resources')
+        if resources is None:
+            resources = DictionaryObject()
+            page[NameObject('/Resources')] = resources
+        resources = resources.get_object()
+        if '/XObject' not in resources:
+            resources[NameObject('/XObject')] = DictionaryObject()
+        xobjects = resources['/XObject'].get_object()
+
+        drawing = []
+        kept_annots = ArrayObject()
+        for annot_ref in annots:
+            annot = annot_ref.get_object()
+            if annot.get('/Subtype') != '/Widget':
+                kept_annots.append(annot_ref)
+                continue
+            if int(annot.get('/F', 0)) & ANNOT_HIDDEN:
+                continue
+
+            appearance = self._normal_appearance(annot)
+            if appearance is None or '/BBox' not in appearance:
+                continue
+
+            xobject_name = NameObject(f"/FlatFm{len(xobjects)}")
+            appearance[NameObject('/Type')] = NameObject('/XObject')
+            appearance[NameObject('/Subtype')] = NameObject('/Form')
+            if type(appearance) not in (DecodedStreamObject, EncodedStreamObject):
+                # pypdf-generated appearances do not survive cloning into another writer
+                appearance = self._plain_stream(appearance)
+            xobjects[xobject_name] = getattr(appearance, 'indirect_reference', None) or writer._add_object(appearance)
+
+            a, b, c, d, e, f = self._appearance_to_rect_matrix(appearance, annot['/Rect'])
+            drawing.append(f"q {a:.6f} {b:.6f} {c:.6f} {d:.6f} {e:.6f} {f:.6f} cm {xobject_name} Do Q")
+
+        if kept_annots:
+            page[NameObject('/Annots')] = kept_annots
+        else:
+            del page[NameObject('/Annots')]
+
+        if drawing:
+            self._wrap_page_contents(writer, page, "\n".join(drawing))
+
+    def _normal_appearance(self, annot):
+        """Return the /N appearance stream for the widget's current state."""
+        ap = annot.get('/AP')
+        if ap is None:
+            return None
+        normal_ap = ap.get_object().get('/N')
+        if normal_ap is None:
+            return None
+        normal_ap = normal_ap.get_object()
+        if isinstance(normal_ap, StreamObject):
+            return normal_ap
+        state = annot.get('/AS')
+        if state is None or state not in normal_ap:
+            return None
+        return normal_ap[state].get_object()
+
+    @staticmethod
+    def _plain_stream(stream) -> 'DecodedStreamObject':
+        """Copy a stream subclass into a plain DecodedStreamObject."""
+        plain = DecodedStreamObject()
+        plain.update(stream)
+        plain.set_data(stream.get_data())
+        return plain
+
+    def _appearance_to_rect_matrix(self, appearance, rect) -> tuple:
+        """
+        Compute the cm matrix that maps the appearance BBox onto the widget Rect
+        (PDF 32000-1:2008, 12.5.5 - the form /Matrix is applied by Do itself).
+        """
+        bx0, by0, bx1, by1 = [float(v) for v in appearance['/BBox']]
+        ma, mb, mc, md, me, mf = [float(v) for v in appearance.get('/Matrix', [1, 0, 0, 1, 0, 0])]
+        corners = [
+            (ma * x + mc * y + me, mb * x + md * y + mf)
+            for x, y in ((bx0, by0), (bx0, by1), (bx1, by0), (bx1, by1))
+        ]
+        tx0 = min(x for x, _ in corners)
+        ty0 = min(y for _, y in corners)
+        tx1 = max(x for x, _ in corners)
+        ty1 = max(y for _, y in corners)
+
+        rx0, ry0, rx1, ry1 = [float(v) for v in rect]
+        rx0, rx1 = min(rx0, rx1), max(rx0, rx1)
+        ry0, ry1 = min(ry0, ry1), max(ry0, ry1)
+
+        sx = (rx1 - rx0) / (tx1 - tx0) if tx1 != tx0 else 1.0
+        sy = (ry1 - ry0) / (ty1 - ty0) if ty1 != ty0 else 1.0
+        return sx, 0.0, 0.0, sy, rx0 - tx0 * sx, ry0 - ty0 * sy
+
+    def _wrap_page_contents(self, writer: 'PdfWriter', page, drawing: str) -> None:
+        """Isolate the original content in q/Q and append the flattened widgets."""
+        head = DecodedStreamObject()
+        head.set_data(b"q\n")
+        tail = DecodedStreamObject()
+        tail.set_data(f"\nQ\n{drawing}\n".encode('latin-1'))
+
+        contents = ArrayObject([writer._add_object(head)])
+        existing = page.get('/Contents')
+        if existing is not None:
+            existing_obj = existing.get_object()
+            if isinstance(existing_obj, ArrayObject):
+                contents.extend(existing_obj)
+            else:
+                contents.append(existing)
+        contents.append(writer._add_object(tail))
+        page[NameObject('/Contents')] = contents
+
+
+def get_pdf_backend(name: Optional[str] = None):
+    """
+    Return the fill backend called name (default: settings.PDF_FILL_BACKEND).
+
+    Unknown names and a missing pypdf installation fall back to pdftk.
+    """
+    name = name or getattr(settings, 'PDF_FILL_BACKEND', 'pypdf')
+
+    if name == PypdfBackend.name:
+        if PYPDF_AVAILABLE:
+            return PypdfBackend()
+        logger.warning("PDF engines: pypdf not installed, falling back to pdftk backend")
+    elif name != PdftkBackend.name:
+        logger.warning(f"PDF engines: Unknown backend '{name}', falling back to pdftk backend")
+
+    return PdftkBackend()
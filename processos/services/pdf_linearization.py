@@ -0,0 +1,132 @@
+"""
+PDF Linearization - Infrastructure Layer
+
+Rewrites PDFs as linearized ("fast web view") files with qpdf: the first
+page's objects and a hint table come first, so a viewer fetching the file
+with byte ranges (see pdf_delivery.py) renders page 1 before the rest of
+the document has arrived.
+
+The same qpdf pass can also pack objects into compressed object streams
+with a cross-reference stream (settings.PDF_OBJECT_STREAMS), which pypdf
+cannot write.
+
+Both are optional last stages: when qpdf is missing or fails, callers get
+the original bytes back and generation carries on.
+"""
+
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+from typing import Optional
+
+from django.conf import settings
+
+from processos.services.pdf_scratch import scratch_space
+
+
+logger = logging.getLogger(__name__)
+pdf_logger = logging.getLogger('processos.pdf')
+
+# The linearization parameter dictionary is the first object of the file
+LINEARIZED_MARKER = b'/Linearized'
+HEADER_SCAN_BYTES = 1024
+
+
+class PDFLinearizer:
+    """Linearize (and optionally pack into object streams) PDF bytes or files through qpdf."""
+
+    def __init__(self, binary: Optional[str] = None, timeout: Optional[int] = None,
+                 object_streams: Optional[bool] = None):
+        self.binary = binary or settings.PDF_QPDF_BINARY
+        self.timeout = timeout or settings.PDF_LINEARIZE_TIMEOUT
+        self.object_streams = settings.PDF_OBJECT_STREAMS if object_streams is None else object_streams
+
+    @property
+    def available(self) -> bool:
+        return shutil.which(self.binary) is not None
+
+    @staticmethod
+    def is_linearized(pdf_bytes: bytes) -> bool:
+        return LINEARIZED_MARKER in pdf_bytes[:HEADER_SCAN_BYTES]
+
+    def linearize_bytes(self, pdf_bytes: bytes) -> bytes:
+        """Return pdf_bytes linearized, or unchanged if linearization is not possible."""
+        if self.is_linearized(pdf_bytes):
+            return pdf_bytes
+        return self._rewrite_bytes(pdf_bytes, linearize=True)
+
+    def compact_bytes(self, pdf_bytes: bytes) -> bytes:
+        """Return pdf_bytes with object streams and a compressed xref, or unchanged on failure."""
+        return self._rewrite_bytes(pdf_bytes, linearize=False)
+
+    def _rewrite_bytes(self, pdf_bytes: bytes, linearize: bool) -> bytes:
+        # Input and output copies, within the tmpfs scratch quota
+        with scratch_space.reserved(2 * len(pdf_bytes)) as reservation:
+            fd, input_path = tempfile.mkstemp(prefix='pdf_lin_', suffix='.pdf', dir=reservation.directory)
+            output_path = f"{input_path[:-4]}_out.pdf"
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(pdf_bytes)
+                if not self._run(input_path, output_path, linearize=linearize):
+                    return pdf_bytes
+                with open(output_path, 'rb') as f:
+                    rewritten = f.read()
+                pdf_logger.debug(f"PDFLinearizer: Rewrote {len(pdf_bytes)} -> {len(rewritten)} bytes")
+                return rewritten
+            finally:
+                for path in (input_path, output_path):
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+
+    def linearize_file(self, path: str) -> bool:
+        """
+        Linearize path in place (atomically replaced).
+
+        Returns True if the file was rewritten, False if it was already
+        linearized or qpdf failed.
+        """
+        with open(path, 'rb') as f:
+            if self.is_linearized(f.read(HEADER_SCAN_BYTES)):
+                return False
+
+        output_path = f"{path}.linearized"
+        try:
+            if not self._run(path, output_path):
+                return False
+            os.replace(output_path, path)
+            return True
+        finally:
+            if os.path.exists(output_path):
+                os.remove(output_path)
+
+    def _run(self, input_path: str, output_path: str, linearize: bool = True) -> bool:
+        args = [self.binary]
+        if linearize:
+            args.append('--linearize')
+        if self.object_streams:
+            args.append('--object-streams=generate')
+        try:
+            result = subprocess.run(
+                args + [input_path, output_path],
+                capture_output=True,
+                timeout=self.timeout,
+            )
+        except FileNotFoundError:
+            logger.warning(f"PDFLinearizer: {self.binary} not found, PDF left unlinearized")
+            return False
+        except subprocess.TimeoutExpired:
+            logger.error(f"PDFLinearizer: {self.binary} timed out after {self.timeout}s on {input_path}")
+            return False
+
+        # qpdf exits with 3 when it succeeded with warnings
+        if result.returncode not in (0, 3) or not os.path.exists(output_path):
+            logger.error(
+                f"PDFLinearizer: {self.binary} failed on {input_path} "
+                f"(exit {result.returncode}): {result.stderr.decode(errors='replace').strip()}"
+            )
+            return False
+        return True
@@ -5,8 +5,11 @@ This module provides ONLY pure PDF technical operations with no business logic.
 It's completely agnostic about medical prescriptions or any domain-specific concepts.
 
 Services:
-- PDFGenerator: Core PDF filling and concatenation using pypdftk
-- PDFResponseBuilder: Creates HTTP responses for PDF delivery
+- PDFGenerator: Core PDF filling and concatenation through a fill backend
+  (in-process pypdf by default, pdftk as fallback - see pdf_engines.py),
+  optionally linearizing / packing the result into object streams
+  (see pdf_linearization.py)
+- PDFResponseBuilder: Creates HTTP responses (buffered or streamed) for PDF delivery
 
 These services can be used for ANY PDF operations, not just medical prescriptions.
 """
@@ -14,38 +17,55 @@ These services can be used for ANY PDF operations, not just medical prescription
 import os
 import time
 import logging
-from typing import List, Optional
+from itertools import chain
+from typing import Iterator, List, Optional, Tuple
 from datetime import datetime
 
-import pypdftk
-from django.http import HttpResponse
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+
+from processos.services.pdf_engines import PdftkBackend, get_pdf_backend
+from processos.services.pdf_linearization import PDFLinearizer
+from processos.services.pdf_pool import fill_pool
+from processos.services.pdf_scratch import scratch_space
+from processos.services.pdf_spans import current_recorder
+from processos.services.pdf_templates import flattened_cache, template_registry
 
 
 logger = logging.getLogger(__name__)
 pdf_logger = logging.getLogger('processos.pdf')
 
+# Scratch reserved per fill, as a multiple of the template size (settled to the real size after)
+FILL_SCRATCH_FACTOR = 2
+
 
 class PDFGenerator:
     """
-    Pure PDF technical operations using pypdftk.
+    Pure PDF technical operations using a pluggable fill backend.
     
     Single Responsibility: Generate PDFs from templates and data.
     Completely agnostic about business logic or domain concepts.
     """
     
-    def __init__(self):
+    def __init__(self, backend=None, parallel: Optional[bool] = None, linearize: Optional[bool] = None):
         self.logger = logging.getLogger(__name__)
         self.pdf_logger = logging.getLogger('processos.pdf')
         self.temp_files = []  # Track temporary files for cleanup
+        self.scratch_reservations = []  # tmpfs quota held by the temporary files
+        self.backend = backend or get_pdf_backend()
+        self.parallel = settings.PDF_PARALLEL_FILL if parallel is None else parallel
+        self.linearize = settings.PDF_LINEARIZE if linearize is None else linearize
     
     def _cleanup_temp_files(self):
         """
         Clean up all temporary PDF files created during generation.
         
         This method removes temporary files from /dev/shm to prevent
-        resource leakage and disk space exhaustion.
+        resource leakage and disk space exhaustion, then returns their
+        scratch reservations to the quota (see pdf_scratch.py).
         """
         if not self.temp_files:
+            self._release_scratch()
             return
             
         cleaned_count = 0
@@ -63,6 +83,12 @@ class PDFGenerator:
         
         # Clear the list after cleanup
         self.temp_files.clear()
+        self._release_scratch()
+    
+    def _release_scratch(self):
+        for reservation in self.scratch_reservations:
+            scratch_space.release(reservation)
+        self.scratch_reservations.clear()
         
     def fill_and_concatenate(self, template_paths: List[str], form_data: dict) -> Optional[bytes]:
         """
@@ -71,8 +97,13 @@ class PDFGenerator:
         WORKFLOW:
         1. Fill each PDF template individually with form data (flatten=True)
         2. Concatenate the already-flattened PDFs into final document
-        3. Clean up temporary files from /dev/shm
-        4. Return the final PDF bytes
+        3. Linearize the final document and/or pack it into object streams
+           (optional, settings.PDF_LINEARIZE / PDF_OBJECT_STREAMS)
+        4. Clean up temporary files from /dev/shm
+        5. Return the final PDF bytes
+        
+        With an in-memory backend (pypdf) steps 1-2 never touch /dev/shm:
+        filled documents stay in memory and are merged into one buffer.
         
         Args:
             template_paths: List of PDF template file paths
@@ -86,17 +117,20 @@ class PDFGenerator:
         try:
             # Step 1: Fill each PDF template individually
             self.pdf_logger.info("PDFGenerator: Step 1 - Filling individual PDF templates")
-            filled_pdf_paths = self._fill_pdf_forms(template_paths, form_data)
+            filled_pdfs = self._fill_pdf_forms(template_paths, form_data)
             
-            if not filled_pdf_paths:
+            if not filled_pdfs:
                 self.logger.error("PDFGenerator: No PDFs were successfully filled")
                 return None
             
             # Step 2: Concatenate the filled PDFs
             self.pdf_logger.info("PDFGenerator: Step 2 - Concatenating filled PDFs")
-            final_pdf_bytes = self._concatenate_pdfs(filled_pdf_paths)
+            with current_recorder().span('concat', documents=len(filled_pdfs)):
+                final_pdf_bytes = self._concatenate_pdfs(filled_pdfs)
             
             if final_pdf_bytes:
+                # Step 3: Linearize so viewers can render page 1 before the download completes
+                final_pdf_bytes = self._optimize_output(final_pdf_bytes)
                 self.pdf_logger.info(f"PDFGenerator: Generation complete, final PDF size: {len(final_pdf_bytes)} bytes")
             else:
                 self.logger.error("PDFGenerator: Concatenation failed")
@@ -104,16 +138,164 @@ class PDFGenerator:
             return final_pdf_bytes
             
         finally:
-            # Step 3: Always clean up temporary files, even if generation fails
+            # Step 4: Always clean up temporary files, even if generation fails
+            self._cleanup_temp_files()
+    
+    def fill_and_stream(self, template_paths: List[str], form_data: dict) -> Optional[Iterator[bytes]]:
+        """
+        Fill PDF templates and stream the merged document as each one is filled.
+        
+        The returned iterator yields the PDF header and the pages of the
+        first template right away; every further template is filled only when
+        the consumer asks for more, and the cross-reference table comes last,
+        so the whole document is never held in memory. The views write the
+        stream into GeneratedPDFStore before answering with the signed link,
+        so this lowers peak memory, not the client's time to first byte.
+        
+        The first template is filled before returning, so a document that
+        cannot be generated returns None rather than failing mid-response.
+        None is also returned when the backend cannot merge incrementally
+        (pdftk); callers then fall back to fill_and_concatenate. Streamed
+        output is not linearized, not packed into object streams and does
+        not share resources across templates, which all need the complete
+        file.
+        
+        Args:
+            template_paths: List of PDF template file paths
+            form_data: Dictionary of form field data for filling
+            
+        Returns:
+            Iterator of PDF byte chunks, or None
+        """
+        if not hasattr(self.backend, 'merge_incrementally'):
+            return None
+        
+        self.pdf_logger.info(f"PDFGenerator: Starting streamed generation with {len(template_paths)} PDF files")
+        filled_pdfs = self._iter_filled_pdfs(template_paths, form_data)
+        first = next(filled_pdfs, None)
+        if first is None:
+            self.logger.error("PDFGenerator: No PDFs were successfully filled")
+            self._cleanup_temp_files()
+            return None
+        
+        return self._stream(chain([first], filled_pdfs))
+    
+    def _stream(self, filled_pdfs: Iterator) -> Iterator[bytes]:
+        sent = 0
+        try:
+            for chunk in self.backend.merge_incrementally(filled_pdfs):
+                sent += len(chunk)
+                yield chunk
+            self.pdf_logger.info(f"PDFGenerator: Streamed generation complete, final PDF size: {sent} bytes")
+        finally:
+            self._cleanup_temp_files()
+    
+    def fill_and_concatenate_many(self, documents: List[Tuple[List[str], dict]]) -> Tuple[Optional[bytes], List[bool]]:
+        """
+        Fill several documents and concatenate them all into a single PDF.
+        
+        Used by batch renewals: every document is filled as in
+        fill_and_concatenate, but the filled pages of all documents are
+        merged once, in order, instead of producing one PDF per document.
+        
+        Args:
+            documents: (template_paths, form_data) of each document
+            
+        Returns:
+            tuple: (final PDF bytes or None, whether each document was filled)
+        """
+        self.pdf_logger.info(f"PDFGenerator: Starting batch generation of {len(documents)} documents")
+        
+        try:
+            filled_pdfs = []
+            filled_documents = []
+            first_index = 0
+            for template_paths, form_data in documents:
+                filled = self._fill_pdf_forms(template_paths, form_data, first_index=first_index)
+                filled_documents.append(bool(filled))
+                filled_pdfs.extend(filled)
+                first_index += len(template_paths)
+            
+            if not filled_pdfs:
+                self.logger.error("PDFGenerator: No PDFs were successfully filled")
+                return None, filled_documents
+            
+            with current_recorder().span('concat', documents=len(filled_pdfs)):
+                final_pdf_bytes = self._concatenate_pdfs(filled_pdfs)
+            if not final_pdf_bytes:
+                self.logger.error("PDFGenerator: Concatenation failed")
+                return None, [False] * len(documents)
+            
+            final_pdf_bytes = self._optimize_output(final_pdf_bytes)
+            self.pdf_logger.info(
+                f"PDFGenerator: Batch complete, {sum(filled_documents)}/{len(documents)} documents, "
+                f"final PDF size: {len(final_pdf_bytes)} bytes"
+            )
+            return final_pdf_bytes, filled_documents
+            
+        finally:
             self._cleanup_temp_files()
     
-    def _fill_pdf_forms(self, template_paths: List[str], form_data: dict) -> List[str]:
+    def _fill_pdf_forms(self, template_paths: List[str], form_data: dict, first_index: int = 0) -> list:
+        """
+        Fill PDF forms in memory when the backend supports it, otherwise in tmpfs.
+        
+        Form data is coerced to strings once; each template then receives only
+        the keys its field index contains (see _build_template_payloads).
+        Templates whose payload holds only settings.PDF_STATIC_FIELDS (no
+        fields at all, or per-doctor/clinic constants) are served from the
+        per-worker flattened rendition cache instead of being re-filled.
+        
+        Returns list of filled PDFs: in-memory documents for in-memory backends,
+        PDF bytes when filled by the parallel pool, and paths to filled PDFs in
+        tmpfs for file-based backends (and pdftk fallbacks).
+        
+        first_index offsets the tmpfs file names when several documents are
+        filled by the same generator.
+        """
+        filled_pdfs = list(self._iter_filled_pdfs(template_paths, form_data, first_index))
+        self.pdf_logger.info(f"PDFGenerator: Filled {len(filled_pdfs)} out of {len(template_paths)} PDFs")
+        return filled_pdfs
+    
+    def _iter_filled_pdfs(self, template_paths: List[str], form_data: dict, first_index: int = 0) -> Iterator:
         """
-        Fill PDF forms using tmpfs for memory optimization.
+        Fill templates one at a time, yielding each filled PDF (see _fill_pdf_forms).
         
-        Returns list of paths to filled PDFs in tmpfs.
+        Templates that fail are skipped. Filling is lazy: a template is only
+        filled when the next document is requested (except for templates
+        filled upfront by the parallel pool).
+        
+        Each fill is recorded as a 'fill' span of the current recorder, which
+        is captured on the first fill: streamed fills run after the caller's
+        recording has been closed.
         """
-        filled_pdf_paths = []
+        spans = current_recorder()
+        
+        # Debug: Log form data to identify problematic values
+        self.pdf_logger.debug(f"PDFGenerator: Form data keys: {list(form_data.keys())}")
+        self.pdf_logger.debug(f"PDFGenerator: Form data sample: {dict(list(form_data.items())[:5])}")
+        
+        # Check for problematic values that might cause pdftk to fail
+        cleaned_form_data = {}
+        for key, value in form_data.items():
+            if value is None:
+                cleaned_form_data[key] = ""
+            elif isinstance(value, (list, dict)):
+                # Convert complex types to strings
+                cleaned_form_data[key] = str(value)
+            else:
+                cleaned_form_data[key] = str(value)
+        
+        templates = [template_registry.get(path) for path in template_paths]
+        payloads = self._build_template_payloads(templates, cleaned_form_data)
+        static = [self._is_static(template, payload) for template, payload in zip(templates, payloads)]
+        
+        # Opt-in: fill independent templates concurrently in the process pool
+        pool_start = time.perf_counter()
+        pooled_pdfs = self._fill_in_pool(template_paths, payloads, skip=static)
+        if any(pdf is not None for pdf in pooled_pdfs):
+            spans.add('fill_pool', time.perf_counter() - pool_start,
+                      templates=sum(pdf is not None for pdf in pooled_pdfs))
         
         for i, template_path in enumerate(template_paths):
             self.pdf_logger.debug(f"PDFGenerator: Processing PDF {i+1}/{len(template_paths)}: {template_path}")
@@ -122,68 +304,157 @@ class PDFGenerator:
                 self.logger.warning(f"PDFGenerator: Template not found: {template_path}")
                 continue
                 
+            if pooled_pdfs[i] is not None:
+                source = 'pool'
+            elif static[i]:
+                source = 'static'
+            else:
+                source = 'memory' if self.backend.in_memory else 'tmpfs'
+            
             try:
-                # Use tmpfs for memory-based operations
-                timestamp = int(time.time() * 1000)
-                ram_pdf_path = f"/dev/shm/pdf_temp_{os.getpid()}_{i}_{timestamp}.pdf"
-                self.pdf_logger.debug(f"PDFGenerator: Filling to RAM path: {ram_pdf_path}")
-                
-                # Track temp file for cleanup
-                self.temp_files.append(ram_pdf_path)
-                
-                # Debug: Log form data to identify problematic values
-                self.pdf_logger.debug(f"PDFGenerator: Form data keys: {list(form_data.keys())}")
-                self.pdf_logger.debug(f"PDFGenerator: Form data sample: {dict(list(form_data.items())[:5])}")
-                
-                # Check for problematic values that might cause pdftk to fail
-                cleaned_form_data = {}
-                for key, value in form_data.items():
-                    if value is None:
-                        cleaned_form_data[key] = ""
-                    elif isinstance(value, (list, dict)):
-                        # Convert complex types to strings
-                        cleaned_form_data[key] = str(value)
-                    else:
-                        cleaned_form_data[key] = str(value)
-                
                 # Fill form and flatten immediately to make fields non-editable
-                filled_path = pypdftk.fill_form(
-                    template_path,
-                    cleaned_form_data,
-                    ram_pdf_path,
-                    flatten=True  # Flatten each PDF after filling to merge form fields
-                )
-                
-                if filled_path and os.path.exists(filled_path):
-                    # Validate PDF exists and has content
-                    file_size = os.path.getsize(filled_path)
-                    self.pdf_logger.debug(f"PDFGenerator: Filled PDF size: {file_size} bytes")
-                    
-                    if file_size > 100:
-                        filled_pdf_paths.append(filled_path)
-                        self.pdf_logger.info(f"PDFGenerator: Successfully filled: {os.path.basename(template_path)}")
+                with spans.span('fill', template=os.path.basename(template_path), source=source):
+                    if source == 'pool':
+                        filled_pdf = pooled_pdfs[i]
+                    elif source == 'static':
+                        filled_pdf = self._fill_static(templates[i], payloads[i], first_index + i)
+                    elif source == 'memory':
+                        filled_pdf = self._fill_in_memory(template_path, payloads[i], first_index + i)
                     else:
-                        self.logger.warning(f"PDFGenerator: Filled PDF too small ({file_size} bytes): {filled_path}")
-                else:
-                    self.logger.warning(f"PDFGenerator: pypdftk returned no output for: {template_path}")
-                        
+                        filled_pdf = self._fill_to_tmpfs(template_path, payloads[i], first_index + i)
             except Exception as e:
                 self.logger.error(f"PDFGenerator: Failed to fill {template_path}: {e}", exc_info=True)
+                continue
+            
+            if filled_pdf is not None:
+                self.pdf_logger.info(f"PDFGenerator: Successfully filled: {os.path.basename(template_path)}")
+                yield filled_pdf
+    
+    def _build_template_payloads(self, templates: list, form_data: dict) -> List[dict]:
+        """
+        Prune form_data to the fields of each template, using the registry's field index.
+        
+        templates holds the registry entry of each template (None if missing).
+        Templates without an index (missing file, pypdf unavailable) get the
+        full form data. Keys no template of the document knows are counted in
+        template_registry.unknown_field_counts and logged at debug level.
+        """
+        payloads = [
+            template.prune_form_data(form_data) if template else form_data
+            for template in templates
+        ]
+        
+        unknown = template_registry.count_unknown_fields([t for t in templates if t], form_data)
+        if unknown:
+            self.pdf_logger.debug(f"PDFGenerator: {len(unknown)} form data keys match no template field: {sorted(unknown)}")
+        self.pdf_logger.debug(
+            f"PDFGenerator: Field payload sizes {[len(payload) for payload in payloads]} (from {len(form_data)} keys)"
+        )
+        return payloads
+    
+    def _is_static(self, template, payload: dict) -> bool:
+        """True when the filled template depends only on constant (per-doctor/clinic) data."""
+        return (
+            self.backend.in_memory
+            and template is not None
+            and template.has_field_index
+            and set(payload) <= settings.PDF_STATIC_FIELDS
+        )
+    
+    def _fill_static(self, template, payload: dict, index: int):
+        """Return the cached flattened rendition of a static template, filling it on first use."""
+        document = flattened_cache.get(template, payload)
+        if document is None:
+            document = self._fill_in_memory(template.path, payload, index)
+            if not isinstance(document, str):  # pdftk fallback files are temporary
+                flattened_cache.set(template, payload, document)
+        else:
+            self.pdf_logger.debug(f"PDFGenerator: Reusing flattened {os.path.basename(template.path)}")
+        return document
+    
+    def _fill_in_pool(self, template_paths: List[str], payloads: List[dict], skip: Optional[List[bool]] = None) -> list:
+        """
+        Fill templates in the parallel fill pool when enabled.
+        
+        Templates flagged in skip (e.g. static templates served from cache)
+        are never sent to the pool.
         
-        self.pdf_logger.info(f"PDFGenerator: Filled {len(filled_pdf_paths)} out of {len(template_paths)} PDFs")
-        return filled_pdf_paths
+        Returns one entry per template: filled PDF bytes, or None for templates
+        that must be filled inline (pool disabled, busy, or the fill failed).
+        """
+        pooled_pdfs = [None] * len(template_paths)
+        skip = skip or [False] * len(template_paths)
+        if not (self.parallel and self.backend.in_memory and skip.count(False) > 1):
+            return pooled_pdfs
+        
+        indexes = [i for i, path in enumerate(template_paths) if not skip[i] and os.path.exists(path)]
+        jobs = [(template_paths[i], payloads[i]) for i in indexes]
+        results = fill_pool.fill_many(self.backend.name, jobs, settings.PDF_PARALLEL_PER_REQUEST)
+        for i, result in zip(indexes, results):
+            pooled_pdfs[i] = result
+        
+        self.pdf_logger.info(f"PDFGenerator: Filled {sum(r is not None for r in results)} of {len(jobs)} PDFs in parallel pool")
+        return pooled_pdfs
+    
+    def _fill_in_memory(self, template_path: str, form_data: dict, index: int):
+        """Fill a template without touching disk, falling back to pdftk in tmpfs."""
+        try:
+            return self.backend.fill_in_memory(template_path, form_data)
+        except Exception as e:
+            self.logger.warning(f"PDFGenerator: {self.backend.name} fill_in_memory failed ({e}), falling back to pdftk")
+            return self._fill_to_tmpfs(template_path, form_data, index, backend=PdftkBackend())
     
-    def _concatenate_pdfs(self, pdf_paths: List[str]) -> Optional[bytes]:
+    def _fill_to_tmpfs(self, template_path: str, form_data: dict, index: int, backend=None) -> Optional[str]:
+        """Fill a template into a tmpfs file and return its path, or None if the output is unusable."""
+        # Use tmpfs for memory-based operations, within the scratch quota
+        reservation = scratch_space.reserve(os.path.getsize(template_path) * FILL_SCRATCH_FACTOR)
+        self.scratch_reservations.append(reservation)
+        ram_pdf_path = reservation.path(f"pdf_temp_{index}")
+        self.pdf_logger.debug(f"PDFGenerator: Filling to RAM path: {ram_pdf_path}")
+        
+        # Track temp file for cleanup
+        self.temp_files.append(ram_pdf_path)
+        
+        if backend is not None:
+            filled_path = backend.fill_form(template_path, form_data, ram_pdf_path)
+        else:
+            filled_path = self._run_backend('fill_form', template_path, form_data, ram_pdf_path)
+        
+        if not filled_path or not os.path.exists(filled_path):
+            self.logger.warning(f"PDFGenerator: {(backend or self.backend).name} backend returned no output for: {template_path}")
+            return None
+        
+        # Validate PDF exists and has content
+        file_size = os.path.getsize(filled_path)
+        scratch_space.settle(reservation, file_size)
+        self.pdf_logger.debug(f"PDFGenerator: Filled PDF size: {file_size} bytes")
+        
+        if file_size <= 100:
+            self.logger.warning(f"PDFGenerator: Filled PDF too small ({file_size} bytes): {filled_path}")
+            return None
+        return filled_path
+    
+    def _concatenate_pdfs(self, filled_pdfs: list) -> Optional[bytes]:
         """Concatenate multiple PDFs into single document."""
-        if not pdf_paths:
+        if not filled_pdfs:
             self.logger.error("PDFGenerator: No PDFs to concatenate")
             return None
+        
+        # In-memory pipeline - merge straight into one buffer, no intermediate files
+        if self.backend.in_memory:
+            try:
+                pdf_bytes = self.backend.merge(filled_pdfs)
+                self.pdf_logger.info(f"PDFGenerator: Merged {len(filled_pdfs)} PDFs in memory")
+                return pdf_bytes
+            except Exception as e:
+                self.logger.error(f"PDFGenerator: In-memory merge failed: {e}", exc_info=True)
+                return None
             
         # Single PDF optimization - just read and return
-        if len(pdf_paths) == 1:
+        if len(filled_pdfs) == 1:
             try:
-                self.pdf_logger.debug(f"PDFGenerator: Single PDF, reading directly: {pdf_paths[0]}")
-                with open(pdf_paths[0], 'rb') as f:
+                self.pdf_logger.debug(f"PDFGenerator: Single PDF, reading directly: {filled_pdfs[0]}")
+                with open(filled_pdfs[0], 'rb') as f:
                     pdf_bytes = f.read()
                 self.pdf_logger.debug(f"PDFGenerator: Read {len(pdf_bytes)} bytes")
                 return pdf_bytes
@@ -192,16 +463,17 @@ class PDFGenerator:
                 return None
         
         try:
-            # Concatenate using pypdftk directly with file paths
-            output_path = f"/dev/shm/output_{os.getpid()}_{int(time.time() * 1000)}.pdf"
-            self.pdf_logger.debug(f"PDFGenerator: Concatenating {len(pdf_paths)} PDFs to: {output_path}")
+            # Concatenate through the fill backend directly with file paths
+            reservation = scratch_space.reserve(sum(os.path.getsize(path) for path in filled_pdfs))
+            self.scratch_reservations.append(reservation)
+            output_path = reservation.path('output')
+            self.pdf_logger.debug(f"PDFGenerator: Concatenating {len(filled_pdfs)} PDFs to: {output_path}")
             
             # Track output file for cleanup
             self.temp_files.append(output_path)
             
-            # Note: pypdftk.concat() does NOT support flatten parameter
             # PDFs are already flattened during fill_form() above
-            result = pypdftk.concat(pdf_paths, output_path)
+            result = self._run_backend('concat', filled_pdfs, output_path)
             
             if result and os.path.exists(result):
                 file_size = os.path.getsize(result)
@@ -210,15 +482,50 @@ class PDFGenerator:
                 with open(result, 'rb') as f:
                     pdf_bytes = f.read()
                 
-                self.pdf_logger.info(f"PDFGenerator: Successfully concatenated {len(pdf_paths)} PDFs")
+                self.pdf_logger.info(f"PDFGenerator: Successfully concatenated {len(filled_pdfs)} PDFs")
                 return pdf_bytes
             else:
-                self.logger.error("PDFGenerator: pypdftk concat returned no output")
+                self.logger.error(f"PDFGenerator: {self.backend.name} concat returned no output")
                 return None
                 
         except Exception as e:
             self.logger.error(f"PDFGenerator: Concatenation failed: {e}", exc_info=True)
             return None
+    
+    def _optimize_output(self, pdf_bytes: bytes) -> bytes:
+        """
+        Linearize and/or pack the final document into object streams when enabled
+        (one qpdf pass); the original bytes are kept on failure.
+        """
+        linearizer = PDFLinearizer()
+        if not (self.linearize or linearizer.object_streams):
+            return pdf_bytes
+        start = time.time()
+        with current_recorder().span('optimize', linearize=self.linearize):
+            if self.linearize:
+                optimized = linearizer.linearize_bytes(pdf_bytes)
+            else:
+                optimized = linearizer.compact_bytes(pdf_bytes)
+        if optimized is not pdf_bytes:
+            self.pdf_logger.info(
+                f"PDFGenerator: Rewrote final PDF with qpdf in {time.time() - start:.3f}s "
+                f"({len(pdf_bytes)} -> {len(optimized)} bytes)"
+            )
+        return optimized
+    
+    def _run_backend(self, operation: str, *args):
+        """
+        Run a backend operation, retrying once with pdftk if another backend fails.
+        
+        Keeps pdftk as the safety net for templates the in-process engine cannot handle.
+        """
+        try:
+            return getattr(self.backend, operation)(*args)
+        except Exception as e:
+            if isinstance(self.backend, PdftkBackend):
+                raise
+            self.logger.warning(f"PDFGenerator: {self.backend.name} {operation} failed ({e}), falling back to pdftk")
+            return getattr(PdftkBackend(), operation)(*args)
 
 
 class PDFResponseBuilder:
@@ -254,4 +561,26 @@ class PDFResponseBuilder:
         response['X-Frame-Options'] = 'SAMEORIGIN'
         
         self.logger.info(f"PDFResponseBuilder: Created response for {filename} ({len(pdf_bytes)} bytes)")
+        return response
+    
+    def build_streaming_response(self, chunks: Iterator[bytes], filename: str) -> StreamingHttpResponse:
+        """
+        Create HTTP response streaming PDF chunks as they are generated.
+        
+        Args:
+            chunks: PDF document data, e.g. from PDFGenerator.fill_and_stream
+            filename: Filename for the PDF
+            
+        Returns:
+            StreamingHttpResponse: Configured response for PDF delivery (no Content-Length)
+        """
+        self.logger.debug(f"PDFResponseBuilder: Building streaming response for file: {filename}")
+        
+        response = StreamingHttpResponse(chunks, content_type='application/pdf')
+        response['Content-Disposition'] = f'inline; filename="{filename}"'
+        
+        # Security headers
+        response['X-Content-Type-Options'] = 'nosniff'
+        response['X-Frame-Options'] = 'SAMEORIGIN'
+        
         return response
\ No newline at end of file
@@ -0,0 +1,264 @@
+"""
+Parallel PDF Fill Pool - Infrastructure Layer
+
+Opt-in (settings.PDF_PARALLEL_FILL) pool of forked processes that fill
+independent templates of one document at the same time.
+
+Concurrency is capped twice:
+- per request: at most PDF_PARALLEL_PER_REQUEST templates of one document in flight
+- globally: PDF_PARALLEL_GLOBAL_LIMIT slots shared by every uwsgi worker, counted
+  in FillSlotLedger (a small SQLite file, settings.PDF_PARALLEL_SLOTS_FILE). Each
+  slot records the uwsgi worker holding it, so slots of workers that died
+  (reload, OOM, harakiri) are reclaimed instead of draining the limit.
+
+When no global slot is free the remaining templates are handed back to the
+caller to be filled inline, so a large request degrades to sequential filling
+instead of queueing behind - or starving - other workers.
+
+Each request thread of a uwsgi worker has its own pool, so a fill that does
+not finish within PDF_PARALLEL_TIMEOUT gets only that thread's fill processes
+killed and their slots released (the pool is started again on next use);
+requests running in the worker's other threads keep theirs. Fill processes
+are forked from a single-threaded fork server (with this module preloaded),
+never from the multithreaded uwsgi worker.
+"""
+
+import logging
+import multiprocessing
+import os
+import sqlite3
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from processos.utils.process_utils import pid_alive
+
+
+logger = logging.getLogger(__name__)
+pdf_logger = logging.getLogger('processos.pdf')
+
+KILL_JOIN_SECONDS = 1
+
+
+def fill_template_to_bytes(backend_name: str, template_path: str, form_data: Dict[str, str]) -> bytes:
+    """Pool task: fill and flatten one template, returning the PDF bytes."""
+    from processos.services.pdf_engines import get_pdf_backend
+
+    backend = get_pdf_backend(backend_name)
+    # merge() of a single document only serialises the objects its pages reference
+    return backend.merge([backend.fill_in_memory(template_path, form_data)])
+
+
+def _init_fill_process() -> None:
+    """Fill process initializer: processes started by the fork server have no Django apps loaded."""
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+
+
+def _noop() -> None:
+    """Pool task used to pre-fork the worker processes."""
+
+
+class FillSlotLedger:
+    """
+    Global fill slots held by uwsgi workers, stored in SQLite.
+
+    One connection per operation keeps it safe across uwsgi processes and
+    threads (see ScratchLedger); slots are counted and taken in one
+    immediate transaction.
+    """
+
+    # Ledger files whose schema was already created by this process
+    _initialized = set()
+
+    def __init__(self, path: str):
+        self.path = path
+
+    @contextmanager
+    def _connect(self):
+        needs_schema = self.path not in self._initialized or not os.path.exists(self.path)
+        if needs_schema:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        try:
+            if needs_schema:
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS slots (id INTEGER PRIMARY KEY AUTOINCREMENT, pid INTEGER NOT NULL)'
+                )
+                self._initialized.add(self.path)
+            yield conn
+        finally:
+            conn.close()
+
+    def acquire(self, pid: int, limit: int) -> Optional[int]:
+        """Take a slot for pid and return its id, or None when limit slots are held by live workers."""
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if conn.execute('SELECT COUNT(*) FROM slots').fetchone()[0] >= limit:
+                    # Slots of dead workers are free, check before giving up
+                    dead = [pid for (pid,) in conn.execute('SELECT DISTINCT pid FROM slots') if not pid_alive(pid)]
+                    if not dead:
+                        return None
+                    conn.executemany('DELETE FROM slots WHERE pid = ?', [(pid,) for pid in dead])
+                    pdf_logger.info(f"FillSlotLedger: Reclaimed fill slots of {len(dead)} dead workers")
+                    if conn.execute('SELECT COUNT(*) FROM slots').fetchone()[0] >= limit:
+                        return None
+                return conn.execute('INSERT INTO slots (pid) VALUES (?)', (pid,)).lastrowid
+            finally:
+                conn.execute('COMMIT')
+
+    def release(self, slot_ids) -> None:
+        with self._connect() as conn:
+            conn.executemany('DELETE FROM slots WHERE id = ?', [(slot_id,) for slot_id in slot_ids])
+
+    def release_pids(self, pids) -> None:
+        with self._connect() as conn:
+            conn.executemany('DELETE FROM slots WHERE pid = ?', [(pid,) for pid in pids])
+
+    def count(self) -> int:
+        with self._connect() as conn:
+            return conn.execute('SELECT COUNT(*) FROM slots').fetchone()[0]
+
+
+class PDFFillPool:
+    """
+    Bounded process pools used by every PDFGenerator in this uwsgi worker, one per thread.
+
+    Fill processes are started lazily on first use in each thread (a pool
+    created in the master would not survive uwsgi's fork) and then kept warm.
+    """
+
+    def __init__(self, size: int, global_limit: int, timeout: float, slots_path: Optional[str] = None):
+        self.size = size
+        self.global_limit = global_limit
+        self.timeout = timeout
+        self.slots = FillSlotLedger(slots_path or settings.PDF_PARALLEL_SLOTS_FILE)
+        self._local = threading.local()  # executor and owner_pid of the calling thread
+
+    def fill_many(self, backend_name: str, jobs: List[Tuple[str, Dict[str, str]]], per_request_limit: int) -> List[Optional[bytes]]:
+        """
+        Fill (template_path, form_data) jobs in the pool, preserving order.
+
+        Returns one entry per job: the filled PDF bytes, or None when the job
+        failed, timed out or found no free global slot. The caller fills the
+        None entries inline.
+        """
+        results: List[Optional[bytes]] = [None] * len(jobs)
+        try:
+            executor = self._get_executor()
+        except Exception as e:
+            logger.warning(f"PDFFillPool: Pool unavailable ({e}), filling inline")
+            return results
+
+        pending = deque(enumerate(jobs))
+        in_flight = {}  # future -> (job index, slot id)
+        try:
+            while pending or in_flight:
+                while pending and len(in_flight) < per_request_limit:
+                    slot_id = self._acquire_slot()
+                    if slot_id is None:
+                        break
+                    index, (template_path, form_data) = pending.popleft()
+                    try:
+                        future = executor.submit(fill_template_to_bytes, backend_name, template_path, form_data)
+                    except Exception as e:
+                        self._release_slots([slot_id])
+                        self._reset_executor()
+                        logger.warning(f"PDFFillPool: Submit failed ({e}), filling inline")
+                        return results
+                    in_flight[future] = (index, slot_id)
+
+                if not in_flight:
+                    pdf_logger.info(f"PDFFillPool: Global limit reached, {len(pending)} templates left for inline fill")
+                    break
+
+                done, _ = wait(in_flight, timeout=self.timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    logger.warning(
+                        f"PDFFillPool: No template finished within {self.timeout}s, "
+                        f"killing the fill processes and filling the rest inline"
+                    )
+                    self._reset_executor()
+                    break
+
+                for future in done:
+                    index, slot_id = in_flight.pop(future)
+                    self._release_slots([slot_id])
+                    try:
+                        results[index] = future.result()
+                    except BrokenProcessPool as e:
+                        self._reset_executor()
+                        logger.warning(f"PDFFillPool: Pool broke on {jobs[index][0]} ({e}), restarting on next use")
+                    except Exception as e:
+                        logger.warning(f"PDFFillPool: Template {jobs[index][0]} failed in pool: {e}")
+        finally:
+            # Left behind by a timeout (their processes are killed) or an error
+            if in_flight:
+                for future in in_flight:
+                    future.cancel()
+                self._release_slots([slot_id for _, slot_id in in_flight.values()])
+
+        return results
+
+    def _acquire_slot(self) -> Optional[int]:
+        try:
+            return self.slots.acquire(os.getpid(), self.global_limit)
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"PDFFillPool: Fill slot ledger unavailable ({e}), filling inline")
+            return None
+
+    def _release_slots(self, slot_ids) -> None:
+        try:
+            self.slots.release(slot_ids)
+        except (OSError, sqlite3.Error) as e:
+            logger.error(f"PDFFillPool: Failed to release fill slots {slot_ids}: {e}")
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """The calling thread's executor, started on first use in this process."""
+        local = self._local
+        if getattr(local, 'executor', None) is not None and local.owner_pid == os.getpid():
+            return local.executor
+
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload([__name__])
+        executor = ProcessPoolExecutor(max_workers=self.size, mp_context=context, initializer=_init_fill_process)
+        # Start every fill process now instead of on the first busy request
+        wait([executor.submit(_noop) for _ in range(self.size)])
+        local.executor = executor
+        local.owner_pid = os.getpid()
+        pdf_logger.info(
+            f"PDFFillPool: Started {self.size} fill processes for worker {os.getpid()} "
+            f"({threading.current_thread().name})"
+        )
+        return executor
+
+    def _reset_executor(self) -> None:
+        """Drop the calling thread's executor, killing its processes (a hung fill would otherwise keep running)."""
+        local = self._local
+        executor = getattr(local, 'executor', None)
+        if executor is not None and local.owner_pid == os.getpid():
+            processes = list((executor._processes or {}).values())
+            executor.shutdown(wait=False, cancel_futures=True)
+            for process in processes:
+                process.kill()
+            for process in processes:
+                process.join(KILL_JOIN_SECONDS)
+        local.executor = None
+        local.owner_pid = None
+
+
+fill_pool = PDFFillPool(
+    size=getattr(settings, 'PDF_PARALLEL_POOL_SIZE', 2),
+    global_limit=getattr(settings, 'PDF_PARALLEL_GLOBAL_LIMIT', 4),
+    timeout=getattr(settings, 'PDF_PARALLEL_TIMEOUT', 30),
+)
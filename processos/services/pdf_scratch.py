@@ -0,0 +1,290 @@
+"""
+PDF Scratch Space - Infrastructure Layer
+
+Bounds the tmpfs space used by PDF scratch files (pdftk fills and concats,
+qpdf rewrites). /dev/shm also holds the template copy made by startup.sh,
+so an unbounded burst of large generations could exhaust it and break
+template reads.
+
+Every scratch file is covered by a reservation taken before it is
+written:
+
+    reservation = scratch_space.reserve(estimated_bytes)
+    path = reservation.path('pdf_temp')
+    ...                                   # write path
+    scratch_space.settle(reservation, os.path.getsize(path))
+    scratch_space.release(reservation)    # after deleting path
+
+Reservations are counted in ScratchLedger, a small SQLite file in
+settings.PDF_SCRATCH_DIR shared by all uwsgi workers, against
+PDF_SCRATCH_QUOTA_BYTES (0: unbounded). When the quota is reached the
+caller is given a directory on disk (PDF_SCRATCH_FALLBACK_DIR) instead,
+right away: a slower disk write beats holding the uwsgi worker. Waiting up
+to PDF_SCRATCH_WAIT_SECONDS for space to be released is opt-in.
+
+Each worker writes into its own scratch directory (<PDF_SCRATCH_DIR>/<pid>),
+created once and reused by every generation of the worker; directories
+and reservations of workers that died are reclaimed.
+"""
+
+import itertools
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from django.conf import settings
+
+from processos.utils.process_utils import pid_alive
+
+
+logger = logging.getLogger(__name__)
+pdf_logger = logging.getLogger('processos.pdf')
+
+WAIT_POLL_SECONDS = 0.05
+
+
+class ScratchLedger:
+    """
+    Outstanding scratch reservations and usage counters, stored in SQLite.
+
+    One connection per operation keeps it safe across uwsgi processes and
+    threads (see GeneratedFileIndex); reservations are checked and taken in
+    one immediate transaction.
+    """
+
+    filename = '.scratch_ledger.sqlite3'
+
+    # Ledger files whose schema was already created by this process
+    _initialized = set()
+
+    def __init__(self, directory: str):
+        self.path = os.path.join(directory, self.filename)
+
+    @contextmanager
+    def _connect(self):
+        needs_schema = self.path not in self._initialized or not os.path.exists(self.path)
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        try:
+            if needs_schema:
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS reservations ('
+                    'id INTEGER PRIMARY KEY AUTOINCREMENT, pid INTEGER NOT NULL, size INTEGER NOT NULL)'
+                )
+                conn.execute('CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+                self._initialized.add(self.path)
+            yield conn
+        finally:
+            conn.close()
+
+    def reserve(self, pid: int, size: int, quota: int) -> Optional[int]:
+        """Record a reservation of size bytes and return its id, or None if it exceeds quota."""
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                current = conn.execute('SELECT COALESCE(SUM(size), 0) FROM reservations').fetchone()[0]
+                if quota and current + size > quota:
+                    return None
+                reservation_id = conn.execute(
+                    'INSERT INTO reservations (pid, size) VALUES (?, ?)', (pid, size)
+                ).lastrowid
+                conn.execute(
+                    "INSERT INTO counters (name, value) VALUES ('peak_bytes', ?) "
+                    "ON CONFLICT(name) DO UPDATE SET value = MAX(value, excluded.value)",
+                    (current + size,),
+                )
+                return reservation_id
+            finally:
+                conn.execute('COMMIT')
+
+    def resize(self, reservation_id: int, size: int) -> None:
+        with self._connect() as conn:
+            conn.execute('UPDATE reservations SET size = ? WHERE id = ?', (size, reservation_id))
+
+    def release(self, reservation_id: int) -> None:
+        with self._connect() as conn:
+            conn.execute('DELETE FROM reservations WHERE id = ?', (reservation_id,))
+
+    def release_pids(self, pids) -> None:
+        with self._connect() as conn:
+            conn.executemany('DELETE FROM reservations WHERE pid = ?', [(pid,) for pid in pids])
+
+    def pids(self) -> set:
+        with self._connect() as conn:
+            return {row[0] for row in conn.execute('SELECT DISTINCT pid FROM reservations')}
+
+    def increment(self, name: str) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO counters (name, value) VALUES (?, 1) '
+                'ON CONFLICT(name) DO UPDATE SET value = value + 1',
+                (name,),
+            )
+
+    def stats(self) -> Dict[str, int]:
+        with self._connect() as conn:
+            current, count = conn.execute('SELECT COALESCE(SUM(size), 0), COUNT(*) FROM reservations').fetchone()
+            counters = dict(conn.execute('SELECT name, value FROM counters'))
+        return {
+            'current_bytes': current,
+            'reservations': count,
+            'peak_bytes': counters.get('peak_bytes', 0),
+            'rejected': counters.get('rejected', 0),
+        }
+
+
+class ScratchReservation:
+    """Reserved scratch bytes and the directory the scratch file goes to."""
+
+    _sequence = itertools.count()
+
+    def __init__(self, directory: str, size: int, reservation_id: Optional[int] = None, on_disk: bool = False):
+        self.directory = directory
+        self.size = size
+        self.id = reservation_id  # None: not counted (quota disabled or fallback to disk)
+        self.on_disk = on_disk  # Quota exhausted or tmpfs unavailable: the file goes to the fallback directory
+
+    def path(self, prefix: str, suffix: str = '.pdf') -> str:
+        """A new scratch file path in the reserved directory."""
+        return os.path.join(self.directory, f"{prefix}_{os.getpid()}_{next(self._sequence)}{suffix}")
+
+
+class ScratchSpace:
+    """Quota-bounded tmpfs scratch space of one uwsgi worker (see module docstring)."""
+
+    def __init__(self, directory: Optional[str] = None, quota_bytes: Optional[int] = None,
+                 wait_seconds: Optional[float] = None, fallback_dir: Optional[str] = None):
+        self.directory = directory or settings.PDF_SCRATCH_DIR
+        self.quota_bytes = settings.PDF_SCRATCH_QUOTA_BYTES if quota_bytes is None else quota_bytes
+        self.wait_seconds = settings.PDF_SCRATCH_WAIT_SECONDS if wait_seconds is None else wait_seconds
+        self.fallback_dir = fallback_dir or settings.PDF_SCRATCH_FALLBACK_DIR
+        self.ledger = ScratchLedger(self.directory)
+        self._released = threading.Condition()
+        self._worker_dir: Optional[str] = None
+        self._owner_pid: Optional[int] = None
+
+    def reserve(self, size: int) -> ScratchReservation:
+        """
+        Reserve size bytes of tmpfs scratch space.
+
+        While the quota is exhausted, returns a reservation for the fallback
+        directory on disk, after waiting up to wait_seconds (default 0: no
+        wait) for releases. Never raises: ledger failures are logged and the
+        reservation is left uncounted.
+        """
+        worker_dir = self._get_worker_dir()
+        if worker_dir is None:
+            return ScratchReservation(self.fallback_dir, size, on_disk=True)
+        if not self.quota_bytes:
+            return ScratchReservation(worker_dir, size)
+
+        deadline = time.monotonic() + self.wait_seconds
+        reclaimed = False
+        try:
+            while True:
+                reservation_id = self.ledger.reserve(os.getpid(), size, self.quota_bytes)
+                if reservation_id is not None:
+                    return ScratchReservation(worker_dir, size, reservation_id)
+                if not reclaimed:
+                    # Space held by dead workers is free, check before waiting
+                    reclaimed = True
+                    if self._reclaim_quietly():
+                        continue
+                remaining = deadline - time.monotonic()
+                if not self.wait_seconds or remaining <= 0:
+                    break
+                # Woken early by releases in this worker; other workers are polled
+                with self._released:
+                    self._released.wait(min(remaining, WAIT_POLL_SECONDS))
+
+            self.ledger.increment('rejected')
+        except sqlite3.Error as e:
+            logger.error(f"ScratchSpace: Scratch ledger unavailable ({e}), reservation not counted")
+            return ScratchReservation(worker_dir, size)
+
+        logger.warning(
+            f"ScratchSpace: tmpfs scratch quota of {self.quota_bytes} bytes reached, "
+            f"writing {size} bytes to {self.fallback_dir}"
+        )
+        return ScratchReservation(self.fallback_dir, size, on_disk=True)
+
+    def settle(self, reservation: ScratchReservation, size: int) -> None:
+        """Replace the estimated size of reservation with the bytes actually written."""
+        if reservation.id is None or size == reservation.size:
+            return
+        try:
+            self.ledger.resize(reservation.id, size)
+            reservation.size = size
+        except sqlite3.Error as e:
+            logger.error(f"ScratchSpace: Failed to resize reservation {reservation.id}: {e}")
+
+    def release(self, reservation: ScratchReservation) -> None:
+        """Return reservation's bytes to the quota (its files must already be deleted)."""
+        if reservation.id is None:
+            return
+        try:
+            self.ledger.release(reservation.id)
+        except sqlite3.Error as e:
+            logger.error(f"ScratchSpace: Failed to release reservation {reservation.id}: {e}")
+        reservation.id = None
+        with self._released:
+            self._released.notify_all()
+
+    @contextmanager
+    def reserved(self, size: int):
+        """reserve() for the enclosed block; the block must delete its files."""
+        reservation = self.reserve(size)
+        try:
+            yield reservation
+        finally:
+            self.release(reservation)
+
+    def stats(self) -> Dict[str, int]:
+        """Current/peak reserved bytes and rejected reservations, across all workers."""
+        if not os.path.isdir(self.directory):
+            return {'current_bytes': 0, 'reservations': 0, 'peak_bytes': 0, 'rejected': 0,
+                    'quota_bytes': self.quota_bytes}
+        return dict(self.ledger.stats(), quota_bytes=self.quota_bytes)
+
+    def reclaim_dead_workers(self) -> int:
+        """Delete the scratch directories and reservations of workers that are gone."""
+        dead = {pid for pid in self.ledger.pids() if not pid_alive(pid)}
+        for name in os.listdir(self.directory):
+            if name.isdigit() and not pid_alive(int(name)):
+                dead.add(int(name))
+        for pid in dead:
+            shutil.rmtree(os.path.join(self.directory, str(pid)), ignore_errors=True)
+        if dead:
+            self.ledger.release_pids(dead)
+            pdf_logger.info(f"ScratchSpace: Reclaimed scratch space of {len(dead)} dead workers")
+        return len(dead)
+
+    def _reclaim_quietly(self) -> int:
+        try:
+            return self.reclaim_dead_workers()
+        except OSError as e:
+            logger.warning(f"ScratchSpace: Failed to reclaim dead workers' scratch space: {e}")
+            return 0
+
+    def _get_worker_dir(self) -> Optional[str]:
+        """This worker's scratch directory, created (and dead workers reclaimed) on first use."""
+        if self._owner_pid == os.getpid():
+            return self._worker_dir
+        worker_dir = os.path.join(self.directory, str(os.getpid()))
+        try:
+            os.makedirs(worker_dir, exist_ok=True)
+            self._reclaim_quietly()
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"ScratchSpace: tmpfs scratch directory unavailable ({e}), using {self.fallback_dir}")
+            worker_dir = None
+        self._worker_dir = worker_dir
+        self._owner_pid = os.getpid()
+        return worker_dir
+
+
+scratch_space = ScratchSpace()
@@ -0,0 +1,77 @@
+"""
+PDF Generation Spans - Infrastructure Layer
+
+Per-stage timings of one PDF generation, persisted with its
+PDFGenerationLog row (analytics.signals.track_pdf_generation):
+
+    with recording() as spans:               # opened by track_pdf_generation
+        with current_recorder().span('template_selection'):
+            ...
+        current_recorder().annotate(template_count=5)
+
+Stages record themselves through current_recorder(), which returns a
+disabled recorder outside a recording, so the PDF services work the same
+without one. Code that runs after the recording was closed (streamed
+fills, saving the response) captures the recorder first: it travels with
+the generated response as response.pdf_spans.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+
+class PDFSpanRecorder:
+    """Collects (stage, milliseconds, attributes) spans and generation attributes."""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.spans = []
+        self.attributes = {}
+        self.log_id: Optional[int] = None  # PDFGenerationLog row the spans belong to
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, stage: str, **attributes) -> Iterator[None]:
+        """Time the enclosed block as stage (recorded even if it raises)."""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start, **attributes)
+
+    def add(self, stage: str, seconds: float, **attributes) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self.spans.append({'stage': stage, 'ms': round(seconds * 1000, 2), **attributes})
+
+    def annotate(self, **attributes) -> None:
+        """Record attributes of the generation (template_count, file_size_bytes, cid...)."""
+        if self.enabled:
+            self.attributes.update(attributes)
+
+
+_DISABLED = PDFSpanRecorder(enabled=False)
+_current: ContextVar[Optional[PDFSpanRecorder]] = ContextVar('pdf_span_recorder', default=None)
+
+
+def current_recorder() -> PDFSpanRecorder:
+    """The recorder of the generation in progress, or a disabled one."""
+    return _current.get() or _DISABLED
+
+
+@contextmanager
+def recording() -> Iterator[PDFSpanRecorder]:
+    """Make a new recorder current for the enclosed block."""
+    recorder = PDFSpanRecorder()
+    token = _current.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _current.reset(token)
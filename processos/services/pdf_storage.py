@@ -0,0 +1,263 @@
+"""
+Generated PDF Storage - Infrastructure Layer
+
+Generated documents are stored under an opaque per-generation id
+(settings.PDF_OUTPUT_DIR/pdf_gen_<id>.pdf), so two generations for the same
+patient and CID never share a file, and served through signed URLs:
+
+    /processos/serve-pdf/d/<id>.<user id>.<expires>.<signature>/
+
+The signature is an HMAC of the id, the owner's user id and the expiry
+timestamp (keyed with SECRET_KEY), so authorizing a download is a
+constant-time signature comparison and a clock check - no patient lookup,
+no database round trip.
+
+Every stored file is recorded in GeneratedFileIndex, a small SQLite file in
+settings.PDF_OUTPUT_INDEX_DIR (outside the served output directory) shared
+by all uwsgi workers, with its expiry, size and last access. Saving a document runs the reaper at most every
+PDF_REAP_INTERVAL_SECONDS per process: it deletes a bounded batch of expired
+files, then evicts least recently used files while the directory holds more
+than PDF_OUTPUT_MAX_BYTES. Nothing ever scans the directory.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import secrets
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterable, List, Optional
+
+from django.conf import settings
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+
+logger = logging.getLogger(__name__)
+pdf_logger = logging.getLogger('processos.pdf')
+
+DOC_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+
+class GeneratedFileIndex:
+    """
+    Expiry/size/last-access index of generated files, stored in SQLite.
+
+    One connection per operation keeps it safe across uwsgi processes and
+    threads; WAL mode lets readers proceed while another worker writes.
+    """
+
+    # Index files whose schema was already created by this process
+    _initialized = set()
+
+    def __init__(self, path: str):
+        self.path = path
+
+    @classmethod
+    def for_directory(cls, directory: str) -> 'GeneratedFileIndex':
+        """The index of the files in directory, kept in settings.PDF_OUTPUT_INDEX_DIR."""
+        os.makedirs(settings.PDF_OUTPUT_INDEX_DIR, exist_ok=True)
+        name = hashlib.sha1(os.path.realpath(directory).encode()).hexdigest()[:16]
+        return cls(os.path.join(settings.PDF_OUTPUT_INDEX_DIR, f'{name}.sqlite3'))
+
+    @contextmanager
+    def _connect(self):
+        needs_schema = self.path not in self._initialized or not os.path.exists(self.path)
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        try:
+            if needs_schema:
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS files ('
+                    'doc_id TEXT PRIMARY KEY, expires_at REAL NOT NULL, '
+                    'size INTEGER NOT NULL, last_access REAL NOT NULL)'
+                )
+                conn.execute('CREATE INDEX IF NOT EXISTS files_expires_at ON files (expires_at)')
+                conn.execute('CREATE INDEX IF NOT EXISTS files_last_access ON files (last_access)')
+                self._initialized.add(self.path)
+            yield conn
+        finally:
+            conn.close()
+
+    def add(self, doc_id: str, expires_at: float, size: int) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO files (doc_id, expires_at, size, last_access) VALUES (?, ?, ?, ?)',
+                (doc_id, expires_at, size, time.time()),
+            )
+
+    def touch(self, doc_id: str) -> None:
+        with self._connect() as conn:
+            conn.execute('UPDATE files SET last_access = ? WHERE doc_id = ?', (time.time(), doc_id))
+
+    def pop_expired(self, now: float, limit: int) -> List[str]:
+        """Remove up to limit expired entries, oldest expiry first, and return their ids."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT doc_id FROM files WHERE expires_at < ? ORDER BY expires_at LIMIT ?', (now, limit)
+            ).fetchall()
+            return self._remove(conn, [row[0] for row in rows])
+
+    def pop_over_budget(self, max_bytes: int, limit: int) -> List[str]:
+        """Remove least recently used entries while the total size exceeds max_bytes."""
+        with self._connect() as conn:
+            total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM files').fetchone()[0]
+            if total <= max_bytes:
+                return []
+            evicted = []
+            for doc_id, size in conn.execute('SELECT doc_id, size FROM files ORDER BY last_access LIMIT ?', (limit,)):
+                if total <= max_bytes:
+                    break
+                evicted.append(doc_id)
+                total -= size
+            return self._remove(conn, evicted)
+
+    def total_bytes(self) -> int:
+        with self._connect() as conn:
+            return conn.execute('SELECT COALESCE(SUM(size), 0) FROM files').fetchone()[0]
+
+    def _remove(self, conn: sqlite3.Connection, doc_ids: List[str]) -> List[str]:
+        if doc_ids:
+            conn.executemany('DELETE FROM files WHERE doc_id = ?', [(doc_id,) for doc_id in doc_ids])
+        return doc_ids
+
+
+class GeneratedPDFStore:
+    """Store generated PDFs under opaque ids and sign expiring links to them."""
+
+    file_prefix = 'pdf_gen_'
+    salt = 'processos.services.pdf_storage.GeneratedPDFStore'
+    reap_batch_size = 100
+
+    # Last reaper run per output directory in this process
+    _last_reap = {}
+    _reap_lock = threading.Lock()
+
+    def __init__(self, directory: Optional[str] = None, ttl: Optional[int] = None):
+        self.directory = directory or settings.PDF_OUTPUT_DIR
+        self.ttl = ttl if ttl is not None else settings.PDF_LINK_TTL_SECONDS
+        self.index = GeneratedFileIndex.for_directory(self.directory)
+
+    def save(self, pdf_bytes: bytes) -> str:
+        """Write pdf_bytes under a new opaque id, record it in the index and return the id."""
+        return self.save_stream([pdf_bytes])
+
+    def save_stream(self, chunks: Iterable[bytes]) -> str:
+        """
+        Write PDF chunks under a new opaque id as they are produced and return the id.
+
+        Used for streamed generation (PDFGenerator.fill_and_stream): the
+        document is never held in memory as a whole. A partially written
+        file is removed if the chunks fail.
+        """
+        doc_id = secrets.token_hex(16)
+        os.makedirs(self.directory, exist_ok=True)
+        size = 0
+        try:
+            with open(self.path(doc_id), 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            try:
+                os.remove(self.path(doc_id))
+            except FileNotFoundError:
+                pass
+            raise
+        try:
+            self.index.add(doc_id, time.time() + self.ttl, size)
+        except sqlite3.Error as e:
+            logger.error(f"GeneratedPDFStore: Failed to index document {doc_id}: {e}")
+        pdf_logger.info(f"GeneratedPDFStore: Saved document {doc_id} ({size} bytes)")
+        self._maybe_reap()
+        return doc_id
+
+    def touch(self, doc_id: str) -> None:
+        """Mark doc_id as recently used (it is evicted last when over the byte budget)."""
+        try:
+            self.index.touch(doc_id)
+        except sqlite3.Error as e:
+            logger.warning(f"GeneratedPDFStore: Failed to update last access of {doc_id}: {e}")
+
+    def reap(self, max_batches: Optional[int] = 1) -> int:
+        """
+        Delete expired files, then least recently used ones while over PDF_OUTPUT_MAX_BYTES.
+
+        Each batch handles at most reap_batch_size files; max_batches=None
+        reaps until nothing is left to delete. Returns the number of files deleted.
+        """
+        deleted = 0
+        batches = 0
+        try:
+            while max_batches is None or batches < max_batches:
+                doc_ids = self.index.pop_expired(time.time(), self.reap_batch_size)
+                doc_ids += self.index.pop_over_budget(settings.PDF_OUTPUT_MAX_BYTES, self.reap_batch_size)
+                for doc_id in doc_ids:
+                    try:
+                        os.remove(self.path(doc_id))
+                    except FileNotFoundError:
+                        pass
+                deleted += len(doc_ids)
+                batches += 1
+                if len(doc_ids) < self.reap_batch_size:
+                    break
+        except sqlite3.Error as e:
+            logger.error(f"GeneratedPDFStore: Reaper failed: {e}")
+        if deleted:
+            pdf_logger.info(f"GeneratedPDFStore: Reaped {deleted} generated PDFs")
+        return deleted
+
+    def _maybe_reap(self) -> None:
+        now = time.monotonic()
+        with self._reap_lock:
+            if now - self._last_reap.get(self.directory, float('-inf')) < settings.PDF_REAP_INTERVAL_SECONDS:
+                return
+            self._last_reap[self.directory] = now
+        self.reap()
+
+    def filename(self, doc_id: str) -> str:
+        return f"{self.file_prefix}{doc_id}.pdf"
+
+    def path(self, doc_id: str) -> str:
+        if not DOC_ID_RE.match(doc_id):
+            raise ValueError(f"Invalid document id: {doc_id!r}")
+        return os.path.join(self.directory, self.filename(doc_id))
+
+    def sign(self, doc_id: str, user_id: int, expires: Optional[int] = None) -> str:
+        """Return the link token granting user_id access to doc_id until expires (epoch seconds)."""
+        if expires is None:
+            expires = int(time.time()) + self.ttl
+        return f"{doc_id}.{user_id}.{expires}.{self._signature(doc_id, user_id, expires)}"
+
+    def verify(self, token: str, user_id: int) -> Optional[str]:
+        """
+        Return the document id of a valid token issued to user_id.
+
+        Returns None for malformed, tampered, expired or other users' tokens.
+        """
+        try:
+            doc_id, token_user_id, expires, signature = token.split('.')
+            token_user_id, expires = int(token_user_id), int(expires)
+        except ValueError:
+            return None
+        if not DOC_ID_RE.match(doc_id):
+            return None
+        if not constant_time_compare(signature, self._signature(doc_id, token_user_id, expires)):
+            logger.warning(f"GeneratedPDFStore: Invalid signature for document {doc_id}")
+            return None
+        if token_user_id != user_id:
+            logger.warning(f"GeneratedPDFStore: User {user_id} presented a link issued to user {token_user_id}")
+            return None
+        if expires < time.time():
+            return None
+        return doc_id
+
+    def url(self, doc_id: str, user) -> str:
+        """Signed serving URL for doc_id, valid for the store TTL and only for user."""
+        return reverse('processos-serve-generated-pdf', kwargs={'token': self.sign(doc_id, user.pk)})
+
+    def _signature(self, doc_id: str, user_id: int, expires: int) -> str:
+        return salted_hmac(self.salt, f"{doc_id}:{user_id}:{expires}", algorithm='sha256').hexdigest()
@@ -3,12 +3,131 @@
 Data-driven PDF generation strategy that reads configuration from database.
 Only handles disease-specific and medication-specific PDFs.
 Universal PDFs (consent, report, exams) are handled by main GeradorPDF.
+
+Each protocol's configuration is compiled once per worker into an
+immutable TemplatePlan (resolved, existing template paths, a medication
+keyword matcher and the optional documents available), so selecting the
+templates of a prescription is a dictionary lookup. A plan is kept for
+the Protocolo instance it was compiled from: the reference data snapshot
+hands out the same instance until it is reloaded after an edit in any
+worker. Plans are also dropped by a post_save on Protocolo
+(processos/signals.py). Without the snapshot every request loads a new
+instance, so plans are compiled per request and not cached.
 """
 
+import logging
 import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
 from django.conf import settings
 from processos.models import Protocolo
 from processos.paths import get_static_path
+from processos.services.pdf_templates import template_registry
+from processos.services.reference_data import reference_data
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class TemplatePlan:
+    """Compiled template selection of one protocol."""
+    protocol_name: str
+    disease_paths: Tuple[str, ...] = ()
+    # (keyword, paths) in configuration order: the first keyword contained in med1 wins
+    medication_paths: Tuple[Tuple[str, Tuple[str, ...]], ...] = ()
+    consent_path: Optional[str] = None  # Optional documents, None when the template is missing
+    report_path: Optional[str] = None
+    exam_path: Optional[str] = None
+
+    def paths_for_medication(self, medicamento: Optional[str]) -> Tuple[str, ...]:
+        """Medication-specific template paths for med1 (case-insensitive substring match)."""
+        key = (medicamento or '').lower()
+        return next((paths for keyword, paths in self.medication_paths if keyword in key), ())
+
+
+def _existing_paths(protocolo, file_names) -> Tuple[str, ...]:
+    paths = []
+    for file_name in file_names:
+        full_path = get_static_path("protocolos", protocolo.nome, file_name)
+        if template_registry.exists(full_path):
+            paths.append(full_path)
+        else:
+            logger.warning(f"TemplatePlan: Template not found for {protocolo.nome}: {full_path}")
+    return tuple(paths)
+
+
+def _optional_path(path: Optional[str]) -> Optional[str]:
+    if not path:
+        return None
+    if template_registry.exists(path):
+        return path
+    logger.warning(f"TemplatePlan: Optional document template not found: {path}")
+    return None
+
+
+def compile_template_plan(protocolo) -> TemplatePlan:
+    """
+    Resolve protocolo's dados_condicionais into a TemplatePlan.
+    
+    A malformed configuration compiles to a plan without protocol-specific
+    templates, so the base and optional documents are still generated.
+    """
+    try:
+        config = protocolo.dados_condicionais or {}
+        disease_paths = _existing_paths(protocolo, config.get("disease_files", []))
+        medications = tuple(
+            (keyword, _existing_paths(protocolo, (med_config or {}).get("files", [])))
+            for keyword, med_config in config.get("medications", {}).items()
+        )
+    except Exception as e:
+        logger.error(f"TemplatePlan: Invalid dados_condicionais for {protocolo.nome}: {e}")
+        disease_paths, medications = (), ()
+    return TemplatePlan(
+        protocol_name=protocolo.nome,
+        disease_paths=disease_paths,
+        medication_paths=medications,
+        consent_path=_optional_path(os.path.join(settings.PATH_PDF_DIR, protocolo.nome, "consentimento.pdf")),
+        report_path=_optional_path(getattr(settings, 'PATH_RELATORIO', None)),
+        exam_path=_optional_path(getattr(settings, 'PATH_EXAMES', None)),
+    )
+
+
+class TemplatePlanCache:
+    """Per-worker TemplatePlan of every protocol, keyed by protocol id (see module docstring)."""
+
+    def __init__(self):
+        self._plans: Dict[int, Tuple[Protocolo, TemplatePlan]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, protocolo) -> TemplatePlan:
+        if not reference_data.enabled:
+            # A new instance per request: a plan kept for it would never be used again
+            return compile_template_plan(protocolo)
+
+        entry = self._plans.get(protocolo.pk)
+        if entry is not None and entry[0] is protocolo:
+            return entry[1]
+
+        plan = compile_template_plan(protocolo)
+        if protocolo.pk is not None:
+            with self._lock:
+                self._plans[protocolo.pk] = (protocolo, plan)
+        logger.debug(f"TemplatePlanCache: Compiled template plan for {protocolo.nome}")
+        return plan
+
+    def invalidate(self, protocol_id: Optional[int] = None) -> None:
+        """Drop the plan of protocol_id (all plans when None)."""
+        with self._lock:
+            if protocol_id is None:
+                self._plans.clear()
+            else:
+                self._plans.pop(protocol_id, None)
+
+
+template_plans = TemplatePlanCache()
 
 
 class DataDrivenStrategy:
@@ -19,67 +138,15 @@ class DataDrivenStrategy:
     
     def __init__(self, protocolo):
         self.protocolo = protocolo
-        print(f"DEBUG: DataDrivenStrategy initialized for {protocolo.nome}")
+        self.plan = template_plans.get(protocolo)
     
     def get_disease_specific_paths(self, dados_lme_base):
         """Get disease-specific PDF paths (like EDSS scale for MS)"""
-        try:
-            config = self.protocolo.dados_condicionais or {}
-            disease_files = config.get("disease_files", [])
-            
-            paths = []
-            for file_path in disease_files:
-                full_path = get_static_path("protocolos", self.protocolo.nome, file_path)
-                if os.path.exists(full_path):
-                    paths.append(full_path)
-                    print(f"DEBUG: Added disease file: {file_path}")
-                else:
-                    print(f"WARNING: Disease file not found: {full_path}")
-            
-            return paths
-            
-        except Exception as e:
-            print(f"ERROR: Failed to get disease-specific paths: {e}")
-            return []
+        return list(self.plan.disease_paths)
     
     def get_medication_specific_paths(self, dados_lme_base):
         """Get medication-specific PDF paths (like Fingolimod monitoring)"""
-        try:
-            config = self.protocolo.dados_condicionais or {}
-            medications = config.get("medications", {})
-            
-            medicamento = dados_lme_base.get("med1", "").lower()
-            print(f"DEBUG: Processing medication: {medicamento}")
-            
-            # Find matching medication in config
-            med_config = None
-            for med_key, med_data in medications.items():
-                if med_key in medicamento:
-                    med_config = med_data
-                    print(f"DEBUG: Found medication config for {med_key}")
-                    break
-            
-            if not med_config:
-                print(f"DEBUG: No specific config found for medication: {medicamento}")
-                return []
-            
-            # Get medication-specific files
-            paths = []
-            med_files = med_config.get("files", [])
-            
-            for file_path in med_files:
-                full_path = get_static_path("protocolos", self.protocolo.nome, file_path)
-                if os.path.exists(full_path):
-                    paths.append(full_path)
-                    print(f"DEBUG: Added medication file: {file_path}")
-                else:
-                    print(f"WARNING: Medication file not found: {full_path}")
-            
-            return paths
-            
-        except Exception as e:
-            print(f"ERROR: Failed to get medication-specific paths: {e}")
-            return []
+        return list(self.plan.paths_for_medication(dados_lme_base.get("med1", "")))
 
 
 def get_conditional_fields(protocolo):
@@ -0,0 +1,266 @@
+"""
+PDF Template Registry - Infrastructure Layer
+
+Keeps parsed PDF templates in memory so each worker reads and parses the LME,
+report, exam and protocol templates once instead of on every prescription.
+
+Entries are keyed by path and validated against the file's mtime/size, so an
+updated template on disk is transparently re-parsed on next use.
+
+Each entry also carries a field index (names, types, max lengths, checkbox and
+radio export values) used to send every template only the keys it contains.
+
+FlattenedTemplateCache keeps already filled and flattened renditions of
+templates that do not vary per patient (see PDFGenerator._is_static).
+
+Usage:
+    from processos.services.pdf_templates import template_registry
+    template = template_registry.get(settings.PATH_LME_BASE)
+"""
+
+import glob
+import hashlib
+import logging
+import os
+import threading
+from collections import Counter, OrderedDict
+from io import BytesIO
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+
+try:
+    from pypdf import PdfReader
+    from pypdf.generic import IndirectObject
+    PYPDF_AVAILABLE = True
+except ImportError:  # pragma: no cover - depends on deployment
+    PYPDF_AVAILABLE = False
+
+
+logger = logging.getLogger(__name__)
+pdf_logger = logging.getLogger('processos.pdf')
+
+
+@dataclass(frozen=True)
+class PDFField:
+    """One fillable field of a template."""
+    name: str
+    field_type: Optional[str]  # '/Tx', '/Btn', '/Ch' or '/Sig'
+    max_length: Optional[int] = None  # /MaxLen of text fields
+    export_values: Tuple[str, ...] = ()  # Checkbox/radio states without the leading '/'
+
+
+@dataclass
+class PDFTemplate:
+    """A parsed template plus the metadata used to validate and describe it."""
+    path: str
+    mtime_ns: int
+    size: int
+    content_hash: str  # sha256 of the file bytes
+    reader: Optional['PdfReader']  # Fully resolved object graph (None without pypdf)
+    field_names: Tuple[str, ...]
+    page_count: int
+    fields: Dict[str, PDFField] = field(default_factory=dict)
+
+    @property
+    def has_field_index(self) -> bool:
+        """False when the fields could not be read (e.g. pypdf missing)."""
+        return self.reader is not None
+
+    def prune_form_data(self, form_data: Dict[str, str]) -> Dict[str, str]:
+        """Return only the entries of form_data that name a field of this template."""
+        if not self.has_field_index:
+            return form_data
+        return {name: value for name, value in form_data.items() if name in self.fields}
+
+
+class PDFTemplateRegistry:
+    """
+    Per-worker cache of parsed PDF templates.
+
+    Loading resolves every indirect object up front, so later clones from the
+    reader never touch the file again and concurrent threads only read
+    already-parsed objects.
+    """
+
+    def __init__(self):
+        self._templates: Dict[str, PDFTemplate] = {}
+        self._lock = threading.Lock()
+        # Form data keys no template of a document knew about (see count_unknown_fields)
+        self.unknown_field_counts: Counter = Counter()
+
+    def get(self, path: str) -> Optional[PDFTemplate]:
+        """Return the parsed template at path, (re)loading it if the file changed."""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self._templates.pop(path, None)
+            return None
+
+        template = self._templates.get(path)
+        if template and template.mtime_ns == stat.st_mtime_ns and template.size == stat.st_size:
+            return template
+
+        with self._lock:
+            template = self._templates.get(path)
+            if template and template.mtime_ns == stat.st_mtime_ns and template.size == stat.st_size:
+                return template
+            try:
+                template = self._load(path, stat)
+            except Exception as e:
+                logger.error(f"PDFTemplateRegistry: Failed to load {path}: {e}", exc_info=True)
+                return None
+            self._templates[path] = template
+            return template
+
+    def exists(self, path: str) -> bool:
+        """True when path is a cached template or an existing file."""
+        return path in self._templates or os.path.exists(path)
+
+    def warm(self, paths: Optional[Iterable[str]] = None) -> int:
+        """
+        Pre-load templates (default: every configured template) and return how many loaded.
+
+        Call from the uwsgi master before forking so workers share the parsed
+        templates copy-on-write.
+        """
+        paths = list(paths) if paths is not None else self.discover_template_paths()
+        loaded = sum(1 for path in paths if self.get(path) is not None)
+        pdf_logger.info(f"PDFTemplateRegistry: Warmed {loaded} of {len(paths)} templates")
+        return loaded
+
+    def clear(self) -> None:
+        """Drop every cached template."""
+        with self._lock:
+            self._templates.clear()
+
+    def count_unknown_fields(self, templates: Iterable[PDFTemplate], form_data: Dict[str, str]) -> List[str]:
+        """
+        Record and return the form_data keys that match no field of templates.
+
+        Only indexed templates are considered; the running totals in
+        unknown_field_counts make template/data mismatches visible in debug logs.
+        """
+        indexed = [template for template in templates if template.has_field_index]
+        if not indexed:
+            return []
+        known = set().union(*(template.fields for template in indexed))
+        unknown = [name for name in form_data if name not in known]
+        self.unknown_field_counts.update(unknown)
+        return unknown
+
+    def __len__(self) -> int:
+        return len(self._templates)
+
+    @staticmethod
+    def discover_template_paths() -> List[str]:
+        """
+        List the fillable templates shipped with the app.
+
+        Covers the base LME, report and exam models plus every PDF inside a
+        protocol directory. Protocol documents at the top of PATH_PDF_DIR and
+        *_backup.pdf copies are not templates and are skipped.
+        """
+        paths = [settings.PATH_LME_BASE, settings.PATH_RELATORIO, settings.PATH_EXAMES]
+        paths.extend(sorted(glob.glob(os.path.join(settings.PATH_PDF_DIR, "*", "**", "*.pdf"), recursive=True)))
+        return [path for path in paths if not path.endswith("_backup.pdf") and os.path.exists(path)]
+
+    def _load(self, path: str, stat: os.stat_result) -> PDFTemplate:
+        with open(path, 'rb') as f:
+            content = f.read()
+
+        reader = None
+        fields: Dict[str, PDFField] = {}
+        page_count = 0
+        if PYPDF_AVAILABLE:
+            reader = PdfReader(BytesIO(content))
+            self._resolve_all_objects(reader)
+            fields = self._index_fields(reader)
+            page_count = len(reader.pages)
+        field_names = tuple(fields)
+
+        pdf_logger.debug(f"PDFTemplateRegistry: Loaded {os.path.basename(path)} ({page_count} pages, {len(field_names)} fields)")
+        return PDFTemplate(
+            path=path,
+            mtime_ns=stat.st_mtime_ns,
+            size=stat.st_size,
+            content_hash=hashlib.sha256(content).hexdigest(),
+            reader=reader,
+            field_names=field_names,
+            page_count=page_count,
+            fields=fields,
+        )
+
+    @staticmethod
+    def _index_fields(reader: 'PdfReader') -> Dict[str, PDFField]:
+        """Extract name, type, max length and export values of every field."""
+        fields = {}
+        for name, attributes in (reader.get_fields() or {}).items():
+            max_length = attributes.get('/MaxLen')
+            fields[name] = PDFField(
+                name=name,
+                field_type=attributes.get('/FT'),
+                max_length=int(max_length) if max_length is not None else None,
+                export_values=tuple(
+                    str(state).lstrip('/') for state in attributes.get('/_States_', []) if state != '/Off'
+                ),
+            )
+        return fields
+
+    @staticmethod
+    def _resolve_all_objects(reader: 'PdfReader') -> None:
+        """Parse every object in the xref so the reader's cache holds the whole graph."""
+        for generation, objects in reader.xref.items():
+            for idnum in objects:
+                reader.get_object(IndirectObject(idnum, generation, reader))
+        for idnum in reader.xref_objStm:
+            reader.get_object(IndirectObject(idnum, 0, reader))
+
+
+class FlattenedTemplateCache:
+    """
+    Per-worker LRU of flattened renditions of static templates.
+
+    Keyed by the template's content hash plus the (constant) data it was
+    filled with, so an updated template or another doctor's data never hits a
+    stale rendition. Values are backend documents (pypdf writers) that are only
+    read after caching: merging copies their pages into the output document.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._documents: 'OrderedDict[Tuple, Any]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(template: PDFTemplate, form_data: Dict[str, str]) -> Tuple:
+        return (template.path, template.content_hash, tuple(sorted(form_data.items())))
+
+    def get(self, template: PDFTemplate, form_data: Dict[str, str]) -> Optional[Any]:
+        key = self._key(template, form_data)
+        with self._lock:
+            document = self._documents.get(key)
+            if document is not None:
+                self._documents.move_to_end(key)
+            return document
+
+    def set(self, template: PDFTemplate, form_data: Dict[str, str], document: Any) -> None:
+        if document is None or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._documents[self._key(template, form_data)] = document
+            while len(self._documents) > self.max_entries:
+                self._documents.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._documents.clear()
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+
+# One registry per process; populated in the uwsgi master by autocusto/wsgi.py
+template_registry = PDFTemplateRegistry()
+flattened_cache = FlattenedTemplateCache(max_entries=getattr(settings, 'PDF_STATIC_CACHE_SIZE', 64))
@@ -11,6 +11,7 @@ Services:
 - PrescriptionPDFService: Complete prescription PDF generation workflow
 - PrescriptionService: Full prescription business workflow (database + PDF)
 - RenewalService: Prescription renewal business logic
+- PDFJobService: Queued (asynchronous) prescription/renewal PDF generation
 """
 
 # Import all services for backward compatibility
@@ -21,6 +22,7 @@ from .workflow_service import PrescriptionService
 from .renewal_service import RenewalService
 from .data_builder import PrescriptionDataBuilder
 from .process_service import ProcessService
+from .pdf_job_service import PDFJobService
 
 __all__ = [
     'PrescriptionDataFormatter',
@@ -29,5 +31,6 @@ __all__ = [
     'PrescriptionService',
     'RenewalService',
     'PrescriptionDataBuilder',
+    'PDFJobService',
     'ProcessRepository',
 ]
\ No newline at end of file
@@ -9,16 +9,18 @@ Extracted from prescription_services.py to follow single responsibility principl
 
 import time
 import logging
-from typing import Optional
+from typing import Iterator, List, Optional, Tuple
 from datetime import datetime
 from django.http import HttpResponse
 from django.conf import settings
 
+from processos.services.pdf_cache import PDFResultCache
 from processos.services.pdf_operations import PDFGenerator, PDFResponseBuilder
+from processos.services.pdf_spans import current_recorder, recording
 from processos.models import Protocolo
 from .data_formatting import PrescriptionDataFormatter
 from .template_selection import PrescriptionTemplateSelector
-from analytics.signals import track_pdf_generation
+from analytics.signals import log_batch_pdf_generation, track_pdf_generation
 
 
 class PrescriptionPDFService:
@@ -37,23 +39,40 @@ class PrescriptionPDFService:
         self.template_selector = PrescriptionTemplateSelector()
         self.pdf_generator = PDFGenerator()
         self.response_builder = PDFResponseBuilder()
+        self.result_cache = PDFResultCache()
         self.logger = logging.getLogger(__name__)
         self.pdf_logger = logging.getLogger('processos.pdf')
     
     @track_pdf_generation(pdf_type='prescription')
-    def generate_prescription_pdf(self, prescription_data: dict, user=None) -> Optional[HttpResponse]:
+    def generate_prescription_pdf(self, prescription_data: dict, user=None, stream: Optional[bool] = None,
+                                  processo_id: Optional[int] = None) -> Optional[HttpResponse]:
         """
         Generate a medical prescription PDF following Brazilian regulations.
         
+        In streaming mode (stream=True, default settings.PDF_STREAMING_OUTPUT)
+        a StreamingHttpResponse is returned as soon as the first template is
+        filled; the remaining templates are filled while the response is
+        consumed (by PDFFileService, into the storage file: the document is
+        never held in memory as a whole, but the client still waits for all
+        of it). Result cache hits are always returned buffered.
+        
+        Stage timings (protocol lookup, template selection, each fill,
+        concat) are recorded as spans of the generation's PDFGenerationLog
+        row (see pdf_spans.py).
+        
         Args:
             prescription_data: Complete prescription data dictionary
             user: User for analytics tracking
+            stream: Stream the PDF while it is generated
+            processo_id: Process the prescription belongs to, for analytics tracking
             
         Returns:
             HttpResponse: Generated PDF response, or None if generation fails
         """
         try:
             start_time = time.time()
+            spans = current_recorder()
+            spans.annotate(cid=prescription_data.get('cid'))
             self.pdf_logger.info("="*80)
             self.pdf_logger.info("PrescriptionPDFService: Starting prescription PDF generation")
             self.pdf_logger.info(f"PrescriptionPDFService: Patient CPF: {prescription_data.get('cpf_paciente', 'N/A')}")
@@ -70,7 +89,8 @@ class PrescriptionPDFService:
             
             # Step 2: Get medical protocol
             self.pdf_logger.info("PrescriptionPDFService: Step 2 - Getting medical protocol")
-            protocolo = self._get_medical_protocol(formatted_data)
+            with spans.span('protocol_lookup'):
+                protocolo = self._get_medical_protocol(formatted_data)
             if not protocolo:
                 self.logger.error("PrescriptionPDFService: Medical protocol not found")
                 return HttpResponse("Medical protocol not found", status=404)
@@ -78,23 +98,44 @@ class PrescriptionPDFService:
             
             # Step 3: Select prescription templates
             self.pdf_logger.info("PrescriptionPDFService: Step 3 - Selecting prescription templates")
-            pdf_file_paths = self.template_selector.select_prescription_templates(
-                protocolo, 
-                formatted_data, 
-                settings.PATH_LME_BASE
-            )
+            with spans.span('template_selection'):
+                pdf_file_paths = self.template_selector.select_prescription_templates(
+                    protocolo, 
+                    formatted_data, 
+                    settings.PATH_LME_BASE
+                )
+            spans.annotate(template_count=len(pdf_file_paths))
             self.pdf_logger.info(f"PrescriptionPDFService: Selected {len(pdf_file_paths)} PDF templates")
             
-            # Step 4: Generate PDF
+            # Step 4: Generate PDF (identical templates + data are served from the result cache)
             self.pdf_logger.info("PrescriptionPDFService: Step 4 - Generating PDF")
-            pdf_bytes = self.pdf_generator.fill_and_concatenate(pdf_file_paths, formatted_data)
+            cache_key = self.result_cache.build_key(pdf_file_paths, formatted_data)
+            pdf_bytes = self.result_cache.get(cache_key)
+            spans.annotate(cache_hit=bool(pdf_bytes))
+            filename = self._generate_prescription_filename(prescription_data)
+            if stream is None:
+                stream = settings.PDF_STREAMING_OUTPUT
+            if not pdf_bytes and stream:
+                chunks = self.pdf_generator.fill_and_stream(pdf_file_paths, formatted_data)
+                if chunks is not None:
+                    # Remaining fills and the output size are recorded while the response is consumed
+                    spans.annotate(streamed=True)
+                    self.pdf_logger.info(
+                        f"PrescriptionPDFService: First template ready in {time.time() - start_time:.2f} seconds, streaming"
+                    )
+                    return self.response_builder.build_streaming_response(
+                        self._cache_streamed(cache_key, chunks), filename
+                    )
             if not pdf_bytes:
-                self.logger.error("PrescriptionPDFService: PDF generation failed")
-                return HttpResponse("PDF generation failed", status=500)
+                pdf_bytes = self.pdf_generator.fill_and_concatenate(pdf_file_paths, formatted_data)
+                if not pdf_bytes:
+                    self.logger.error("PrescriptionPDFService: PDF generation failed")
+                    return HttpResponse("PDF generation failed", status=500)
+                self.result_cache.set(cache_key, pdf_bytes)
+            spans.annotate(file_size_bytes=len(pdf_bytes))
             
             # Step 5: Build response
             self.pdf_logger.info("PrescriptionPDFService: Step 5 - Building HTTP response")
-            filename = self._generate_prescription_filename(prescription_data)
             response = self.response_builder.build_response(pdf_bytes, filename)
             
             elapsed_time = time.time() - start_time
@@ -107,6 +148,111 @@ class PrescriptionPDFService:
             self.logger.error(f"PrescriptionPDFService: PDF generation failed with exception: {e}", exc_info=True)
             return HttpResponse("PDF generation error", status=500)
     
+    def generate_batch_pdf(
+        self,
+        prescriptions: List[dict],
+        user=None,
+        processo_ids: Optional[List[int]] = None
+    ) -> Tuple[Optional[bytes], List[Optional[str]]]:
+        """
+        Generate the PDFs of several prescriptions as one merged document.
+        
+        Each prescription goes through the same formatting, protocol lookup
+        and template selection as generate_prescription_pdf; all documents
+        are then filled and merged in a single PDFGenerator pass. Protocols
+        are looked up once per CID.
+        
+        When processo_ids (one per prescription) is given, the generation is
+        logged once per processo after the merge (log_batch_pdf_generation).
+        
+        Args:
+            prescriptions: Complete prescription data dictionaries, in output order
+            user: User for analytics tracking
+            processo_ids: Processo of each prescription, for analytics tracking
+            
+        Returns:
+            tuple: (merged PDF bytes or None if no document was generated,
+            one error message per prescription, None for the ones generated)
+        """
+        start_time = time.time()
+        self.pdf_logger.info(f"PrescriptionPDFService: Starting batch PDF generation for {len(prescriptions)} prescriptions")
+        
+        with recording() as spans:
+            try:
+                pdf_bytes, errors = self._generate_batch(prescriptions)
+            except Exception as e:
+                if processo_ids:
+                    log_batch_pdf_generation(
+                        user, processo_ids, [str(e)] * len(processo_ids), spans, int((time.time() - start_time) * 1000)
+                    )
+                raise
+        
+        elapsed_time = time.time() - start_time
+        if processo_ids:
+            log_batch_pdf_generation(user, processo_ids, errors, spans, int(elapsed_time * 1000))
+        self.pdf_logger.info(
+            f"PrescriptionPDFService: Batch PDF generation completed in {elapsed_time:.2f} seconds "
+            f"({errors.count(None)}/{len(prescriptions)} documents)"
+        )
+        return pdf_bytes, errors
+    
+    def _generate_batch(self, prescriptions: List[dict]) -> Tuple[Optional[bytes], List[Optional[str]]]:
+        """Fill and merge the documents of generate_batch_pdf inside its span recording."""
+        spans = current_recorder()
+        errors: List[Optional[str]] = [None] * len(prescriptions)
+        documents = []
+        document_indexes = []
+        protocols = {}
+        
+        for index, prescription_data in enumerate(prescriptions):
+            if not self._validate_prescription_data(prescription_data):
+                errors[index] = "Dados obrigatórios ausentes"
+                continue
+            try:
+                formatted_data = self.data_formatter.format_prescription_date(prescription_data)
+                cid = formatted_data['cid']
+                if cid not in protocols:
+                    with spans.span('protocol_lookup', cid=cid):
+                        protocols[cid] = self._get_medical_protocol(formatted_data)
+                if not protocols[cid]:
+                    errors[index] = "Protocolo não encontrado"
+                    continue
+                with spans.span('template_selection', cid=cid):
+                    pdf_file_paths = self.template_selector.select_prescription_templates(
+                        protocols[cid],
+                        formatted_data,
+                        settings.PATH_LME_BASE
+                    )
+            except Exception as e:
+                self.logger.error(f"PrescriptionPDFService: Failed to prepare batch item {index}: {e}", exc_info=True)
+                errors[index] = "Falha ao preparar documento"
+                continue
+            documents.append((pdf_file_paths, formatted_data))
+            document_indexes.append(index)
+        
+        if not documents:
+            return None, errors
+        
+        spans.annotate(template_count=sum(len(paths) for paths, _ in documents))
+        pdf_bytes, filled = self.pdf_generator.fill_and_concatenate_many(documents)
+        if pdf_bytes:
+            spans.annotate(file_size_bytes=len(pdf_bytes))
+        for index, was_filled in zip(document_indexes, filled):
+            if not pdf_bytes or not was_filled:
+                errors[index] = "Falha ao gerar PDF"
+        return pdf_bytes, errors
+    
+    def _cache_streamed(self, cache_key: Optional[str], chunks: Iterator[bytes]) -> Iterator[bytes]:
+        """Pass chunks through and store the complete document in the result cache."""
+        if cache_key is None or not self.result_cache.enabled:
+            yield from chunks
+            return
+        parts = []
+        for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+        self.result_cache.set(cache_key, b''.join(parts))
+    
     def _validate_prescription_data(self, data: dict) -> bool:
         """Validate prescription data contains required medical fields."""
         required_fields = ['cpf_paciente', 'cid', 'data_1']
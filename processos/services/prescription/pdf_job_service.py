@@ -0,0 +1,176 @@
+"""
+Prescription PDF Job Service
+
+Asynchronous PDF generation (settings.PDF_ASYNC_GENERATION): request views
+save the process and enqueue a PDFGenerationJob instead of generating the PDF
+while holding a uwsgi worker. The process_pdf_jobs management command drains
+the queue through this service, and the job status endpoint reports the
+resulting PDF URL.
+
+The queue is the PDFGenerationJob table itself: jobs are claimed with a
+conditional UPDATE, so several queue workers can run side by side.
+"""
+
+import json
+import logging
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from django.db.models import F
+from django.utils import timezone
+
+from processos.models import PDFGenerationJob
+from processos.services.io_services import PDFFileService
+from .pdf_generation import PrescriptionPDFService
+from .renewal_service import RenewalService
+
+
+DATE_FORMAT = "%d/%m/%Y"
+
+
+class PDFJobService:
+    """
+    Enqueues, claims and runs PDF generation jobs.
+
+    Payloads are stored as JSON: prescription jobs keep the fully linked
+    prescription data (values coerced the way PDFGenerator would fill them),
+    renewal jobs only the process and the new date.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self.pdf_logger = logging.getLogger('processos.pdf')
+
+    def enqueue_prescription(self, prescription_data: dict, processo_id: int, user) -> PDFGenerationJob:
+        """Queue PDF generation for a prescription that was just saved."""
+        job = PDFGenerationJob.objects.create(
+            kind=PDFGenerationJob.KIND_PRESCRIPTION,
+            usuario=user,
+            processo_id=processo_id,
+            payload={'prescription_data': self.serialize_prescription_data(prescription_data)},
+        )
+        self.pdf_logger.info(f"PDFJobService: Queued prescription job {job.pk} for process {processo_id}")
+        return job
+
+    def enqueue_renewal(self, processo_id: int, renewal_date: date, user) -> PDFGenerationJob:
+        """Queue PDF generation for a quick renewal."""
+        job = PDFGenerationJob.objects.create(
+            kind=PDFGenerationJob.KIND_RENEWAL,
+            usuario=user,
+            processo_id=processo_id,
+            payload={'renewal_date': renewal_date.strftime(DATE_FORMAT)},
+        )
+        self.pdf_logger.info(f"PDFJobService: Queued renewal job {job.pk} for process {processo_id}")
+        return job
+
+    def claim_next(self) -> Optional[PDFGenerationJob]:
+        """
+        Atomically mark the oldest pending job as running and return it.
+
+        Returns None when the queue is empty. A job lost to a concurrent
+        worker is skipped and the next candidate tried.
+        """
+        candidates = (
+            PDFGenerationJob.objects
+            .filter(status=PDFGenerationJob.STATUS_PENDING)
+            .order_by('created_at', 'pk')
+            .values_list('pk', flat=True)[:10]
+        )
+        for job_id in candidates:
+            claimed = PDFGenerationJob.objects.filter(
+                pk=job_id, status=PDFGenerationJob.STATUS_PENDING
+            ).update(
+                status=PDFGenerationJob.STATUS_RUNNING,
+                started_at=timezone.now(),
+                attempts=F('attempts') + 1,
+            )
+            if claimed:
+                return PDFGenerationJob.objects.select_related('usuario').get(pk=job_id)
+        return None
+
+    def run(self, job: PDFGenerationJob) -> PDFGenerationJob:
+        """Generate and store the PDF of a claimed job, recording done/failed."""
+        try:
+            if job.kind == PDFGenerationJob.KIND_RENEWAL:
+                pdf_url = self._run_renewal(job)
+            else:
+                pdf_url = self._run_prescription(job)
+        except Exception as e:
+            self.logger.error(f"PDFJobService: Job {job.pk} failed: {e}", exc_info=True)
+            return self._finish(job, PDFGenerationJob.STATUS_FAILED, error=str(e))
+
+        return self._finish(job, PDFGenerationJob.STATUS_DONE, pdf_url=pdf_url)
+
+    def requeue_stale(self, stale_after_seconds: int, max_attempts: int) -> int:
+        """
+        Return running jobs abandoned by a crashed worker to the queue.
+
+        Jobs that already used max_attempts are failed instead. Returns the
+        number of jobs requeued.
+        """
+        cutoff = timezone.now() - timedelta(seconds=stale_after_seconds)
+        stale = PDFGenerationJob.objects.filter(status=PDFGenerationJob.STATUS_RUNNING, started_at__lt=cutoff)
+
+        stale.filter(attempts__gte=max_attempts).update(
+            status=PDFGenerationJob.STATUS_FAILED,
+            error="Worker did not finish the job",
+            finished_at=timezone.now(),
+        )
+        requeued = stale.filter(attempts__lt=max_attempts).update(status=PDFGenerationJob.STATUS_PENDING)
+        if requeued:
+            self.logger.warning(f"PDFJobService: Requeued {requeued} stale jobs")
+        return requeued
+
+    @staticmethod
+    def serialize_prescription_data(prescription_data: dict) -> dict:
+        """
+        Make prescription data JSON-safe without changing the filled PDF.
+
+        data_1 keeps the DD/MM/YYYY form the date formatter parses; other
+        non-JSON values (models, dates, Decimals) become the strings the
+        PDF fill would produce from them anyway.
+        """
+        serialized = {}
+        for key, value in prescription_data.items():
+            if key == 'data_1' and isinstance(value, (date, datetime)):
+                serialized[key] = value.strftime(DATE_FORMAT)
+            elif value is None or isinstance(value, (bool, int, float, str)):
+                serialized[key] = value
+            elif isinstance(value, (list, dict)) and PDFJobService._is_json_safe(value):
+                serialized[key] = value
+            else:
+                serialized[key] = str(value)
+        return serialized
+
+    @staticmethod
+    def _is_json_safe(value) -> bool:
+        try:
+            json.dumps(value)
+        except (TypeError, ValueError):
+            return False
+        return True
+
+    def _run_prescription(self, job: PDFGenerationJob) -> str:
+        prescription_data = job.payload['prescription_data']
+        pdf_response = PrescriptionPDFService().generate_prescription_pdf(
+            prescription_data, user=job.usuario, processo_id=job.processo_id
+        )
+        if not pdf_response or pdf_response.status_code != 200:
+            raise RuntimeError("PDF generation failed")
+        return PDFFileService().save_pdf_and_get_url(pdf_response, job.usuario)
+
+    def _run_renewal(self, job: PDFGenerationJob) -> str:
+        renewal_date = datetime.strptime(job.payload['renewal_date'], DATE_FORMAT).date()
+        pdf_response = RenewalService().process_renewal(renewal_date, job.processo_id, job.usuario)
+        if not pdf_response or pdf_response.status_code != 200:
+            raise RuntimeError("PDF generation failed")
+        return PDFFileService().save_pdf_and_get_url(pdf_response, job.usuario)
+
+    def _finish(self, job: PDFGenerationJob, status: str, pdf_url: str = '', error: str = '') -> PDFGenerationJob:
+        job.status = status
+        job.pdf_url = pdf_url or ''
+        job.error = error
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'pdf_url', 'error', 'finished_at'])
+        self.pdf_logger.info(f"PDFJobService: Job {job.pk} {status}")
+        return job
@@ -8,12 +8,13 @@ Extracted from prescription_services.py to follow single responsibility principl
 """
 
 import logging
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 from django.http import HttpResponse
 from django.forms.models import model_to_dict
 
-from processos.models import Processo
+from pacientes.models import Paciente, PacienteVersion
+from processos.models import Medicamento, Processo
 from .pdf_generation import PrescriptionPDFService
 
 
@@ -58,7 +59,7 @@ class RenewalService:
             renewal_data = self.generate_renewal_data(renewal_date, process_id, user)
             
             # Generate PDF with user for analytics tracking
-            pdf_response = self.pdf_service.generate_prescription_pdf(renewal_data, user=user)
+            pdf_response = self.pdf_service.generate_prescription_pdf(renewal_data, user=user, processo_id=process_id)
             
             if pdf_response:
                 self.logger.info(
@@ -115,10 +116,6 @@ class RenewalService:
             ValueError: If renewal date is invalid or empty
             Processo.DoesNotExist: If process not found
         """
-        from datetime import datetime
-        from django.forms.models import model_to_dict
-        from processos.repositories.medication_repository import MedicationRepository
-        
         self.logger.info(f"RenewalService: Generating renewal data for process {process_id}")
         
         # Verify user owns this process before accessing data
@@ -132,21 +129,158 @@ class RenewalService:
         else:
             # Fallback for cases where user is not provided (should be rare)
             processo = process_repo.get_process_by_id(process_id)
+        # Get versioned patient data if user is provided
+        paciente_version = processo.paciente.get_version_for_user(user) if user else None
+        
+        dados = self._build_renewal_data(processo, renewal_date, paciente_version, user)
+        
+        self.logger.info(f"RenewalService: Generated renewal data for process {process_id}")
+        return dados
+    
+    def process_batch_renewal(
+        self,
+        renewal_date,
+        process_ids: List[int],
+        user
+    ) -> Tuple[Optional[bytes], List[dict]]:
+        """
+        Renew several processes with the same date into one merged PDF.
+        
+        Processes, patients (and the user's patient versions), doctors,
+        clinics, diseases and medications are loaded in bulk, and the LMEs of
+        every process are filled and merged in one PDF pipeline pass.
+        
+        Args:
+            renewal_date: The new start date shared by all renewals
+            process_ids: IDs of the processes to renew, in output order
+            user: The user requesting the renewals (must own every process)
+            
+        Returns:
+            tuple: (merged PDF bytes or None if nothing succeeded, per-process
+            results as dicts with processo_id, success and error)
+        
+        Raises:
+            ValueError: If renewal date is empty
+        """
+        if not renewal_date:
+            raise ValueError("Data de renovação não pode estar vazia")
+        
+        process_ids = list(dict.fromkeys(int(process_id) for process_id in process_ids))
+        self.logger.info(
+            f"RenewalService: Processing batch renewal of {len(process_ids)} processes "
+            f"with date {renewal_date} by user {user.email}"
+        )
+        
+        processos = self._load_processes_for_batch(process_ids, user)
+        versions = self._load_patient_versions_for_batch(processos.values(), user)
+        medications = self._load_medications_for_batch(processos.values())
+        
+        results = []
+        renewals = []
+        renewal_ids = []
+        for process_id in process_ids:
+            processo = processos.get(process_id)
+            if processo is None:
+                results.append({'processo_id': process_id, 'success': False, 'error': 'Processo não encontrado'})
+                continue
+            
+            paciente_version = versions.get(processo.paciente_id)
+            if paciente_version is None:
+                # Relationship without a version assignment: use the model's fallback
+                paciente_version = processo.paciente.get_version_for_user(user)
+            
+            try:
+                renewals.append(
+                    self._build_renewal_data(processo, renewal_date, paciente_version, user, medications)
+                )
+            except Exception as e:
+                self.logger.error(f"RenewalService: Failed to build renewal data for process {process_id}: {e}", exc_info=True)
+                results.append({'processo_id': process_id, 'success': False, 'error': 'Dados do processo inválidos'})
+                continue
+            renewal_ids.append(process_id)
+            results.append({'processo_id': process_id, 'success': None, 'error': ''})
+        
+        pdf_bytes, errors = self.pdf_service.generate_batch_pdf(renewals, user=user, processo_ids=renewal_ids)
+        
+        pending = iter(errors)
+        for result in results:
+            if result['success'] is None:
+                error = next(pending)
+                result['success'] = error is None
+                result['error'] = error or ''
+        
+        succeeded = sum(1 for result in results if result['success'])
+        self.logger.info(f"RenewalService: Batch renewal finished, {succeeded}/{len(results)} processes renewed")
+        return pdf_bytes, results
+    
+    def _load_processes_for_batch(self, process_ids: List[int], user) -> Dict[int, Processo]:
+        """Load the user's processes with every relation the renewal data reads."""
+        queryset = (
+            Processo.objects
+            .filter(id__in=process_ids, usuario=user)
+            .select_related('paciente', 'medico', 'clinica', 'doenca')
+            .prefetch_related('medicamentos', 'medico__usuarios', 'clinica__medicos', 'clinica__usuarios')
+        )
+        return {processo.id: processo for processo in queryset}
+    
+    def _load_patient_versions_for_batch(self, processos, user) -> Dict[int, PacienteVersion]:
+        """Map patient ID to the version assigned to user, in one query."""
+        through = Paciente.usuarios.through
+        links = (
+            through.objects
+            .filter(usuario=user, paciente_id__in={processo.paciente_id for processo in processos})
+            .select_related('active_version__version')
+        )
+        versions = {}
+        for link in links:
+            if hasattr(link, 'active_version'):
+                versions[link.paciente_id] = link.active_version.version
+        return versions
+    
+    def _load_medications_for_batch(self, processos) -> Dict[int, Medicamento]:
+        """Load every medication prescribed in processos, in one query."""
+        medication_ids = set()
+        for processo in processos:
+            for med_data in (processo.prescricao or {}).values():
+                if not isinstance(med_data, dict):
+                    continue
+                for key, value in med_data.items():
+                    if key.startswith("id_med") and str(value).isdigit():
+                        medication_ids.add(int(value))
+        return Medicamento.objects.in_bulk(medication_ids)
+    
+    def _build_renewal_data(
+        self,
+        processo: Processo,
+        renewal_date,
+        paciente_version=None,
+        user=None,
+        medications: Optional[Dict[int, Medicamento]] = None
+    ) -> dict:
+        """
+        Build the renewal data dictionary of an already loaded process.
+        
+        Args:
+            processo: The process to renew
+            renewal_date: The new start date for the renewal
+            paciente_version: The user's version of the patient (master record if None)
+            user: The user requesting the renewal
+            medications: Optional preloaded medications by ID
+            
+        Returns:
+            dict: Complete dictionary of data for the new renewal process
+        """
+        from processos.repositories.medication_repository import MedicationRepository
+        
         dados = {}
         
-        # Get versioned patient data if user is provided
-        if user:
-            paciente_version = processo.paciente.get_version_for_user(user)
-            if paciente_version:
-                paciente_data = model_to_dict(paciente_version)
-                # Keep master record fields that aren't versioned
-                paciente_data['id'] = processo.paciente.id
-                paciente_data['cpf_paciente'] = processo.paciente.cpf_paciente
-                paciente_data['usuarios'] = processo.paciente.usuarios.all()
-            else:
-                paciente_data = model_to_dict(processo.paciente)
+        if user and paciente_version:
+            paciente_data = model_to_dict(paciente_version)
+            # Keep master record fields that aren't versioned
+            paciente_data['id'] = processo.paciente.id
+            paciente_data['cpf_paciente'] = processo.paciente.cpf_paciente
         else:
-            # Fallback to master record if no user provided
+            # Fallback to master record if no user or version available
             paciente_data = model_to_dict(processo.paciente)
         
         # Collect all related data
@@ -190,16 +324,15 @@ class RenewalService:
             for key, value in processo.dados_condicionais.items():
                 dados[key] = value
         
-       
         # Retrieve prescription data from original process
         dados = self._retrieve_prescription_data(dados, processo)
         
         # Generate medication information
         med_repo = MedicationRepository()
         meds_ids = med_repo.extract_medication_ids_from_form(dados)
-        dados, _ = med_repo.format_medication_dosages(dados, meds_ids)
+        dados, _ = med_repo.format_medication_dosages(dados, meds_ids, medications)
         
-        self.logger.info(f"RenewalService: Generated renewal data with {len(meds_ids)} medications")
+        self.logger.debug(f"RenewalService: Built renewal data with {len(meds_ids)} medications")
         return dados
     
     def create_renewal_dictionary(self, processo: Processo, user=None) -> dict:
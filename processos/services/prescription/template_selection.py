@@ -7,13 +7,15 @@ Contains business logic for disease protocol-based template selection and option
 Extracted from prescription_services.py to follow single responsibility principle.
 """
 
-import os
 import logging
 from typing import List
-from django.conf import settings
 
 from processos.models import Protocolo
-from processos.services.pdf_strategies import DataDrivenStrategy
+from processos.services.pdf_strategies import TemplatePlan, template_plans
+
+
+# Form values that request an optional document
+TRUE_VALUES = ('True', True, 'true', '1', 1)
 
 
 class PrescriptionTemplateSelector:
@@ -33,6 +35,10 @@ class PrescriptionTemplateSelector:
         """
         Select all required PDF templates for the medical prescription.
         
+        Protocol templates come from the protocol's compiled TemplatePlan
+        (see pdf_strategies.py): no configuration parsing or file checks per
+        prescription.
+        
         Args:
             protocolo: Disease protocol from database
             form_data: Form data containing prescription details
@@ -44,105 +50,44 @@ class PrescriptionTemplateSelector:
         self.logger.debug(f"PrescriptionTemplateSelector: Starting template selection for protocol: {protocolo.nome}")
         self.logger.debug(f"PrescriptionTemplateSelector: Base template: {base_template}")
         
+        plan = template_plans.get(protocolo)
         pdf_file_paths = [base_template]  # Always include base prescription
         
         # Add disease and medication specific PDF files
-        protocol_pdfs = self._get_protocol_specific_templates(protocolo, form_data)
+        protocol_pdfs = self._get_protocol_specific_templates(plan, form_data)
         pdf_file_paths.extend(protocol_pdfs)
         self.logger.debug(f"PrescriptionTemplateSelector: Added {len(protocol_pdfs)} protocol-specific PDFs")
         
         # Add optional medical documents
-        optional_pdfs = self._get_optional_medical_documents(protocolo, form_data)
+        optional_pdfs = self._get_optional_medical_documents(plan, form_data)
         pdf_file_paths.extend(optional_pdfs)
         self.logger.debug(f"PrescriptionTemplateSelector: Added {len(optional_pdfs)} optional medical documents")
         
         self.logger.info(f"PrescriptionTemplateSelector: Total PDF files selected: {len(pdf_file_paths)}")
-        for i, pdf_path in enumerate(pdf_file_paths):
-            self.logger.debug(f"PrescriptionTemplateSelector: PDF {i+1}: {pdf_path}")
-        
         return pdf_file_paths
     
-    def _get_protocol_specific_templates(self, protocolo: Protocolo, form_data: dict) -> List[str]:
+    def _get_protocol_specific_templates(self, plan: TemplatePlan, form_data: dict) -> List[str]:
         """Get disease and medication specific PDF templates."""
-        pdf_files = []
-        
-        try:
-            self.logger.debug(f"PrescriptionTemplateSelector: Creating DataDrivenStrategy for protocol: {protocolo.nome}")
-            strategy = DataDrivenStrategy(protocolo)
-            
-            # Disease-specific PDF files
-            disease_pdf_paths = strategy.get_disease_specific_paths(form_data)
-            if disease_pdf_paths:
-                pdf_files.extend(disease_pdf_paths)
-                self.logger.debug(f"PrescriptionTemplateSelector: Found {len(disease_pdf_paths)} disease-specific PDFs")
-                for pdf in disease_pdf_paths:
-                    self.logger.debug(f"PrescriptionTemplateSelector: - Disease PDF: {pdf}")
-            
-            # Medication-specific PDF files
-            med_pdf_paths = strategy.get_medication_specific_paths(form_data)
-            if med_pdf_paths:
-                pdf_files.extend(med_pdf_paths)
-                self.logger.debug(f"PrescriptionTemplateSelector: Found {len(med_pdf_paths)} medication-specific PDFs")
-                for pdf in med_pdf_paths:
-                    self.logger.debug(f"PrescriptionTemplateSelector: - Medication PDF: {pdf}")
-                
-        except Exception as e:
-            self.logger.error(f"PrescriptionTemplateSelector: Error getting protocol PDFs: {e}", exc_info=True)
-        
+        pdf_files = list(plan.disease_paths)
+        pdf_files.extend(plan.paths_for_medication(form_data.get('med1', '')))
         return pdf_files
     
-    def _get_optional_medical_documents(self, protocolo: Protocolo, form_data: dict) -> List[str]:
+    def _get_optional_medical_documents(self, plan: TemplatePlan, form_data: dict) -> List[str]:
         """Get optional medical documents based on prescription requirements."""
         pdf_files = []
         
         # Patient consent form
-        consent_value = form_data.get('consentimento')
-        self.logger.debug(f"PrescriptionTemplateSelector: Consent value: {consent_value} (type: {type(consent_value)})")
-        
-        if consent_value in ['True', True, 'true', '1', 1]:
-            consent_path = os.path.join(
-                settings.PATH_PDF_DIR,
-                protocolo.nome,
-                "consentimento.pdf"
-            )
-            self.logger.debug(f"PrescriptionTemplateSelector: Checking consent PDF at: {consent_path}")
-            
-            if os.path.exists(consent_path):
-                pdf_files.append(consent_path)
-                self.logger.debug(f"PrescriptionTemplateSelector: Added consent PDF: {consent_path}")
-            else:
-                self.logger.warning(f"PrescriptionTemplateSelector: Consent PDF not found at: {consent_path}")
+        if form_data.get('consentimento') in TRUE_VALUES and plan.consent_path:
+            pdf_files.append(plan.consent_path)
         
         # Medical report - check emitir_relatorio flag
-        emitir_relatorio = form_data.get('emitir_relatorio')
-        relatorio_content = form_data.get('relatorio', '')
-        self.logger.debug(f"PrescriptionTemplateSelector: Emitir relatorio: {emitir_relatorio}, content length: {len(str(relatorio_content))}")
-        
-        if emitir_relatorio in ['True', True, 'true', '1', 1] and relatorio_content and str(relatorio_content).strip():
-            if hasattr(settings, 'PATH_RELATORIO'):
-                self.logger.debug(f"PrescriptionTemplateSelector: Checking report PDF at: {settings.PATH_RELATORIO}")
-                if os.path.exists(settings.PATH_RELATORIO):
-                    pdf_files.append(settings.PATH_RELATORIO)
-                    self.logger.debug(f"PrescriptionTemplateSelector: Added report PDF: {settings.PATH_RELATORIO}")
-                else:
-                    self.logger.warning(f"PrescriptionTemplateSelector: Report PDF not found at: {settings.PATH_RELATORIO}")
-            else:
-                self.logger.warning("PrescriptionTemplateSelector: PATH_RELATORIO not configured in settings")
+        if (form_data.get('emitir_relatorio') in TRUE_VALUES and str(form_data.get('relatorio') or '').strip()
+                and plan.report_path):
+            pdf_files.append(plan.report_path)
         
         # Exam request - check emitir_exames flag
-        emitir_exames = form_data.get('emitir_exames')
-        exames_content = form_data.get('exames', '')
-        self.logger.debug(f"PrescriptionTemplateSelector: Emitir exames: {emitir_exames}, content length: {len(str(exames_content))}")
-        
-        if emitir_exames in ['True', True, 'true', '1', 1] and exames_content and str(exames_content).strip():
-            if hasattr(settings, 'PATH_EXAMES'):
-                self.logger.debug(f"PrescriptionTemplateSelector: Checking exam PDF at: {settings.PATH_EXAMES}")
-                if os.path.exists(settings.PATH_EXAMES):
-                    pdf_files.append(settings.PATH_EXAMES)
-                    self.logger.debug(f"PrescriptionTemplateSelector: Added exam PDF: {settings.PATH_EXAMES}")
-                else:
-                    self.logger.warning(f"PrescriptionTemplateSelector: Exam PDF not found at: {settings.PATH_EXAMES}")
-            else:
-                self.logger.warning("PrescriptionTemplateSelector: PATH_EXAMES not configured in settings")
+        if (form_data.get('emitir_exames') in TRUE_VALUES and str(form_data.get('exames') or '').strip()
+                and plan.exam_path):
+            pdf_files.append(plan.exam_path)
         
-        return pdf_files
\ No newline at end of file
+        return pdf_files
@@ -48,7 +48,8 @@ class PrescriptionService:
         medico, 
         clinica,
         patient_exists: bool = False,
-        process_id: Optional[int] = None
+        process_id: Optional[int] = None,
+        defer_pdf: bool = False
     ) -> Tuple[Optional[HttpResponse], Optional[int]]:
         """
         Core prescription workflow orchestrator - handles full prescription lifecycle.
@@ -61,6 +62,8 @@ class PrescriptionService:
         Returns:
             Tuple of (pdf_response, process_id) or (None, None) if failed
             View layer is responsible for handling the PDF response (saving to file, etc.)
+            With defer_pdf=True the PDF is not generated here: the first element is
+            the queued PDFGenerationJob (see PDFJobService), committed with the process.
         """
         # Add comprehensive logging for transaction debugging
         import logging
@@ -143,11 +146,17 @@ class PrescriptionService:
                 db_logger.error(f"PrescriptionService: Final data keys: {list(final_data.keys())}")
                 raise
             
-            # Step 5: Generate PDF
+            # Step 5: Generate PDF (or queue it for the process_pdf_jobs worker)
+            if defer_pdf:
+                from .pdf_job_service import PDFJobService
+                db_logger.info("PrescriptionService: Step 5 - Queueing PDF generation")
+                job = PDFJobService().enqueue_prescription(final_data, processo_id, user)
+                return job, processo_id
+            
             db_logger.info("PrescriptionService: Step 5 - Generating PDF")
             try:
                 # Pass user to PDF service for analytics tracking
-                pdf_response = self.pdf_service.generate_prescription_pdf(final_data, user=user)
+                pdf_response = self.pdf_service.generate_prescription_pdf(final_data, user=user, processo_id=processo_id)
                 
                 if pdf_response:
                     db_logger.info(
@@ -0,0 +1,169 @@
+"""
+Reference Data - Infrastructure Layer
+
+Per-worker snapshot of the small, rarely edited reference tables read by
+every prescription request: diseases by CID, their protocols and the
+protocols' medications.
+
+    if reference_data.enabled:
+        protocolo = reference_data.get_protocol(cid)   # Protocolo.DoesNotExist if none
+    else:
+        protocolo = Protocolo.objects.get(doenca__cid=cid)
+
+The snapshot is loaded once (in the uwsgi master when preloaded, see
+autocusto/wsgi.py) and carries the generation it was loaded at. Saving or
+deleting a Doenca, Protocolo or Medicamento bumps the generation stored in
+settings.REFERENCE_DATA_GENERATION_FILE (a tmpfs file shared by all
+workers) once the transaction commits. Workers check the file at most every
+REFERENCE_DATA_CHECK_SECONDS and reload when it changed, so an edit is seen
+everywhere within seconds and the hot path never queries the database.
+
+Snapshot instances are shared by all requests of the worker: callers must
+treat them as read-only.
+"""
+
+import fcntl
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+
+from processos.models import Doenca, Medicamento, Protocolo
+
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationCounter:
+    """Integer in a small file, incremented under an exclusive lock."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or settings.REFERENCE_DATA_GENERATION_FILE
+
+    def read(self) -> Optional[int]:
+        """Current generation (0 before the first bump), or None if the file is unavailable."""
+        try:
+            with open(self.path, 'rb') as f:
+                return int(f.read() or 0)
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError) as e:
+            logger.warning(f"GenerationCounter: Cannot read {self.path}: {e}")
+            return None
+
+    def bump(self) -> Optional[int]:
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                generation = int(os.read(fd, 32) or 0) + 1
+                os.lseek(fd, 0, os.SEEK_SET)
+                os.ftruncate(fd, 0)
+                os.write(fd, str(generation).encode())
+                return generation
+            finally:
+                os.close(fd)
+        except (OSError, ValueError) as e:
+            logger.error(f"GenerationCounter: Cannot bump {self.path}: {e}")
+            return None
+
+
+class ReferenceSnapshot:
+    """Diseases, protocols and medications as loaded at one generation."""
+
+    def __init__(self, generation: Optional[int]):
+        self.generation = generation
+
+        protocolos = list(Protocolo.objects.prefetch_related('medicamentos'))
+        self.medications: Dict[int, Tuple[Medicamento, ...]] = {
+            protocolo.pk: tuple(protocolo.medicamentos.all()) for protocolo in protocolos
+        }
+        protocolos_by_id = {protocolo.pk: protocolo for protocolo in protocolos}
+
+        self.diseases: Dict[str, Doenca] = {}
+        self.protocols: Dict[str, Protocolo] = {}
+        for doenca in Doenca.objects.all():
+            # Share one Protocolo instance between its diseases (a protocol created
+            # since the query above is picked up by the reload its commit triggers)
+            protocolo = protocolos_by_id.get(doenca.protocolo_id)
+            if protocolo is not None:
+                doenca.protocolo = protocolo
+                self.protocols[doenca.cid] = protocolo
+            self.diseases[doenca.cid] = doenca
+
+
+class ReferenceData:
+    """The worker's ReferenceSnapshot, reloaded when the generation changes (see module docstring)."""
+
+    def __init__(self, counter: Optional[GenerationCounter] = None):
+        self._counter = counter
+        self._snapshot: Optional[ReferenceSnapshot] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return settings.REFERENCE_DATA_CACHE_ENABLED
+
+    @property
+    def counter(self) -> GenerationCounter:
+        if self._counter is None:
+            self._counter = GenerationCounter()
+        return self._counter
+
+    def snapshot(self) -> ReferenceSnapshot:
+        """The current snapshot, loading it if missing or outdated."""
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot is not None and now - self._checked_at < settings.REFERENCE_DATA_CHECK_SECONDS:
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            # Read before loading: a bump during the load triggers another reload
+            generation = self.counter.read()
+            if snapshot is None or generation is None or snapshot.generation != generation:
+                snapshot = ReferenceSnapshot(generation)
+                self._snapshot = snapshot
+                logger.info(
+                    f"ReferenceData: Loaded {len(snapshot.diseases)} diseases and "
+                    f"{len(snapshot.medications)} protocols (generation {generation})"
+                )
+            self._checked_at = time.monotonic()
+        return snapshot
+
+    def get_disease(self, cid: str) -> Doenca:
+        """Doenca of cid, raising Doenca.DoesNotExist like Doenca.objects.get."""
+        try:
+            return self.snapshot().diseases[cid]
+        except KeyError:
+            raise Doenca.DoesNotExist(f"No disease with CID {cid}")
+
+    def get_protocol(self, cid: str) -> Protocolo:
+        """Protocolo of cid's disease, raising Protocolo.DoesNotExist like Protocolo.objects.get."""
+        try:
+            return self.snapshot().protocols[cid]
+        except KeyError:
+            raise Protocolo.DoesNotExist(f"No protocol for CID {cid}")
+
+    def get_medications(self, protocolo: Protocolo) -> Tuple[Medicamento, ...]:
+        """Medications of protocolo (protocolo.medicamentos.all())."""
+        return self.snapshot().medications.get(protocolo.pk, ())
+
+    def changed(self) -> None:
+        """Reference tables were edited: reload here now and in other workers on their next check."""
+        self.counter.bump()
+        with self._lock:
+            self._snapshot = None
+
+    def changed_on_commit(self) -> None:
+        """changed() once the current transaction commits (other workers cannot see it before)."""
+        transaction.on_commit(self.changed)
+
+
+reference_data = ReferenceData()
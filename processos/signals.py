@@ -0,0 +1,36 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from processos.forms.form_factories import form_classes
+from processos.models import Doenca, Medicamento, Protocolo
+from processos.services.pdf_strategies import template_plans
+from processos.services.reference_data import reference_data
+
+
+@receiver(post_save, sender=Protocolo)
+@receiver(post_delete, sender=Protocolo)
+def invalidate_template_plan(sender, instance, **kwargs):
+    """Recompile the protocol's template plan on next use"""
+    template_plans.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=Protocolo)
+@receiver(post_delete, sender=Protocolo)
+def invalidate_form_classes(sender, instance, **kwargs):
+    """Rebuild the protocol form classes on next use (other workers rebuild on snapshot reload)"""
+    form_classes.invalidate()
+
+
+@receiver(post_save, sender=Doenca)
+@receiver(post_delete, sender=Doenca)
+@receiver(post_save, sender=Protocolo)
+@receiver(post_delete, sender=Protocolo)
+@receiver(post_save, sender=Medicamento)
+@receiver(post_delete, sender=Medicamento)
+@receiver(m2m_changed, sender=Protocolo.medicamentos.through)
+def bump_reference_data(sender, action=None, **kwargs):
+    """Reload the reference data snapshot in every worker once the edit is committed"""
+    if action is not None and not action.startswith('post_'):
+        return  # m2m_changed also fires before the change
+    if reference_data.enabled:
+        reference_data.changed_on_commit()
@@ -1,14 +1,17 @@
 from django.urls import path
-from .views import cadastro, busca_processos, renovacao_rapida, edicao, pdf, serve_pdf, set_edit_session
+from .views import cadastro, busca_processos, renovacao_rapida, renovacao_lote, edicao, pdf, serve_pdf, serve_generated_pdf, pdf_job_status, set_edit_session
 from .ajax import busca_doencas, verificar_1_vez
 
 urlpatterns = [
     path("cadastro/", cadastro, name="processos-cadastro"),
     path("busca/", busca_processos, name="processos-busca"),
     path("renovacao/", renovacao_rapida, name="processos-renovacao-rapida"),
+    path("renovacao/lote/", renovacao_lote, name="processos-renovacao-lote"),
     path("edicao/", edicao, name="processos-edicao"),
     path("pdf/", pdf, name="processos-pdf"),
     path("serve-pdf/<str:filename>/", serve_pdf, name="processos-serve-pdf"),
+    path("serve-pdf/d/<str:token>/", serve_generated_pdf, name="processos-serve-generated-pdf"),
+    path("pdf-jobs/<int:job_id>/", pdf_job_status, name="processos-pdf-job-status"),
     path("set-edit-session/", set_edit_session, name="processos-set-edit-session"),
     path("ajax/doencas/", busca_doencas, name="busca-doencas"),
     path("ajax/verificar_1_vez/", verificar_1_vez, name="verificar_1_vez"),
@@ -8,4 +8,5 @@ Available Utils:
 - ModelUtils: Django model instantiation utilities
 - DataUtils: Data transformation and formatting utilities  
 - URLUtils: URL generation and manipulation utilities
+- ProcessUtils: Operating system process utilities
 """
\ No newline at end of file
@@ -117,6 +117,22 @@ class PDFJsonResponseHelper:
         self.logger.error(f"PDF JSON response error: {response_data['error']}")
         return JsonResponse(response_data)
     
+    def job_queued(self, job, status_url: str, operation: str = 'create') -> JsonResponse:
+        """
+        Response for a PDF queued for asynchronous generation.
+        
+        The frontend polls status_url until the job reports a pdf_url.
+        """
+        self.logger.info(f"PDF JSON response queued: Job {job.pk}, Operation: {operation}")
+        return JsonResponse({
+            'success': True,
+            'job_id': job.pk,
+            'status': job.status,
+            'status_url': status_url,
+            'processo_id': job.processo_id,
+            'operation': operation,
+        })
+    
     def pdf_generation_failed(self) -> JsonResponse:
         """Standard response for PDF generation failure."""
         return self.error('pdf_generation_failed')
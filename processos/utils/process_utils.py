@@ -0,0 +1,19 @@
+"""
+Process Utils - Operating System Process Utilities
+
+This module contains pure utility functions about operating system processes,
+used by the ledgers shared by uwsgi workers to reclaim what dead workers held.
+"""
+
+import os
+
+
+def pid_alive(pid: int) -> bool:
+    """Whether a process with pid exists (it may belong to another user)."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
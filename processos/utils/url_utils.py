@@ -21,7 +21,9 @@ def generate_protocol_link(cid: str) -> str:
     Generate a link to the protocol file for a given CID.
     
     This utility function constructs the URL path to the protocol PDF file
-    based on the disease CID code.
+    based on the disease CID code. The URL carries a version key of the
+    source file (?v=) so nginx can serve it as immutable and a changed
+    file gets a new URL.
     
     Args:
         cid: The CID code for the disease
@@ -33,15 +35,22 @@ def generate_protocol_link(cid: str) -> str:
         DoesNotExist: If no protocol is found for the CID
     """
     from processos.models import Protocolo
+    from processos.services.reference_data import reference_data
     
     logger.debug(f"URLUtils: Generating protocol link for CID {cid}")
     
     try:
-        protocol = Protocolo.objects.get(doenca__cid=cid)
+        if reference_data.enabled:
+            protocol = reference_data.get_protocol(cid)
+        else:
+            protocol = Protocolo.objects.get(doenca__cid=cid)
         file_path = protocol.arquivo
         
         # Construct the full URL
         protocol_url = os.path.join(settings.STATIC_URL, "protocolos", file_path)
+        version = _protocol_file_version(file_path)
+        if version:
+            protocol_url = f"{protocol_url}?v={version}"
         
         logger.debug(f"URLUtils: Generated protocol link: {protocol_url}")
         return protocol_url
@@ -51,6 +60,24 @@ def generate_protocol_link(cid: str) -> str:
         raise
 
 
+def _protocol_file_version(file_path: str) -> Optional[str]:
+    """
+    Version key (?v=) of a protocol PDF, or None if the file is unavailable.
+    
+    This is a short hash of the source file under PATH_PDF_DIR, not of the
+    bytes actually served: nginx serves the /dev/shm copy made by startup.sh,
+    which may have been linearized since. It only changes when the source
+    file does, which is all the immutable caching of versioned URLs needs.
+    """
+    from processos.services.pdf_delivery import content_etag
+    
+    try:
+        return content_etag(os.path.join(settings.PATH_PDF_DIR, file_path)).strip('"')[:12]
+    except OSError as e:
+        logger.warning(f"URLUtils: Could not hash protocol file {file_path}: {e}")
+        return None
+
+
 def generate_pdf_serving_url(filename: str, base_path: str = "serve_pdf") -> str:
     """
     Generate URL for serving PDF files.
@@ -1,17 +1,20 @@
 # Import all views to maintain backward compatibility
-from .pdf_views import pdf, serve_pdf
+from .pdf_views import pdf, serve_pdf, serve_generated_pdf, pdf_job_status
 from .session_views import set_edit_session
 from .prescription_views import edicao, cadastro
 from .search_views import busca_processos
-from .renewal_views import renovacao_rapida
+from .renewal_views import renovacao_rapida, renovacao_lote
 
 # Maintain backward compatibility by exposing all views at package level
 __all__ = [
     'pdf',
     'serve_pdf', 
+    'serve_generated_pdf',
+    'pdf_job_status',
     'set_edit_session',
     'edicao',
     'cadastro',
     'busca_processos',
-    'renovacao_rapida'
+    'renovacao_rapida',
+    'renovacao_lote'
 ]
\ No newline at end of file
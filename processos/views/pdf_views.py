@@ -3,16 +3,25 @@ PDF Views - PDF display and serving functionality
 
 This module contains views related to PDF operations with simplified control flow:
 - pdf: Displays generated PDF links
-- serve_pdf: Securely serves PDF files with authorization
+- serve_generated_pdf: Serves generated PDFs through signed, expiring links
+- serve_pdf: Serves legacy pdf_final_{cpf}_{cid}.pdf files with patient authorization
+Files are delivered by PDFDelivery: nginx via X-Accel-Redirect when
+settings.PDF_ACCEL_REDIRECT_PREFIX is set, otherwise streamed with ETag,
+conditional request and byte range support.
+- pdf_job_status: JSON status of a queued (asynchronous) PDF generation job
 """
 
 import os
 import logging
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse, Http404
+from django.http import HttpResponse, Http404, JsonResponse
 from analytics.models import PDFGenerationLog
+from processos.models import PDFGenerationJob
 from processos.services.pdf_authorization_service import PDFAuthorizationService
+from processos.services.pdf_delivery import PDFDelivery
+from processos.services.pdf_storage import GeneratedPDFStore
+from processos.utils.pdf_json_response_helper import PDFJsonResponseHelper
 
 logger = logging.getLogger(__name__)
 
@@ -34,7 +43,12 @@ def pdf(request):
 
 @login_required
 def serve_pdf(request, filename):
-    """Serves PDF files securely with simplified control flow and early returns."""
+    """
+    Serves legacy pdf_final_{cpf}_{cid}.pdf files, authorized by patient ownership.
+    
+    New documents are served by serve_generated_pdf; this view keeps links
+    issued before signed URLs working until their files are cleaned up.
+    """
     
     # Step 1: Authorize access (raises Http404 if unauthorized)
     auth_service = PDFAuthorizationService()
@@ -46,28 +60,84 @@ def serve_pdf(request, filename):
         logger.warning(f"PDF not found in filesystem: {tmp_pdf_path}")
         raise Http404("PDF not found or expired")
     
-    # Step 3: Read and serve file
+    # Step 3: Deliver the file and track analytics
+    response = _deliver(request, tmp_pdf_path, filename)
+    logger.info(f"Successfully served PDF {filename} to user {request.user.email}")
+    
+    return response
+
+
+@login_required
+def serve_generated_pdf(request, token):
+    """
+    Serves a generated PDF through its signed, expiring link.
+    
+    Authorization is the link signature alone: it names the document and the
+    user it was issued to, so no patient lookup is needed.
+    """
+    store = GeneratedPDFStore()
+    doc_id = store.verify(token, request.user.pk)
+    if doc_id is None:
+        raise Http404("PDF not found or expired")
+    
+    pdf_path = store.path(doc_id)
+    if not os.path.exists(pdf_path):
+        logger.warning(f"Generated PDF not found in filesystem: {pdf_path}")
+        raise Http404("PDF not found or expired")
+    
+    response = _deliver(request, pdf_path, store.filename(doc_id))
+    store.touch(doc_id)
+    logger.info(f"Successfully served generated PDF {doc_id} to user {request.user.email}")
+    
+    return response
+
+
+@login_required
+def pdf_job_status(request, job_id):
+    """Reports the status of a queued PDF job owned by the current user."""
     try:
-        with open(tmp_pdf_path, 'rb') as f:
-            pdf_content = f.read()
-    except Exception as e:
-        logger.error(f"Error reading PDF file {tmp_pdf_path}: {e}")
-        raise Http404("Error reading PDF")
+        job = PDFGenerationJob.objects.get(pk=job_id, usuario=request.user)
+    except PDFGenerationJob.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'Job not found'}, status=404)
     
-    # Step 4: Create response with security headers
-    response = HttpResponse(pdf_content, content_type='application/pdf')
-    response['Content-Disposition'] = f'inline; filename="{filename}"'
-    response['X-Content-Type-Options'] = 'nosniff'
-    response['X-Frame-Options'] = 'SAMEORIGIN'
+    json_response = PDFJsonResponseHelper()
+    operation = 'renew' if job.kind == PDFGenerationJob.KIND_RENEWAL else 'create'
     
-    # Step 5: Log success and track analytics
-    logger.info(f"Successfully served PDF {filename} to user {request.user.email}")
-    _track_pdf_analytics(request, pdf_content)
+    if job.status == PDFGenerationJob.STATUS_DONE:
+        return json_response.success(
+            pdf_url=job.pdf_url,
+            processo_id=job.processo_id,
+            operation=operation,
+            filename=os.path.basename(job.pdf_url.rstrip('/')),
+            job_id=job.pk,
+            status=job.status,
+        )
+    if job.status == PDFGenerationJob.STATUS_FAILED:
+        return json_response.error('pdf_generation_failed', job_id=job.pk, status=job.status)
+    
+    # Still pending or running: the frontend keeps polling
+    return JsonResponse({'success': True, 'job_id': job.pk, 'status': job.status})
+
+
+def _deliver(request, pdf_path, filename):
+    """
+    Build the delivery response for pdf_path and track analytics.
+    
+    Revalidations (304) and follow-up byte ranges are not counted as new
+    downloads.
+    """
+    try:
+        response, sent = PDFDelivery().build_response(request, pdf_path, filename)
+    except OSError as e:
+        logger.error(f"Error reading PDF file {pdf_path}: {e}")
+        raise Http404("Error reading PDF")
     
+    if response.status_code == 200 or response.get('Content-Range', '').startswith('bytes 0-'):
+        _track_pdf_analytics(request, sent)
     return response
 
 
-def _track_pdf_analytics(request, pdf_content):
+def _track_pdf_analytics(request, file_size):
     """Track PDF serving analytics with error handling."""
     try:
         PDFGenerationLog.objects.create(
@@ -75,7 +145,7 @@ def _track_pdf_analytics(request, pdf_content):
             pdf_type='served',
             success=True,
             generation_time_ms=0,  # No generation time for serving
-            file_size_bytes=len(pdf_content),
+            file_size_bytes=file_size,
             ip_address=request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')[0] if request.META.get('HTTP_X_FORWARDED_FOR') else request.META.get('REMOTE_ADDR'),
             user_agent=request.META.get('HTTP_USER_AGENT', ''),
             error_message=''
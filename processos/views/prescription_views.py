@@ -19,7 +19,9 @@ Architecture:
 """
 
 import logging
+from django.conf import settings
 from django.shortcuts import render, redirect
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db import IntegrityError
@@ -241,6 +243,9 @@ def _handle_prescription_edit_post(request, setup, ModeloFormulario, escolhas, m
     4. Session management for workflow continuation
     5. JSON response with success/failure status for AJAX frontend
     
+    With settings.PDF_ASYNC_GENERATION, AJAX requests stop after saving the process:
+    PDF generation is queued and the response carries a job status URL to poll.
+    
     Error Handling:
     - Form validation errors: return structured JSON with field-specific error messages
     - Business logic errors: delegate to service layer, return user-friendly error responses
@@ -310,6 +315,8 @@ def _handle_prescription_edit_post(request, setup, ModeloFormulario, escolhas, m
         return json_response.exception(e, context="validação do formulário")
     
     # STEP 2: Business logic delegation - prescription update and PDF generation
+    # Async mode only for AJAX: the frontend polls the job, traditional forms need the PDF now
+    defer_pdf = settings.PDF_ASYNC_GENERATION and request.headers.get('X-Requested-With') == 'XMLHttpRequest'
     try:
         # Delegate all business logic to PrescriptionService
         # Service handles: patient data versioning, prescription record update, PDF generation
@@ -320,13 +327,20 @@ def _handle_prescription_edit_post(request, setup, ModeloFormulario, escolhas, m
             medico=medico,                   # Doctor performing the update
             clinica=clinica,                 # Clinic for prescription header
             patient_exists=True,             # Editing existing prescription (patient already exists)
-            process_id=processo_id           # ID of prescription being updated
+            process_id=processo_id,          # ID of prescription being updated
+            defer_pdf=defer_pdf              # Queue the PDF instead of generating it in this worker
         )
         
         # Validate that business logic succeeded and returned expected results
         # Both PDF response and process ID are required for successful update
         if not pdf_response or not updated_processo_id:
             return json_response.pdf_generation_failed()
+        
+        if defer_pdf:
+            # pdf_response is the queued PDFGenerationJob - the process_pdf_jobs worker generates it
+            request.session["processo_id"] = updated_processo_id
+            status_url = reverse('processos-pdf-job-status', kwargs={'job_id': pdf_response.pk})
+            return json_response.job_queued(pdf_response, status_url, operation='update')
             
     except Exception as e:
         # Log business logic errors while providing user-friendly feedback
@@ -339,9 +353,8 @@ def _handle_prescription_edit_post(request, setup, ModeloFormulario, escolhas, m
         # File service handles secure file storage with appropriate access controls
         file_service = PDFFileService()
         pdf_url = file_service.save_pdf_and_get_url(
-            pdf_response,                                    # Generated PDF binary data
-            dados_formulario.get('cpf_paciente', 'unknown'), # Patient CPF for file organization
-            dados_formulario.get('cid', 'unknown')           # Disease code for file organization
+            pdf_response,    # Generated PDF binary data
+            request.user     # Signed link is only valid for the requesting user
         )
         
         # Validate that file storage succeeded
@@ -390,6 +403,9 @@ def _handle_prescription_create_post(request, setup, ModeloFormulario, escolhas,
     5. Session management for workflow continuation and success feedback
     6. JSON response with success/failure status for AJAX frontend
     
+    With settings.PDF_ASYNC_GENERATION, AJAX requests stop after saving the process:
+    PDF generation is queued and the response carries a job status URL to poll.
+    
     Error Handling:
     - Form validation errors: return structured JSON with field-specific error messages
     - Business logic errors: delegate to service layer, return user-friendly error responses
@@ -481,6 +497,8 @@ def _handle_prescription_create_post(request, setup, ModeloFormulario, escolhas,
         return json_response.exception(e, context="validação do formulário")
     
     # STEP 2: Business logic delegation - prescription creation and patient management
+    # Async mode only for AJAX: the frontend polls the job, traditional forms need the PDF now
+    defer_pdf = settings.PDF_ASYNC_GENERATION and request.headers.get('X-Requested-With') == 'XMLHttpRequest'
     try:
         # Delegate all complex business logic to PrescriptionService
         # Service handles:
@@ -495,13 +513,20 @@ def _handle_prescription_create_post(request, setup, ModeloFormulario, escolhas,
             medico=medico,                   # Doctor creating the prescription
             clinica=clinica,                 # Clinic for prescription header and legal compliance
             patient_exists=paciente_existe,  # Boolean flag: existing patient vs new patient workflow
-            process_id=None                  # None for new prescriptions (vs update operations)
+            process_id=None,                 # None for new prescriptions (vs update operations)
+            defer_pdf=defer_pdf              # Queue the PDF instead of generating it in this worker
         )
         
         # Validate that business logic succeeded and returned expected results
         # Both PDF response and process ID are critical for successful prescription creation
         if not pdf_response or not processo_id:
             return json_response.pdf_generation_failed()
+        
+        if defer_pdf:
+            # pdf_response is the queued PDFGenerationJob - the process_pdf_jobs worker generates it
+            job = pdf_response
+            status_url = reverse('processos-pdf-job-status', kwargs={'job_id': job.pk})
+            return json_response.job_queued(job, status_url, operation='create')
             
     except Exception as e:
         # Log business logic errors while providing user-friendly feedback
@@ -515,9 +540,8 @@ def _handle_prescription_create_post(request, setup, ModeloFormulario, escolhas,
         # File service handles: secure storage, access controls, and URL generation
         file_service = PDFFileService()
         pdf_url = file_service.save_pdf_and_get_url(
-            pdf_response,                                    # Generated PDF binary data
-            dados_formulario.get('cpf_paciente', 'unknown'), # Patient CPF for file organization
-            dados_formulario.get('cid', 'unknown')           # Disease code for file categorization
+            pdf_response,    # Generated PDF binary data
+            request.user     # Signed link is only valid for the requesting user
         )
         
         # Validate that file storage succeeded before proceeding
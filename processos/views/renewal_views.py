@@ -29,14 +29,21 @@ The renewal workflow differs from new prescriptions by:
 import os
 import time
 import logging
+from django.conf import settings
+from django.http import JsonResponse
 from django.shortcuts import render, redirect
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from processos.forms import RenovacaoRapidaForm
+from django.views.decorators.http import require_http_methods
+from processos.forms import RenovacaoRapidaForm, RenovacaoLoteForm
 from processos.services.view_services import PrescriptionViewSetupService
 from processos.services.view_setup_models import SetupError
 from processos.services.prescription_services import RenewalService
+from processos.services.prescription.pdf_job_service import PDFJobService
+from processos.repositories.process_repository import ProcessRepository
 from processos.services.io_services import PDFFileService
+from processos.services.pdf_storage import GeneratedPDFStore
 from processos.utils.pdf_json_response_helper import PDFJsonResponseHelper
 
 # Logging setup for different aspects of the renewal process
@@ -82,6 +89,56 @@ def renovacao_rapida(request):
     return _handle_renewal_post_request(request)
 
 
+@login_required
+@require_http_methods(["POST"])
+def renovacao_lote(request):
+    """
+    Batch renewal: renews several processes with the same date in one request.
+    
+    All processes and their related records are loaded in bulk and every LME
+    is generated in a single PDF pipeline pass. The merged PDF is saved in the
+    generated PDF store and the JSON response carries its signed pdf_url and
+    the outcome of each process as results, a list of
+    {processo_id, success, error}.
+    
+    When no process could be renewed, a JSON error with the same per-process
+    results is returned instead.
+    """
+    json_response = PDFJsonResponseHelper()
+    form = RenovacaoLoteForm(request.POST)
+    if not form.is_valid():
+        return json_response.form_validation_failed(form.errors)
+    
+    usuario = request.user
+    processo_ids = form.cleaned_data["processo_ids"]
+    nova_data = form.cleaned_data["data_1"]
+    
+    try:
+        start_time = time.time()
+        audit_logger.info(f"User {usuario.email} initiated batch renewal for processos {processo_ids}")
+        
+        renewal_service = RenewalService()
+        pdf_bytes, results = renewal_service.process_batch_renewal(nova_data, processo_ids, usuario)
+        
+        pdf_logger.info(f"Batch renewal PDF generation completed in {time.time() - start_time:.3f}s")
+    except Exception as e:
+        logger.error(f"Error generating batch renewal PDF: {e}", exc_info=True)
+        return json_response.pdf_generation_failed()
+    
+    if not pdf_bytes:
+        logger.error("Failed to generate PDF for batch renewal")
+        return json_response.error('pdf_generation_failed', results=results)
+    
+    try:
+        store = GeneratedPDFStore()
+        pdf_url = store.url(store.save(pdf_bytes), usuario)
+    except Exception as e:
+        logger.error(f"Error saving batch renewal PDF: {e}", exc_info=True)
+        return json_response.pdf_save_failed()
+    
+    return JsonResponse({'success': True, 'pdf_url': pdf_url, 'results': results})
+
+
 def _handle_renewal_get_request(request):
     try:
         # Extract patient search parameter - 'b' is short for 'busca' (search in Portuguese)
@@ -158,6 +215,10 @@ def _handle_renewal_edit_mode(request, processo_id, nova_data):
 def _handle_renewal_pdf_generation(request, processo_id, nova_data, usuario):
     json_response = PDFJsonResponseHelper()
     
+    # Async mode (AJAX only): queue the renewal and let the frontend poll the job
+    if settings.PDF_ASYNC_GENERATION and request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return _handle_renewal_pdf_enqueue(json_response, processo_id, nova_data, usuario)
+    
     # Phase 1: Generate the renewal PDF document
     try:
         # Start performance timing for monitoring PDF generation speed
@@ -189,19 +250,9 @@ def _handle_renewal_pdf_generation(request, processo_id, nova_data, usuario):
     
     # Phase 2: Save PDF file to filesystem and generate access URL
     try:
-        # Generate renewal data for file naming and metadata
-        # This includes patient CPF and medical condition code for unique file identification
-        renewal_service = RenewalService()
-        dados_renovacao = renewal_service.generate_renewal_data(nova_data, int(processo_id), usuario)
-        
-        # Save PDF file and get public URL for access
-        # File naming uses patient CPF and CID to ensure uniqueness and audit compliance
+        # Save PDF file under an opaque id and get a signed, expiring URL for this user
         file_service = PDFFileService()
-        pdf_url = file_service.save_pdf_and_get_url(
-            pdf_response,
-            dados_renovacao.get('cpf_paciente', 'unknown'),  # Patient Brazilian tax ID
-            dados_renovacao.get('cid', 'unknown')  # Medical condition code (CID-10)
-        )
+        pdf_url = file_service.save_pdf_and_get_url(pdf_response, usuario)
     except Exception as e:
         # Log file saving errors separately from PDF generation errors
         logger.error(f"Error saving renewal PDF: {e}", exc_info=True)
@@ -216,6 +267,25 @@ def _handle_renewal_pdf_generation(request, processo_id, nova_data, usuario):
     return _handle_renewal_success(request, json_response, pdf_url, processo_id)
 
 
+def _handle_renewal_pdf_enqueue(json_response, processo_id, nova_data, usuario):
+    # Checked now (the worker checks again): a process of another user gets a 403, not a failing job
+    if ProcessRepository().get_process_for_user(int(processo_id), usuario) is None:
+        audit_logger.warning(f"User {usuario.email} tried to queue a renewal of processo {processo_id} they do not own")
+        response = json_response.error('process_not_found')
+        response.status_code = 403
+        return response
+    
+    try:
+        job = PDFJobService().enqueue_renewal(int(processo_id), nova_data, usuario)
+    except Exception as e:
+        logger.error(f"Error queueing renewal PDF: {e}", exc_info=True)
+        return json_response.pdf_generation_failed()
+    
+    audit_logger.info(f"User {usuario.email} queued renewal job {job.pk} for processo {processo_id}")
+    status_url = reverse('processos-pdf-job-status', kwargs={'job_id': job.pk})
+    return json_response.job_queued(job, status_url, operation='renew')
+
+
 def _handle_renewal_success(request, json_response, pdf_url, processo_id):
     filename = os.path.basename(pdf_url.rstrip('/'))
     
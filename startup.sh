@@ -14,6 +14,15 @@ cp -r /home/appuser/app/static/autocusto/processos/* /dev/shm/autocusto/static/p
 echo "Copying protocolos PDFs to memory..."
 cp -r /home/appuser/app/static/autocusto/protocolos/* /dev/shm/autocusto/static/protocolos/ 2>/dev/null || true
 
+# Linearize protocol PDFs so browsers render page 1 before the whole file arrives
+echo "Linearizing protocolos PDFs..."
+python manage.py linearize_protocols --directory /dev/shm/autocusto/static/protocolos || echo "Protocol linearization skipped"
+
+# Validate the protocol form configurations (lists their conditional fields, fails loudly on broken
+# configurations). Validation only: the classes served are built in the uwsgi master, see autocusto/wsgi.py
+echo "Validating protocol forms..."
+python manage.py prebuild_forms --verbosity 2 || echo "Protocol form validation failed"
+
 echo "Memory mount dsetup complete. PDF templates available in /dev/shm/autocusto/static/"
 
 # Execute the original command
@@ -22,7 +22,9 @@ const FORM_CONFIG = {
     delays: {
         buttonReEnable: 500,
         buttonReEnableError: 1500,
-        successDelay: 1000
+        successDelay: 1000,
+        jobPollInterval: 1000,   // Queued PDF jobs (PDF_ASYNC_GENERATION)
+        jobPollTimeout: 120000
     },
     selectors: {
         submitText: '.submit-text',
@@ -728,8 +730,46 @@ window.FormHandler = (function() {
             return this;
         }
 
+        async waitForPdfJob(data) {
+            log('PDF', 'PDF queued - polling job status', { job: data.job_id, url: data.status_url }, this.formId);
+            const deadline = Date.now() + FORM_CONFIG.delays.jobPollTimeout;
+            
+            while (Date.now() < deadline) {
+                await new Promise(resolve => setTimeout(resolve, FORM_CONFIG.delays.jobPollInterval));
+                
+                try {
+                    const response = await fetch(data.status_url, {
+                        headers: { 'Accept': 'application/json' }
+                    });
+                    const status = await response.json();
+                    log('PDF', `Job ${data.job_id} status: ${status.status}`, null, this.formId);
+                    
+                    if (!status.success) {
+                        return { success: false, error: status };
+                    }
+                    if (status.pdf_url) {
+                        return { success: true, data: { ...data, ...status } };
+                    }
+                } catch (error) {
+                    log('WARN', 'Job status request failed - retrying', error, this.formId);
+                }
+            }
+            
+            return { success: false, error: { error: 'Tempo esgotado aguardando a geração do PDF.' } };
+        }
+
         async handleSuccess(data) {
             log('SUCCESS', 'Handling PDF form success', data, this.formId);
+            
+            // Asynchronous generation: the process is saved, wait for the queued PDF
+            if (data.status_url && !data.pdf_url) {
+                const result = await this.waitForPdfJob(data);
+                if (!result.success) {
+                    await this.handleError(result.error);
+                    return;
+                }
+                data = result.data;
+            }
             log('SUCCESS', 'PDF modal config enabled?', this.config.pdfModal, this.formId);
             log('SUCCESS', 'PDF URL in response?', !!data.pdf_url, this.formId);
             
@@ -71,3 +71,6 @@ LOGGING = {
 
 # Disable analytics signals completely during tests
 ANALYTICS_ENABLED = False
+
+# Query reference data directly: TestCase rollbacks do not bump the snapshot generation
+REFERENCE_DATA_CACHE_ENABLED = False
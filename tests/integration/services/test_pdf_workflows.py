@@ -217,7 +217,7 @@ class PDFGenerationPlaywrightBase(PlaywrightFormTestBase):
         # Check PDF URL format
         pdf_url = response_json['pdf_url']
         self.assertIn('serve-pdf', pdf_url, "PDF URL should contain serve-pdf endpoint")
-        self.assertIn('pdf_final_', pdf_url, "PDF URL should contain pdf_final_ prefix")
+        self.assertIn('/serve-pdf/d/', pdf_url, "PDF URL should be a signed generated-PDF link")
         
         return pdf_url
 
@@ -1,6 +1,17 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django import forms
+from django.test import TestCase, override_settings
 from processos.models import Protocolo, Doenca
-from processos.forms import PreProcesso
+from processos.forms import PreProcesso, NovoProcesso, RenovarProcesso, fabricar_formulario
+from processos.forms.form_factories import form_classes
+from processos.services.pdf_strategies import get_conditional_fields
+from processos.services.reference_data import GenerationCounter, reference_data
 import random
 from cpf_generator import CPF
 
@@ -68,4 +79,124 @@ class PreProcessoFormTest(TestCase):
         self.assertIn('cpf_paciente', form.errors)
         self.assertIn('cid', form.errors)
         self.assertEqual(form.errors['cpf_paciente'], ['Por favor, insira o CPF do paciente.'])
-        self.assertEqual(form.errors['cid'], ['Por favor, insira o CID da doença.'])
\ No newline at end of file
+        self.assertEqual(form.errors['cid'], ['Por favor, insira o CID da doença.'])
+
+@override_settings(REFERENCE_DATA_CACHE_ENABLED=True, REFERENCE_DATA_CHECK_SECONDS=60)
+class FabricarFormularioCacheTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.generation_file = os.path.join(self.directory, 'generation')
+        for patcher in (
+            patch.object(reference_data, '_counter', GenerationCounter(self.generation_file)),
+            patch.object(reference_data, '_snapshot', None),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.protocolo = Protocolo.objects.create(
+            nome="Protocolo Teste", arquivo="teste.pdf",
+            dados_condicionais={"fields": [{"name": "opt_edss", "label": "EDSS", "type": "text"}]}
+        )
+        Doenca.objects.create(cid="A00.0", nome="Doenca Teste", protocolo=self.protocolo)
+
+    def tearDown(self):
+        form_classes.invalidate()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_form_class_built_once(self):
+        with patch('processos.forms.form_factories.get_conditional_fields', wraps=get_conditional_fields) as build:
+            first = fabricar_formulario("A00.0", False)
+            second = fabricar_formulario("A00.0", False)
+            renewal = fabricar_formulario("A00.0", True)
+
+        self.assertIs(first, second)
+        self.assertIsNot(first, renewal)
+        self.assertTrue(issubclass(first, NovoProcesso))
+        self.assertTrue(issubclass(renewal, RenovarProcesso))
+        self.assertIn("opt_edss", first.base_fields)
+        self.assertEqual(build.call_count, 2)
+
+    def test_changed_fields_rebuild_class(self):
+        first = fabricar_formulario("A00.0", False)
+
+        # Changed by another worker: no signal here, the reloaded snapshot has a new protocol instance
+        Protocolo.objects.filter(pk=self.protocolo.pk).update(
+            dados_condicionais={"fields": [{"name": "opt_peso", "label": "Peso", "type": "number"}]}
+        )
+        GenerationCounter(self.generation_file).bump()
+        with override_settings(REFERENCE_DATA_CHECK_SECONDS=0):
+            second = fabricar_formulario("A00.0", False)
+
+        self.assertIsNot(first, second)
+        self.assertIn("opt_peso", second.base_fields)
+        self.assertNotIn("opt_edss", second.base_fields)
+
+    @override_settings(REFERENCE_DATA_CACHE_ENABLED=False)
+    def test_without_snapshot_reads_configuration_every_call(self):
+        first = fabricar_formulario("A00.0", False)
+        Protocolo.objects.filter(pk=self.protocolo.pk).update(
+            dados_condicionais={"fields": [{"name": "opt_peso", "label": "Peso", "type": "number"}]}
+        )
+        second = fabricar_formulario("A00.0", False)
+
+        self.assertIn("opt_edss", first.base_fields)
+        self.assertIn("opt_peso", second.base_fields)
+        self.assertEqual(form_classes._classes, {})
+
+    def test_prebuild_command(self):
+        out = StringIO()
+        call_command("prebuild_forms", verbosity=2, stdout=out)
+
+        self.assertIn("A00.0 (NovoProcesso): opt_edss", out.getvalue())
+        self.assertIn("Built 2 form classes for 1 diseases", out.getvalue())
+        with patch('processos.forms.form_factories.get_conditional_fields') as build:
+            fabricar_formulario("A00.0", True)
+        build.assert_not_called()
+
+
+class NovoProcessoPrototypeTest(TestCase):
+    clinicas = [("1", "Clínica 1")]
+    medicamentos = [("nenhum", "Escolha o medicamento..."), ("7", "Medicamento 7")]
+
+    def test_medication_fields_and_styling_built_with_class(self):
+        self.assertIn("qtd_med4_mes6", NovoProcesso.base_fields)
+        self.assertIn("med1_via", RenovarProcesso.base_fields)
+        self.assertEqual(NovoProcesso.base_fields["id_med1"].widget.attrs["class"], "custom-select form-control")
+
+        first = NovoProcesso(self.clinicas, self.medicamentos)
+        second = RenovarProcesso(self.clinicas, self.medicamentos)
+
+        self.assertIsNot(first.helper, second.helper)
+        self.assertFalse(first.helper.form_tag)
+        self.assertEqual(second.fields["id_med1"].widget.attrs["class"], "custom-select form-control")
+        self.assertEqual(second.fields["edicao_completa"].widget.attrs["data-crispy-field"], "true")
+
+    def test_each_class_declares_its_own_medication_fields(self):
+        superform = type("SuperForm", (NovoProcesso,), {"opt_edss": forms.CharField()})
+
+        self.assertIsNot(NovoProcesso.base_fields["id_med1"], RenovarProcesso.base_fields["id_med1"])
+        self.assertIsNot(NovoProcesso.base_fields["id_med1"], superform.base_fields["id_med1"])
+        self.assertIs(NovoProcesso.base_fields, NovoProcesso.declared_fields)
+        # Medication fields come after the declared ones, as when they were added per instance
+        for form_class, last_declared in ((NovoProcesso, "exames"), (RenovarProcesso, "edicao_completa"),
+                                          (superform, "opt_edss")):
+            names = list(form_class.base_fields)
+            self.assertEqual(names[names.index("id_med1") - 1], last_declared)
+            self.assertEqual(names[-1], "med1_via")
+
+    def test_instances_do_not_share_fields(self):
+        form = NovoProcesso(self.clinicas, self.medicamentos, data={"id_med1": "7"})
+        form.fields["med1_posologia_mes1"].widget.attrs["readonly"] = "readonly"
+
+        self.assertNotIn("readonly", NovoProcesso.base_fields["med1_posologia_mes1"].widget.attrs)
+        self.assertEqual(list(NovoProcesso.base_fields["id_med1"].choices), [])
+        self.assertEqual(list(form.fields["id_med4"].choices), self.medicamentos)
+        self.assertIn('<option value="7">Medicamento 7</option>', str(form["id_med2"]))
+        form.is_valid()
+        self.assertEqual(form.cleaned_data["id_med1"], "7")
+
+    def test_bench_forms_command(self):
+        out = StringIO()
+        call_command("bench_forms", iterations=2, stdout=out)
+
+        self.assertIn('"NovoProcesso"', out.getvalue())
+        self.assertIn('"RenovarProcesso"', out.getvalue())
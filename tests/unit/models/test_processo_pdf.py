@@ -1,4 +1,4 @@
-from django.test import TestCase, TransactionTestCase, Client
+from django.test import TestCase, TransactionTestCase, Client, override_settings
 from django.core.management import call_command
 from django.urls import reverse
 from processos.models import Medicamento, Protocolo, Doenca, Processo
@@ -327,9 +327,35 @@ class PDFAccessControlTest(TestCase):
         url = reverse('processos-serve-pdf', args=[self.pdf1_filename])
         response = self.client.get(url)
         
-        # Verify content
+        # Verify content (streamed from disk)
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.content, b'%PDF-1.4 fake pdf content for patient 1')
+        self.assertTrue(response.streaming)
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF-1.4 fake pdf content for patient 1')
+        self.assertEqual(response['Content-Length'], str(os.path.getsize(self.pdf1_path)))
+        
+    @override_settings(PDF_ACCEL_REDIRECT_PREFIX='/protected-pdf/')
+    def test_delivery_handed_to_nginx(self):
+        """Test that authorized downloads are delegated to nginx via X-Accel-Redirect."""
+        self.client.login(email="doctor1@example.com", password="testpass123")
+        
+        url = reverse('processos-serve-pdf', args=[self.pdf1_filename])
+        response = self.client.get(url)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-pdf/{self.pdf1_filename}')
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['Content-Disposition'], f'inline; filename="{self.pdf1_filename}"')
+        
+    @override_settings(PDF_ACCEL_REDIRECT_PREFIX='/protected-pdf/')
+    def test_unauthorized_user_not_redirected_to_nginx(self):
+        """Test that unauthorized users never receive an internal redirect."""
+        self.client.login(email="doctor2@example.com", password="testpass123")
+        
+        url = reverse('processos-serve-pdf', args=[self.pdf1_filename])
+        response = self.client.get(url)
+        
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.has_header('X-Accel-Redirect'))
         
     def test_security_headers_present(self):
         """Test that proper security headers are set."""
@@ -873,7 +899,7 @@ class PDFServingIntegrationTest(TestCase):
             response['Content-Disposition'],
             'inline; filename="pdf_final_987.654.321-00_H30.pdf"'
         )
-        self.assertEqual(response.content, b'%PDF-1.4 test PDF content for integration test')
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF-1.4 test PDF content for integration test')
         
     def test_pdf_generation_to_serving_complete_flow(self):
         """Test complete flow from generation to serving."""
@@ -0,0 +1,234 @@
+"""
+Batch Renewal Testing Module
+
+Tests renewing several processes with the same date into one merged PDF:
+- Bulk-loaded renewal data matches the single renewal path
+- Query count does not grow with the number of processes
+- Processes that are missing or owned by another user are reported per item
+- The batch generation is logged once per process
+- The batch endpoint saves the merged PDF and returns its link with per-item results
+"""
+
+import io
+import os
+import shutil
+import tempfile
+from datetime import date
+from unittest.mock import Mock, patch
+
+from django.conf import settings
+from django.db import connection
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from pypdf import PdfReader
+
+from analytics.models import PDFGenerationLog
+from clinicas.models import Clinica, Emissor
+from medicos.models import Medico
+from pacientes.models import Paciente, PacienteUsuarioVersion, PacienteVersion
+from processos.forms import RenovacaoLoteForm
+from processos.models import Doenca, Medicamento, Processo, Protocolo
+from processos.services.prescription.pdf_generation import PrescriptionPDFService
+from processos.services.prescription.renewal_service import RenewalService
+from usuarios.models import Usuario
+
+
+SADT_TEMPLATE = os.path.join(settings.BASE_DIR, "static", "autocusto", "processos", "sadt.pdf")
+RENEWAL_DATE = date(2025, 3, 1)
+PATIENT_FIELDS = {
+    'idade': '35', 'sexo': 'F', 'nome_mae': 'Mãe', 'incapaz': False, 'nome_responsavel': '',
+    'rg': '987654321', 'peso': '60', 'altura': '1,65', 'escolha_etnia': 'BRANCO',
+    'cns_paciente': '123456789012345', 'email_paciente': 'paciente@example.com',
+    'cidade_paciente': 'São Paulo', 'end_paciente': 'Rua A, 1', 'cep_paciente': '01310-100',
+    'telefone1_paciente': '11987654321', 'telefone2_paciente': '', 'etnia': 'BRANCO',
+}
+
+
+class BatchRenewalFixture:
+    """Processes of one user for patients with assigned versions."""
+
+    def create_fixture(self):
+        self.user = Usuario.objects.create_user(email="lote@example.com", password="testpass123", is_medico=True)
+        self.medico = Medico.objects.create(nome_medico="Dr. Lote", crm_medico="123456", cns_medico="123456789012345")
+        self.clinica = Clinica.objects.create(
+            nome_clinica="Clinica Lote", cns_clinica="7654321", logradouro="Rua das Flores",
+            logradouro_num="123", cidade="São Paulo", bairro="Centro", cep="01310-100",
+            telefone_clinica="(11) 99999-9999",
+        )
+        self.emissor = Emissor.objects.create(medico=self.medico, clinica=self.clinica)
+        protocolo = Protocolo.objects.create(nome="Protocolo Lote", arquivo="lote.pdf")
+        self.doenca = Doenca.objects.create(cid="G35", nome="Esclerose Múltipla", protocolo=protocolo)
+        self.medicamento = Medicamento.objects.create(nome="Fingolimode", dosagem="0,5mg", apres="cápsula")
+        self.processos = [
+            self.create_processo(cpf, f"Paciente {index}")
+            for index, cpf in enumerate(("11144477735", "22255588846", "33366699957"))
+        ]
+
+    def create_processo(self, cpf, nome):
+        paciente = Paciente.objects.create(nome_paciente=nome, cpf_paciente=cpf, **PATIENT_FIELDS)
+        paciente.usuarios.add(self.user)
+        version = PacienteVersion.objects.create(
+            paciente=paciente, version_number=1, created_by=self.user,
+            nome_paciente=f"{nome} (versão)", **PATIENT_FIELDS,
+        )
+        PacienteUsuarioVersion.objects.create(
+            paciente_usuario=paciente.usuarios.through.objects.get(paciente=paciente, usuario=self.user),
+            version=version,
+        )
+        return Processo.objects.create(
+            anamnese="Anamnese", doenca=self.doenca, tratou=False, tratamentos_previos="",
+            preenchido_por="P", dados_condicionais={"edss": "2"}, paciente=paciente,
+            medico=self.medico, clinica=self.clinica, emissor=self.emissor, usuario=self.user,
+            prescricao={"1": {"id_med1": str(self.medicamento.id), "med1_posologia_mes1": "1x ao dia"}},
+        )
+
+
+class TestRenewalServiceBatch(BatchRenewalFixture, TestCase):
+
+    def setUp(self):
+        self.create_fixture()
+        self.service = RenewalService()
+        self.service.pdf_service.generate_batch_pdf = Mock(
+            side_effect=lambda renewals, user=None, processo_ids=None: (b'%PDF-1.7', [None] * len(renewals))
+        )
+
+    def test_batch_data_matches_single_renewal(self):
+        ids = [processo.id for processo in self.processos]
+
+        pdf_bytes, results = self.service.process_batch_renewal(RENEWAL_DATE, ids, self.user)
+
+        renewals = self.service.pdf_service.generate_batch_pdf.call_args.args[0]
+        for processo, batch_data in zip(self.processos, renewals):
+            self.assertEqual(batch_data, self.service.generate_renewal_data(RENEWAL_DATE, processo.id, self.user))
+        self.assertEqual(renewals[0]['nome_paciente'], "Paciente 0 (versão)")
+        self.assertEqual(renewals[0]['med1'], "Fingolimode 0,5mg (cápsula)")
+        self.assertEqual(pdf_bytes, b'%PDF-1.7')
+        self.assertTrue(all(result['success'] for result in results))
+
+    def test_query_count_independent_of_batch_size(self):
+        with CaptureQueriesContext(connection) as single:
+            self.service.process_batch_renewal(RENEWAL_DATE, [self.processos[0].id], self.user)
+        with CaptureQueriesContext(connection) as batch:
+            self.service.process_batch_renewal(RENEWAL_DATE, [processo.id for processo in self.processos], self.user)
+
+        self.assertEqual(len(single), len(batch))
+
+    def test_missing_and_foreign_processes_are_reported(self):
+        other = Usuario.objects.create_user(email="outro@example.com", password="testpass123", is_medico=True)
+
+        _, results = self.service.process_batch_renewal(RENEWAL_DATE, [self.processos[0].id, 999999], other)
+
+        self.assertEqual(
+            results,
+            [
+                {'processo_id': self.processos[0].id, 'success': False, 'error': 'Processo não encontrado'},
+                {'processo_id': 999999, 'success': False, 'error': 'Processo não encontrado'},
+            ],
+        )
+
+    def test_generation_errors_are_reported_per_item(self):
+        self.service.pdf_service.generate_batch_pdf = Mock(return_value=(b'%PDF-1.7', [None, "Falha ao gerar PDF"]))
+
+        _, results = self.service.process_batch_renewal(
+            RENEWAL_DATE, [self.processos[0].id, 999999, self.processos[1].id], self.user
+        )
+
+        self.assertEqual([result['success'] for result in results], [True, False, False])
+        self.assertEqual(results[2]['error'], "Falha ao gerar PDF")
+
+
+class TestPrescriptionPDFServiceBatch(BatchRenewalFixture, TestCase):
+
+    def test_documents_are_merged_with_per_item_errors(self):
+        service = PrescriptionPDFService()
+        service._get_medical_protocol = Mock(return_value=Mock(nome='Esclerose Múltipla'))
+        service.template_selector.select_prescription_templates = Mock(return_value=[SADT_TEMPLATE])
+        prescriptions = [
+            {'cpf_paciente': '11144477735', 'cid': 'G35', 'data_1': RENEWAL_DATE, 'nome_paciente': 'Maria'},
+            {'cpf_paciente': '22255588846', 'cid': 'G35', 'data_1': None},
+            {'cpf_paciente': '33366699957', 'cid': 'G35', 'data_1': RENEWAL_DATE, 'nome_paciente': 'João'},
+        ]
+
+        pdf_bytes, errors = service.generate_batch_pdf(prescriptions)
+
+        self.assertEqual(errors, [None, "Dados obrigatórios ausentes", None])
+        single_pages = len(PdfReader(SADT_TEMPLATE).pages)
+        self.assertEqual(len(PdfReader(io.BytesIO(pdf_bytes)).pages), 2 * single_pages)
+        service._get_medical_protocol.assert_called_once()
+
+    def test_generation_logged_once_per_processo(self):
+        self.create_fixture()
+        service = PrescriptionPDFService()
+        service._get_medical_protocol = Mock(return_value=Mock(nome='Esclerose Múltipla'))
+        service.template_selector.select_prescription_templates = Mock(return_value=[SADT_TEMPLATE])
+        prescriptions = [
+            {'cpf_paciente': '11144477735', 'cid': 'G35', 'data_1': RENEWAL_DATE, 'nome_paciente': 'Maria'},
+            {'cpf_paciente': '22255588846', 'cid': 'G35', 'data_1': None},
+        ]
+        processo_ids = [processo.id for processo in self.processos[:2]]
+
+        service.generate_batch_pdf(prescriptions, user=self.user, processo_ids=processo_ids)
+
+        logs = {log.processo_id: log for log in PDFGenerationLog.objects.all()}
+        self.assertEqual(set(logs), set(processo_ids))
+        self.assertTrue(logs[processo_ids[0]].success)
+        self.assertEqual(logs[processo_ids[0]].paciente_id, self.processos[0].paciente_id)
+        self.assertFalse(logs[processo_ids[1]].success)
+        self.assertEqual(logs[processo_ids[1]].error_message, "Dados obrigatórios ausentes")
+        self.assertTrue(any(span['stage'] == 'template_selection' for span in logs[processo_ids[0]].stage_timings))
+
+
+class TestBatchRenewalView(BatchRenewalFixture, TestCase):
+
+    def setUp(self):
+        self.create_fixture()
+        self.url = reverse('processos-renovacao-lote')
+        self.client.force_login(self.user)
+        self.output_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir, ignore_errors=True)
+
+    def test_merged_pdf_saved_and_linked_with_results(self):
+        results = [{'processo_id': self.processos[0].id, 'success': True, 'error': ''}]
+        with override_settings(PDF_OUTPUT_DIR=self.output_dir), \
+                patch('processos.views.renewal_views.RenewalService.process_batch_renewal',
+                      return_value=(b'%PDF-1.7', results)) as process:
+            data = self.client.post(self.url, {'processo_ids': [self.processos[0].id], 'data_1': '01/03/2025'}).json()
+            pdf = self.client.get(data['pdf_url'])
+
+        self.assertTrue(data['success'])
+        self.assertEqual(data['results'], results)
+        self.assertEqual(b''.join(pdf.streaming_content) if pdf.streaming else pdf.content, b'%PDF-1.7')
+        self.assertEqual(process.call_args.args, (RENEWAL_DATE, [self.processos[0].id], self.user))
+
+    def test_failed_batch_returns_results_as_json(self):
+        results = [{'processo_id': 999999, 'success': False, 'error': 'Processo não encontrado'}]
+        with patch('processos.views.renewal_views.RenewalService.process_batch_renewal', return_value=(None, results)):
+            data = self.client.post(self.url, {'processo_ids': '999999', 'data_1': '01/03/2025'}).json()
+
+        self.assertFalse(data['success'])
+        self.assertEqual(data['results'], results)
+
+    def test_get_not_allowed(self):
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+
+
+class TestRenovacaoLoteForm(TestCase):
+
+    def test_repeated_and_comma_separated_ids(self):
+        data = QueryDict('processo_ids=3&processo_ids=1,3&data_1=01/03/2025')
+
+        form = RenovacaoLoteForm(data)
+
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data['processo_ids'], [3, 1])
+
+    @override_settings(PDF_BATCH_RENEWAL_MAX=2)
+    def test_batch_limit(self):
+        form = RenovacaoLoteForm({'processo_ids': '1,2,3', 'data_1': '01/03/2025'})
+
+        self.assertFalse(form.is_valid())
+        self.assertIn('processo_ids', form.errors)
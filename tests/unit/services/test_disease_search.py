@@ -0,0 +1,134 @@
+"""
+Disease Search Testing Module
+
+Tests the disease autocomplete index:
+- Accent- and case-insensitive matching with the former icontains semantics
+- Ranking (exact CID, CID prefix, name prefix, word prefix, substring) and limit
+- busca_doencas returns the ranked list with browser cache headers
+- The index follows the reference data snapshot; without it searches query the database
+"""
+
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from processos.models import Doenca
+from processos.services.disease_search import DiseaseIndex, disease_search, fold
+from processos.services.reference_data import GenerationCounter, reference_data
+
+
+DISEASES = [
+    ("G35", "Esclerose Múltipla"),
+    ("G12.2", "Doença do neurônio motor"),
+    ("M32.1", "Lúpus eritematoso disseminado com comprometimento de outros órgãos"),
+    ("G30.0", "Doença de Alzheimer de início precoce"),
+    ("G30.1", "Doença de Alzheimer de início tardio"),
+    ("E84.0", "Fibrose cística com manifestações pulmonares"),
+]
+
+
+class TestDiseaseIndex(TestCase):
+
+    def setUp(self):
+        self.index = DiseaseIndex(DISEASES)
+
+    def cids(self, query, limit=20):
+        return [cid for cid, _ in self.index.search(query, limit)]
+
+    def test_fold_removes_accents_case_and_extra_spaces(self):
+        self.assertEqual(fold("  Lúpus   ERITEMATOSO "), "lupus eritematoso")
+
+    def test_accent_insensitive_matching(self):
+        self.assertEqual(self.cids("esclerose multipla"), ["G35"])
+        self.assertEqual(self.cids("ÓRGÃOS"), ["M32.1"])
+        self.assertEqual(self.cids("cistica"), ["E84.0"])
+
+    def test_ranking_and_limit(self):
+        self.assertEqual(self.cids("g30.1"), ["G30.1"])
+        # Name prefix before word prefix, ties in CID order
+        self.assertEqual(self.cids("doenca"), ["G12.2", "G30.0", "G30.1"])
+        self.assertEqual(self.cids("alz", limit=1), ["G30.0"])
+        # CID prefixes before matches inside names
+        self.assertEqual(self.cids("g3")[:3], ["G30.0", "G30.1", "G35"])
+
+    def test_substring_matches_kept(self):
+        self.assertEqual(self.cids("ltipla"), ["G35"])
+        self.assertEqual(self.cids("2.2"), ["G12.2"])
+        self.assertEqual(self.cids("xyz"), [])
+        self.assertEqual(self.cids("   "), [])
+
+    def test_short_queries_scan_every_entry(self):
+        self.assertEqual(self.cids("lú"), ["M32.1"])
+        self.assertEqual(self.cids("ul"), ["E84.0", "G35"])
+
+
+class TestBuscaDoencas(TestCase):
+
+    def setUp(self):
+        for cid, nome in DISEASES:
+            Doenca.objects.create(cid=cid, nome=nome)
+
+    def test_ranked_json_with_cache_headers(self):
+        response = self.client.get(reverse('busca-doencas'), {'palavraChave': 'alzheimer'})
+
+        self.assertEqual(response.json(), [
+            {"cid": "G30.0", "nome": "Doença de Alzheimer de início precoce"},
+            {"cid": "G30.1", "nome": "Doença de Alzheimer de início tardio"},
+        ])
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('max-age=300', response['Cache-Control'])
+
+        repeated = self.client.get(reverse('busca-doencas'), {'palavraChave': 'alzheimer'},
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(repeated.status_code, 304)
+
+    @override_settings(DISEASE_SEARCH_LIMIT=2)
+    def test_results_limited(self):
+        response = self.client.get(reverse('busca-doencas'), {'palavraChave': 'g'})
+
+        self.assertEqual(len(response.json()), 2)
+
+    @override_settings(REFERENCE_DATA_CACHE_ENABLED=False)
+    def test_without_snapshot_queries_database(self):
+        with patch('processos.services.disease_search.DiseaseIndex') as index, self.assertNumQueries(1):
+            results = disease_search.search("Doença", 2)
+
+        index.assert_not_called()
+        self.assertEqual(results, [
+            ("G12.2", "Doença do neurônio motor"),
+            ("G30.0", "Doença de Alzheimer de início precoce"),
+        ])
+
+
+@override_settings(REFERENCE_DATA_CACHE_ENABLED=True, REFERENCE_DATA_CHECK_SECONDS=60)
+class TestDiseaseSearchSnapshot(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        for patcher in (
+            patch.object(reference_data, '_counter', GenerationCounter(os.path.join(self.directory, 'generation'))),
+            patch.object(reference_data, '_snapshot', None),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        Doenca.objects.create(cid="G35", nome="Esclerose Múltipla")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_index_built_once_per_snapshot(self):
+        index = disease_search.index()
+
+        with self.assertNumQueries(0):
+            self.assertIs(disease_search.index(), index)
+            self.assertEqual(disease_search.search("multipla", 20), [("G35", "Esclerose Múltipla")])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Doenca.objects.create(cid="G36", nome="Outras desmielinizações disseminadas agudas")
+
+        self.assertIsNot(disease_search.index(), index)
+        self.assertEqual(disease_search.search("desmielinizacoes", 20)[0][0], "G36")
@@ -0,0 +1,169 @@
+"""
+PDF Pipeline Benchmark Testing Module
+
+Runs the bench_pdf benchmark on a configured protocol:
+- Synthetic payloads are reproducible, one per configured medication
+- Every stage is timed and reported as p50/p95/p99
+- Thread and process concurrency, buffered and streamed output
+- The command emits the results as JSON (stdout and --output)
+
+TestPDFBenchmarkRun is the actual benchmark. It is tagged 'benchmark' and
+skipped unless RUN_PDF_BENCHMARKS is set:
+
+    RUN_PDF_BENCHMARKS=1 python manage.py test tests.unit.services.test_pdf_benchmark --tag benchmark
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings, tag
+
+from processos.models import Doenca, Protocolo
+from processos.services.pdf_benchmark import STAGES, PDFBenchmark, build_payloads, percentile
+
+
+MS_CONFIG = {
+    'fields': [{'name': 'opt_edss', 'initial': '0'}],
+    'medications': {
+        'fingolimode': {'files': ['monitoramento_fingolimode_modelo.pdf']},
+        'natalizumabe': {'files': ['exames_nata_modelo.pdf']},
+    },
+}
+
+
+class BenchmarkFixture:
+
+    def create_protocol(self):
+        self.directory = tempfile.mkdtemp()
+        self.protocolo = Protocolo.objects.create(nome='esclerose_multipla', arquivo='esclerose.pdf', dados_condicionais=MS_CONFIG)
+        Doenca.objects.create(cid='G35', nome='Esclerose Múltipla', protocolo=self.protocolo)
+        # Protocols without dados_condicionais are not benchmarked
+        Doenca.objects.create(
+            cid='G30', nome='Doença de Alzheimer', protocolo=Protocolo.objects.create(nome='alzheimer', arquivo='a.pdf')
+        )
+
+
+class TestPDFBenchmark(BenchmarkFixture, TestCase):
+
+    def setUp(self):
+        self.create_protocol()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_payloads_are_reproducible(self):
+        payloads = build_payloads(self.protocolo, 'G35')
+
+        self.assertEqual([label for label, _ in payloads],
+                         ['esclerose_multipla/G35/fingolimode', 'esclerose_multipla/G35/natalizumabe'])
+        self.assertEqual(payloads, build_payloads(self.protocolo, 'G35'))
+        self.assertEqual(payloads[0][1]['opt_edss'], '0')
+
+    def test_percentile(self):
+        values = [float(value) for value in range(1, 101)]
+
+        self.assertEqual(percentile(values, 50), 50.0)
+        self.assertEqual(percentile(values, 99), 99.0)
+        self.assertEqual(percentile([], 95), 0.0)
+
+    def test_report_covers_every_stage(self):
+        with override_settings(PDF_OUTPUT_DIR=self.directory):
+            report = PDFBenchmark(iterations=2, concurrency=2, backend='pypdf').run()
+
+        self.assertEqual(report['cases'], ['esclerose_multipla/G35/fingolimode', 'esclerose_multipla/G35/natalizumabe'])
+        self.assertEqual(report['documents'], 4)
+        self.assertEqual(report['failed'], 0)
+        for stage in ('format', 'select', 'fill', 'concat', 'save'):
+            self.assertEqual(report['stages'][stage]['count'], 4, stage)
+            self.assertLessEqual(report['stages'][stage]['p50'], report['stages'][stage]['p99'])
+        self.assertGreater(report['throughput_per_second'], 0)
+        self.assertGreater(report['peak_rss_bytes'], 0)
+        self.assertGreater(report['output_bytes'], 0)
+        self.assertEqual(sum(report['fill_sources'].values()), 4 * report['templates_per_document'])
+        # Benchmark output is removed afterwards
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_process_mode(self):
+        with override_settings(PDF_OUTPUT_DIR=self.directory):
+            report = PDFBenchmark(iterations=2, concurrency=2, backend='pypdf', warmup=0, mode='process').run()
+
+        self.assertEqual(report['mode'], 'process')
+        self.assertEqual(report['documents'], 4)
+        self.assertEqual(report['failed'], 0)
+        self.assertEqual(report['stages']['fill']['count'], 4)
+
+    def test_streamed_output(self):
+        with override_settings(PDF_OUTPUT_DIR=self.directory, PDF_STREAMING_OUTPUT=True):
+            report = PDFBenchmark(iterations=1, backend='pypdf', warmup=0).run()
+
+        self.assertTrue(report['streaming'])
+        self.assertEqual(report['documents'], 2)
+        self.assertEqual(report['stages']['fill']['count'], 2)
+        self.assertEqual(report['stages']['save']['count'], 2)
+        self.assertGreater(report['output_bytes'], 0)
+
+    def test_unknown_mode_rejected(self):
+        with self.assertRaises(ValueError):
+            PDFBenchmark(mode='greenlet')
+
+
+@tag('benchmark')
+@unittest.skipUnless(os.environ.get('RUN_PDF_BENCHMARKS'), 'set RUN_PDF_BENCHMARKS=1 to run the PDF benchmarks')
+class TestPDFBenchmarkRun(BenchmarkFixture, TestCase):
+    """Full runs in each concurrency mode; the reports are printed for comparison."""
+
+    def setUp(self):
+        self.create_protocol()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_benchmark(self):
+        concurrency = os.cpu_count() or 2
+        for mode in ('thread', 'process'):
+            with self.subTest(mode=mode), override_settings(PDF_OUTPUT_DIR=self.directory):
+                report = PDFBenchmark(iterations=20, concurrency=concurrency, warmup=2, mode=mode).run()
+                print(json.dumps({key: report[key] for key in (
+                    'mode', 'concurrency', 'documents', 'throughput_per_second', 'stages', 'total'
+                )}, indent=2))
+
+                self.assertEqual(report['failed'], 0)
+                self.assertEqual(report['documents'], 20 * len(report['cases']))
+
+
+class TestBenchPdfCommand(BenchmarkFixture, TestCase):
+
+    def setUp(self):
+        self.create_protocol()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_results_emitted_as_json(self):
+        output_path = os.path.join(self.directory, 'results.json')
+        stdout = StringIO()
+        with override_settings(PDF_OUTPUT_DIR=self.directory):
+            call_command('bench_pdf', iterations=1, warmup=0, cids=['G35'], output=output_path, stdout=stdout)
+
+        results = json.loads(stdout.getvalue())
+        with open(output_path) as f:
+            self.assertEqual(json.load(f), results)
+        self.assertEqual(results['documents'], 2)
+        self.assertEqual(sorted(results['stages']), sorted(STAGES))
+
+    def test_process_mode_option(self):
+        stdout = StringIO()
+        with override_settings(PDF_OUTPUT_DIR=self.directory):
+            call_command('bench_pdf', iterations=1, warmup=0, concurrency=2, mode='process', stdout=stdout)
+
+        self.assertEqual(json.loads(stdout.getvalue())['mode'], 'process')
+
+    def test_nothing_to_benchmark(self):
+        with self.assertRaises(CommandError):
+            call_command('bench_pdf', cids=['G30'], stdout=StringIO())
@@ -0,0 +1,139 @@
+"""
+Generated PDF Cache Testing Module
+
+Tests the content-addressed cache in front of prescription PDF generation:
+- Keys change with the form data and the template contents
+- SharedLRUFileCache evicts the least recently used entries first
+- PrescriptionPDFService serves identical regenerations from the cache
+"""
+
+import os
+import shutil
+import tempfile
+import time
+from unittest.mock import Mock, patch
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+
+from processos.services.pdf_cache import PDFResultCache, SharedLRUFileCache
+from processos.services.prescription.pdf_generation import PrescriptionPDFService
+
+
+SADT_TEMPLATE = os.path.join(settings.BASE_DIR, "static", "autocusto", "processos", "sadt.pdf")
+
+
+def file_cache_settings(location, max_entries=100):
+    return {
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'pdf_cache': {
+            'BACKEND': 'processos.services.pdf_cache.SharedLRUFileCache',
+            'LOCATION': location,
+            'TIMEOUT': 300,
+            'OPTIONS': {'MAX_ENTRIES': max_entries, 'CULL_FREQUENCY': 4},
+        },
+    }
+
+
+class TestSharedLRUFileCache(TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = SharedLRUFileCache(self.cache_dir, {'OPTIONS': {'MAX_ENTRIES': 4, 'CULL_FREQUENCY': 4}})
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        for index in range(4):
+            self.cache.set(f"key{index}", b"pdf")
+            os.utime(self.cache._key_to_file(f"key{index}"), ns=(0, index * 1_000_000_000))
+        self.cache.get("key0")  # key0 becomes the most recently used
+
+        self.cache.set("key4", b"pdf")
+
+        self.assertIsNone(self.cache.get("key1"))
+        for key in ("key0", "key2", "key3", "key4"):
+            self.assertEqual(self.cache.get(key), b"pdf")
+
+    def test_expired_entry_is_not_returned(self):
+        self.cache.set("key", b"pdf", timeout=1)
+        with patch('django.core.cache.backends.filebased.time.time', return_value=time.time() + 5):
+            self.assertIsNone(self.cache.get("key"))
+
+
+class TestPDFResultCacheKey(TestCase):
+
+    def setUp(self):
+        self.result_cache = PDFResultCache()
+
+    def test_key_ignores_dict_order_and_value_types(self):
+        first = self.result_cache.build_key([SADT_TEMPLATE], {'nome_paciente': 'Maria', 'idade': 40, 'obs': None})
+        second = self.result_cache.build_key([SADT_TEMPLATE], {'obs': '', 'idade': '40', 'nome_paciente': 'Maria'})
+
+        self.assertEqual(first, second)
+
+    def test_key_changes_with_data_and_templates(self):
+        base = self.result_cache.build_key([SADT_TEMPLATE], {'nome_paciente': 'Maria'})
+
+        self.assertNotEqual(base, self.result_cache.build_key([SADT_TEMPLATE], {'nome_paciente': 'Mario'}))
+        self.assertNotEqual(base, self.result_cache.build_key([SADT_TEMPLATE, SADT_TEMPLATE], {'nome_paciente': 'Maria'}))
+
+    def test_key_changes_with_output_settings(self):
+        base = self.result_cache.build_key([SADT_TEMPLATE], {'nome_paciente': 'Maria'})
+
+        for name in ('PDF_LINEARIZE', 'PDF_OBJECT_STREAMS', 'PDF_DEDUPLICATE_RESOURCES', 'PDF_STREAMING_OUTPUT'):
+            with self.subTest(setting=name), override_settings(**{name: not getattr(settings, name)}):
+                self.assertNotEqual(base, self.result_cache.build_key([SADT_TEMPLATE], {'nome_paciente': 'Maria'}))
+
+    def test_key_changes_with_template_contents(self):
+        work_dir = tempfile.mkdtemp()
+        try:
+            template_path = os.path.join(work_dir, "sadt.pdf")
+            shutil.copy(SADT_TEMPLATE, template_path)
+            before = self.result_cache.build_key([template_path], {'nome_paciente': 'Maria'})
+            with open(template_path, 'ab') as f:
+                f.write(b"\n% revised\n")
+
+            self.assertNotEqual(before, self.result_cache.build_key([template_path], {'nome_paciente': 'Maria'}))
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def test_missing_template_is_not_cacheable(self):
+        self.assertIsNone(self.result_cache.build_key(['/nonexistent/template.pdf'], {}))
+
+
+class TestPrescriptionPDFServiceCache(TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.prescription_data = {'cpf_paciente': '11144477735', 'cid': 'G35', 'data_1': '01/01/2025', 'nome_paciente': 'Maria'}
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def _service(self):
+        service = PrescriptionPDFService()
+        service._get_medical_protocol = Mock(return_value=Mock(nome='Esclerose Múltipla'))
+        service.template_selector.select_prescription_templates = Mock(return_value=[SADT_TEMPLATE])
+        service.pdf_generator.fill_and_concatenate = Mock(return_value=b'%PDF-1.7 cached')
+        return service
+
+    def test_identical_regeneration_served_from_cache(self):
+        with override_settings(CACHES=file_cache_settings(self.cache_dir)):
+            first = self._service()
+            first.generate_prescription_pdf(dict(self.prescription_data))
+            second = self._service()
+            response = second.generate_prescription_pdf(dict(self.prescription_data))
+
+        first.pdf_generator.fill_and_concatenate.assert_called_once()
+        second.pdf_generator.fill_and_concatenate.assert_not_called()
+        self.assertEqual(response.content, b'%PDF-1.7 cached')
+
+    def test_cache_disabled_by_setting(self):
+        with override_settings(CACHES=file_cache_settings(self.cache_dir), PDF_RESULT_CACHE_ENABLED=False):
+            self._service().generate_prescription_pdf(dict(self.prescription_data))
+            service = self._service()
+            service.generate_prescription_pdf(dict(self.prescription_data))
+
+        service.pdf_generator.fill_and_concatenate.assert_called_once()
@@ -0,0 +1,134 @@
+"""
+PDF Delivery Testing Module
+
+Tests byte range and conditional responses for served PDFs:
+- Single and suffix byte ranges get 206 with Content-Range
+- Ranges outside the file get 416
+- Matching If-None-Match / If-Modified-Since get 304
+- If-Range with a stale validator sends the whole file
+- Protocol links carry a content hash
+"""
+
+import os
+import shutil
+import tempfile
+
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils.http import http_date
+
+from processos.models import Doenca, Protocolo
+from processos.services.pdf_delivery import PDFDelivery, content_etag
+from processos.utils.url_utils import generate_protocol_link
+
+
+CONTENT = b'%PDF-1.7 ' + bytes(range(256)) * 4
+
+
+@override_settings(PDF_ACCEL_REDIRECT_PREFIX='')
+class TestPDFDelivery(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'documento.pdf')
+        with open(self.path, 'wb') as f:
+            f.write(CONTENT)
+        self.factory = RequestFactory()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def deliver(self, **headers):
+        request = self.factory.get('/', headers=headers)
+        return PDFDelivery().build_response(request, self.path, 'documento.pdf')
+
+    def test_full_response_advertises_ranges_and_etag(self):
+        response, sent = self.deliver()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['ETag'], content_etag(self.path))
+        self.assertEqual(b''.join(response.streaming_content), CONTENT)
+        self.assertEqual(sent, len(CONTENT))
+
+    def test_byte_range(self):
+        response, sent = self.deliver(Range='bytes=10-19')
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(CONTENT)}')
+        self.assertEqual(b''.join(response.streaming_content), CONTENT[10:20])
+        self.assertEqual(sent, 10)
+
+    def test_open_and_suffix_ranges(self):
+        for header, expected in (('bytes=1000-', CONTENT[1000:]), ('bytes=-16', CONTENT[-16:])):
+            with self.subTest(header=header):
+                response, _ = self.deliver(Range=header)
+
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(b''.join(response.streaming_content), expected)
+
+    def test_unsatisfiable_range(self):
+        response, sent = self.deliver(Range=f'bytes={len(CONTENT)}-')
+
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(CONTENT)}')
+        self.assertEqual(sent, 0)
+
+    def test_matching_etag_is_not_modified(self):
+        response, sent = self.deliver(If_None_Match=content_etag(self.path))
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(sent, 0)
+
+    def test_if_modified_since_is_not_modified(self):
+        response, _ = self.deliver(If_Modified_Since=http_date(os.stat(self.path).st_mtime))
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_changed_content_gets_new_etag(self):
+        etag = content_etag(self.path)
+        with open(self.path, 'ab') as f:
+            f.write(b'%%EOF')
+
+        response, _ = self.deliver(If_None_Match=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_stale_if_range_sends_whole_file(self):
+        response, _ = self.deliver(Range='bytes=0-9', If_Range='"stale"')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), CONTENT)
+
+    @override_settings(PDF_ACCEL_REDIRECT_PREFIX='/protected-pdf/')
+    def test_accel_redirect_leaves_ranges_to_nginx(self):
+        response, _ = self.deliver(Range='bytes=0-9')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-pdf/documento.pdf')
+
+
+class TestProtocolLink(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        with open(os.path.join(self.directory, 'ame.pdf'), 'wb') as f:
+            f.write(CONTENT)
+        Doenca.objects.create(cid="G12.0", nome="AME", protocolo=Protocolo.objects.create(nome="AME", arquivo="ame.pdf"))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_link_versioned_by_content_hash(self):
+        with override_settings(PATH_PDF_DIR=self.directory):
+            link = generate_protocol_link("G12.0")
+
+        version = content_etag(os.path.join(self.directory, 'ame.pdf')).strip('"')[:12]
+        self.assertTrue(link.endswith(f"protocolos/ame.pdf?v={version}"))
+
+    def test_missing_file_keeps_plain_link(self):
+        with override_settings(PATH_PDF_DIR=self.directory):
+            os.remove(os.path.join(self.directory, 'ame.pdf'))
+            link = generate_protocol_link("G12.0")
+
+        self.assertTrue(link.endswith("protocolos/ame.pdf"))
@@ -0,0 +1,342 @@
+"""
+PDF Engines Testing Module
+
+Tests the interchangeable fill backends used by PDFGenerator:
+- PypdfBackend fills and flattens templates in-process (no pdftk subprocess)
+- PdftkBackend stays available as a fallback, with hung pdftk runs killed
+- get_pdf_backend() honours settings.PDF_FILL_BACKEND
+- Merged documents store resources shared by templates once
+- The parallel fill pool kills hung fills and reclaims global slots
+"""
+
+import io
+import os
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from unittest.mock import patch
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+from pypdf import PdfReader
+
+from processos.services.pdf_engines import PdftkBackend, PdftkTimeoutError, PypdfBackend, get_pdf_backend
+from processos.services.pdf_operations import PDFGenerator
+from processos.services.pdf_pool import FillSlotLedger, PDFFillPool
+
+
+SADT_TEMPLATE = os.path.join(settings.BASE_DIR, "static", "autocusto", "processos", "sadt.pdf")
+LME_TEMPLATE = os.path.join(settings.BASE_DIR, "static", "autocusto", "processos", "lme_base_modelo.pdf")
+
+# Stands in for pdftk; fill_form: <template> fill_form <xfdf> output <out> flatten, concat: <pdfs...> cat output <out>
+FAKE_PDFTK = f"""#!{sys.executable}
+import os, sys, time
+args = sys.argv[1:]
+if 'sleep' in args[0]:
+    time.sleep(60)
+if 'broken' in args[0]:
+    sys.stderr.write('Error: Unable to find file.')
+    sys.exit(1)
+out = args[args.index('output') + 1]
+with open(out, 'w') as f:
+    f.write(' '.join(args[:args.index('output')]) + ' ' + os.environ.get('JAVA_TOOL_OPTIONS', ''))
+"""
+
+
+def hang_on_sleep_template(backend_name, template_path, form_data):
+    """Pool task standing in for a fill that never finishes."""
+    if template_path == 'sleep.pdf':
+        time.sleep(60)
+    return b'%PDF-filled'
+
+
+class TestBackendSelection(TestCase):
+    """Backend selection through settings and explicit names."""
+
+    @override_settings(PDF_FILL_BACKEND='pypdf')
+    def test_default_backend_from_settings(self):
+        self.assertIsInstance(get_pdf_backend(), PypdfBackend)
+
+    @override_settings(PDF_FILL_BACKEND='pdftk')
+    def test_pdftk_backend_from_settings(self):
+        self.assertIsInstance(get_pdf_backend(), PdftkBackend)
+
+    def test_unknown_backend_falls_back_to_pdftk(self):
+        self.assertIsInstance(get_pdf_backend('does-not-exist'), PdftkBackend)
+
+    def test_generator_accepts_explicit_backend(self):
+        backend = PdftkBackend()
+        self.assertIs(PDFGenerator(backend=backend).backend, backend)
+
+
+class TestPypdfBackend(TestCase):
+    """In-process fill and flatten of real templates."""
+
+    def setUp(self):
+        self.backend = PypdfBackend()
+        self.output_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        for name in os.listdir(self.output_dir):
+            os.remove(os.path.join(self.output_dir, name))
+        os.rmdir(self.output_dir)
+
+    def test_fill_flattens_text_fields(self):
+        """Filled values end up in the page content and the AcroForm is gone."""
+        output_path = os.path.join(self.output_dir, "sadt.pdf")
+        result = self.backend.fill_form(
+            SADT_TEMPLATE,
+            {'nome_paciente': 'José da Conceição', 'cid': 'G35', 'campo_inexistente': 'x'},
+            output_path,
+        )
+
+        self.assertEqual(result, output_path)
+        reader = PdfReader(output_path)
+        self.assertNotIn('/AcroForm', reader.trailer['/Root'])
+        self.assertFalse(reader.get_fields())
+        text = reader.pages[0].extract_text()
+        self.assertIn('José da Conceição', text)
+        self.assertIn('G35', text)
+
+    def test_fill_selects_radio_state(self):
+        """Radio groups switch to the export state named by the value."""
+        writer = self.backend.fill_to_writer(PdfReader(LME_TEMPLATE), {'etnia': 'etnia_parda'})
+        self.assertNotIn('/AcroForm', writer._root_object)
+        for page in writer.pages:
+            self.assertFalse(
+                [a for a in page.get('/Annots', []) if a.get_object().get('/Subtype') == '/Widget']
+            )
+
+    def test_concat_keeps_all_pages(self):
+        first = os.path.join(self.output_dir, "a.pdf")
+        second = os.path.join(self.output_dir, "b.pdf")
+        merged = os.path.join(self.output_dir, "merged.pdf")
+        self.backend.fill_form(SADT_TEMPLATE, {'nome_paciente': 'A'}, first)
+        self.backend.fill_form(SADT_TEMPLATE, {'nome_paciente': 'B'}, second)
+
+        self.backend.concat([first, second], merged)
+
+        self.assertEqual(len(PdfReader(merged).pages), 2)
+
+
+class TestGeneratorFallback(TestCase):
+    """PDFGenerator retries with pdftk when the in-process engine fails."""
+
+    def test_fill_falls_back_to_pdftk(self):
+        generator = PDFGenerator(backend=PypdfBackend())
+
+        with patch.object(PypdfBackend, 'fill_form', side_effect=ValueError("broken template")), \
+             patch.object(PdftkBackend, 'fill_form', return_value='/dev/shm/fallback.pdf') as pdftk_fill:
+            result = generator._run_backend('fill_form', SADT_TEMPLATE, {}, '/dev/shm/fallback.pdf')
+
+        self.assertEqual(result, '/dev/shm/fallback.pdf')
+        pdftk_fill.assert_called_once()
+
+    def test_in_memory_fill_falls_back_to_pdftk_file(self):
+        generator = PDFGenerator(backend=PypdfBackend())
+
+        with patch.object(PypdfBackend, 'fill_in_memory', side_effect=ValueError("broken template")), \
+             patch.object(PDFGenerator, '_fill_to_tmpfs', return_value='/dev/shm/fallback.pdf') as fill_to_tmpfs:
+            filled = generator._fill_pdf_forms([SADT_TEMPLATE], {})
+
+        self.assertEqual(filled, ['/dev/shm/fallback.pdf'])
+        self.assertIsInstance(fill_to_tmpfs.call_args.kwargs['backend'], PdftkBackend)
+
+    def test_end_to_end_generation_without_pdftk(self):
+        generator = PDFGenerator(backend=PypdfBackend())
+
+        pdf_bytes = generator.fill_and_concatenate([SADT_TEMPLATE, SADT_TEMPLATE], {'nome_paciente': 'Maria'})
+
+        self.assertIsNotNone(pdf_bytes)
+        self.assertTrue(pdf_bytes.startswith(b'%PDF'))
+        self.assertEqual(generator.temp_files, [])
+
+
+class TestInMemoryPipeline(TestCase):
+    """Fill + concatenate without intermediate tmpfs files."""
+
+    def test_pipeline_writes_no_intermediate_files(self):
+        generator = PDFGenerator(backend=PypdfBackend())
+
+        with patch.object(PDFGenerator, '_fill_to_tmpfs') as fill_to_tmpfs, \
+             patch('processos.services.pdf_engines.PdftkBackend.concat') as pdftk_concat:
+            pdf_bytes = generator.fill_and_concatenate([SADT_TEMPLATE, LME_TEMPLATE], {'nome_paciente': 'Maria'})
+
+        fill_to_tmpfs.assert_not_called()
+        pdftk_concat.assert_not_called()
+        reader = PdfReader(io.BytesIO(pdf_bytes))
+        self.assertEqual(len(reader.pages), 8)
+        self.assertIn('Maria', reader.pages[0].extract_text())
+        self.assertIn('Maria', reader.pages[1].extract_text())
+
+    def test_merge_accepts_mixed_documents(self):
+        backend = PypdfBackend()
+        with tempfile.NamedTemporaryFile(suffix='.pdf') as on_disk:
+            backend.fill_form(SADT_TEMPLATE, {'nome_paciente': 'Disco'}, on_disk.name)
+            in_memory = backend.fill_in_memory(SADT_TEMPLATE, {'nome_paciente': 'Memoria'})
+
+            pdf_bytes = backend.merge([in_memory, on_disk.name])
+
+        reader = PdfReader(io.BytesIO(pdf_bytes))
+        self.assertIn('Memoria', reader.pages[0].extract_text())
+        self.assertIn('Disco', reader.pages[1].extract_text())
+
+    def test_merge_stores_shared_resources_once(self):
+        backend = PypdfBackend()
+        templates = [SADT_TEMPLATE, LME_TEMPLATE, SADT_TEMPLATE]
+
+        with override_settings(PDF_DEDUPLICATE_RESOURCES=False):
+            duplicated = backend.merge([backend.fill_in_memory(path, {'nome_paciente': 'Maria'}) for path in templates])
+        deduplicated = backend.merge([backend.fill_in_memory(path, {'nome_paciente': 'Maria'}) for path in templates])
+
+        self.assertLess(len(deduplicated), len(duplicated) * 0.9)
+        reader = PdfReader(io.BytesIO(deduplicated))
+        self.assertEqual(len(reader.pages), len(PdfReader(io.BytesIO(duplicated)).pages))
+        self.assertIn('Maria', reader.pages[-1].extract_text())
+
+
+@override_settings(PDF_PDFTK_TIMEOUT=1, PDF_PDFTK_JAVA_OPTIONS='-Xshare:auto')
+class TestPdftkBackendRuns(TestCase):
+    """pdftk runs with a timeout that kills its process group."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        binary = os.path.join(self.directory, 'pdftk')
+        with open(binary, 'w') as f:
+            f.write(FAKE_PDFTK)
+        os.chmod(binary, os.stat(binary).st_mode | stat.S_IEXEC)
+        patcher = patch('processos.services.pdf_engines.pypdftk.PDFTK_PATH', binary)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def output(self, name):
+        return os.path.join(self.directory, name)
+
+    def test_fill_and_concat(self):
+        filled = PdftkBackend().fill_form('template.pdf', {'nome_paciente': 'Maria'}, self.output('filled.pdf'))
+        merged = PdftkBackend().concat(['a.pdf', 'b.pdf'], self.output('merged.pdf'))
+
+        with open(filled) as f:
+            self.assertIn('fill_form', f.read())
+        with open(merged) as f:
+            self.assertEqual(f.read(), 'a.pdf b.pdf cat -Xshare:auto')
+
+    def test_failed_run_raises(self):
+        with self.assertRaises(subprocess.CalledProcessError):
+            PdftkBackend().fill_form('broken.pdf', {}, self.output('out.pdf'))
+
+    def test_hung_pdftk_is_killed(self):
+        start = time.monotonic()
+        with self.assertRaises(PdftkTimeoutError):
+            PdftkBackend().fill_form('sleep.pdf', {}, self.output('hung.pdf'))
+
+        self.assertLess(time.monotonic() - start, 10)
+
+
+class TestParallelFill(TestCase):
+    """Opt-in parallel filling through the bounded process pool."""
+
+    def test_parallel_fill_preserves_template_order(self):
+        generator = PDFGenerator(backend=PypdfBackend(), parallel=True)
+
+        pdf_bytes = generator.fill_and_concatenate([LME_TEMPLATE, SADT_TEMPLATE], {'nome_paciente': 'Paralelo'})
+
+        reader = PdfReader(io.BytesIO(pdf_bytes))
+        self.assertEqual(len(reader.pages), 8)
+        self.assertIn('CID 10', reader.pages[7].extract_text())
+        self.assertIn('Paralelo', reader.pages[7].extract_text())
+
+    def test_pool_misses_are_filled_inline(self):
+        """Templates the pool could not take (global limit reached) are filled in-process."""
+        generator = PDFGenerator(backend=PypdfBackend(), parallel=True)
+
+        with patch('processos.services.pdf_operations.fill_pool.fill_many', return_value=[None, None]) as fill_many:
+            pdf_bytes = generator.fill_and_concatenate([SADT_TEMPLATE, SADT_TEMPLATE], {'nome_paciente': 'Inline'})
+
+        fill_many.assert_called_once()
+        self.assertEqual(len(PdfReader(io.BytesIO(pdf_bytes)).pages), 2)
+
+    def test_single_template_skips_pool(self):
+        generator = PDFGenerator(backend=PypdfBackend(), parallel=True)
+
+        with patch('processos.services.pdf_operations.fill_pool.fill_many') as fill_many:
+            generator.fill_and_concatenate([SADT_TEMPLATE], {'nome_paciente': 'Um'})
+
+        fill_many.assert_not_called()
+
+
+class TestFillPoolRecovery(TestCase):
+    """Hung fills and dead workers must not use up the pool or the global slots."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.slots_path = os.path.join(self.directory, 'slots.sqlite3')
+        patcher = patch('processos.services.pdf_pool.fill_template_to_bytes', hang_on_sleep_template)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.pool = PDFFillPool(size=2, global_limit=2, timeout=1, slots_path=self.slots_path)
+
+    def tearDown(self):
+        self.pool._reset_executor()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_timeout_kills_processes_and_releases_slots(self):
+        processes = list(self.pool._get_executor()._processes.values())
+
+        results = self.pool.fill_many('pypdf', [('sleep.pdf', {}), ('sleep.pdf', {})], per_request_limit=2)
+
+        self.assertEqual(results, [None, None])
+        self.assertFalse(any(process.is_alive() for process in processes))
+        self.assertEqual(self.pool.slots.count(), 0)
+        # A new pool is forked and both slots are available again
+        results = self.pool.fill_many('pypdf', [('a.pdf', {}), ('b.pdf', {})], per_request_limit=2)
+        self.assertEqual(results, [b'%PDF-filled', b'%PDF-filled'])
+
+    def test_timeout_leaves_other_threads_pools_running(self):
+        other, started, finished = {}, threading.Event(), threading.Event()
+
+        def other_request():
+            # Keeps its thread (and the thread's pool) alive like a uwsgi request thread
+            other['processes'] = list(self.pool._get_executor()._processes.values())
+            started.set()
+            finished.wait(10)
+            self.pool._reset_executor()
+
+        thread = threading.Thread(target=other_request)
+        thread.start()
+        started.wait(10)
+        try:
+            self.pool.fill_many('pypdf', [('sleep.pdf', {})], per_request_limit=1)
+
+            self.assertTrue(all(process.is_alive() for process in other['processes']))
+        finally:
+            finished.set()
+            thread.join()
+
+    def test_slots_of_dead_workers_are_reclaimed(self):
+        dead = subprocess.Popen(['true'])
+        dead.wait()
+        ledger = FillSlotLedger(self.slots_path)
+        ledger.acquire(dead.pid, 2)
+        ledger.acquire(dead.pid, 2)
+
+        results = self.pool.fill_many('pypdf', [('a.pdf', {})], per_request_limit=2)
+
+        self.assertEqual(results, [b'%PDF-filled'])
+        self.assertEqual(ledger.count(), 0)
+
+    def test_global_limit_leaves_jobs_inline(self):
+        ledger = FillSlotLedger(self.slots_path)
+        ledger.acquire(os.getpid(), 2)
+        ledger.acquire(os.getpid(), 2)
+
+        results = self.pool.fill_many('pypdf', [('a.pdf', {})], per_request_limit=2)
+
+        self.assertEqual(results, [None])
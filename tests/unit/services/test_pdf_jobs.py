@@ -0,0 +1,145 @@
+"""
+PDF Generation Jobs Testing Module
+
+Tests the asynchronous PDF generation queue:
+- Jobs are claimed once, oldest first, and record done/failed
+- Prescription payloads survive JSON storage without changing the filled PDF
+- Abandoned running jobs are requeued by the worker
+- The status endpoint only reports jobs owned by the requesting user
+"""
+
+from datetime import date, timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from processos.models import PDFGenerationJob
+from processos.services.prescription.pdf_job_service import PDFJobService
+from usuarios.models import Usuario
+
+
+class TestPDFJobService(TestCase):
+
+    def setUp(self):
+        self.user = Usuario.objects.create_user(email="fila@example.com", password="testpass123", is_medico=True)
+        self.service = PDFJobService()
+
+    def test_claim_takes_oldest_pending_job_once(self):
+        first = self.service.enqueue_renewal(None, date(2025, 3, 1), self.user)
+        self.service.enqueue_renewal(None, date(2025, 3, 1), self.user)
+
+        claimed = self.service.claim_next()
+
+        self.assertEqual(claimed.pk, first.pk)
+        self.assertEqual(claimed.status, PDFGenerationJob.STATUS_RUNNING)
+        self.assertEqual(claimed.attempts, 1)
+        self.assertNotEqual(self.service.claim_next().pk, first.pk)
+        self.assertIsNone(self.service.claim_next())
+
+    def test_run_records_pdf_url(self):
+        job = self.service.enqueue_prescription(
+            {'cpf_paciente': '11144477735', 'cid': 'G35', 'data_1': date(2025, 3, 1)}, None, self.user
+        )
+
+        with patch('processos.services.prescription.pdf_job_service.PrescriptionPDFService.generate_prescription_pdf',
+                   return_value=HttpResponse(b'%PDF-1.7', content_type='application/pdf')) as generate, \
+             patch('processos.services.prescription.pdf_job_service.PDFFileService.save_pdf_and_get_url',
+                   return_value='/processos/serve-pdf/pdf_final_11144477735_G35.pdf/'):
+            job = self.service.run(self.service.claim_next())
+
+        self.assertEqual(job.status, PDFGenerationJob.STATUS_DONE)
+        self.assertEqual(job.pdf_url, '/processos/serve-pdf/pdf_final_11144477735_G35.pdf/')
+        self.assertEqual(generate.call_args.args[0]['data_1'], '01/03/2025')
+
+    def test_run_records_failure(self):
+        self.service.enqueue_renewal(None, date(2025, 3, 1), self.user)
+
+        with patch('processos.services.prescription.pdf_job_service.RenewalService.process_renewal', return_value=None):
+            job = self.service.run(self.service.claim_next())
+
+        self.assertEqual(job.status, PDFGenerationJob.STATUS_FAILED)
+        self.assertIn('PDF generation failed', job.error)
+
+    def test_serialized_payload_is_json_safe(self):
+        data = self.service.serialize_prescription_data({
+            'data_1': date(2025, 3, 1),
+            'consentimento': True,
+            'usuario': self.user,
+            'peso': 70,
+            'medicamentos': [1, 2],
+        })
+
+        self.assertEqual(data['data_1'], '01/03/2025')
+        self.assertIs(data['consentimento'], True)
+        self.assertEqual(data['usuario'], str(self.user))
+        self.assertEqual(data['medicamentos'], [1, 2])
+
+    def test_stale_running_jobs_are_requeued_or_failed(self):
+        retry = self.service.enqueue_renewal(None, date(2025, 3, 1), self.user)
+        exhausted = self.service.enqueue_renewal(None, date(2025, 3, 1), self.user)
+        long_ago = timezone.now() - timedelta(hours=1)
+        PDFGenerationJob.objects.filter(pk=retry.pk).update(status='running', started_at=long_ago, attempts=1)
+        PDFGenerationJob.objects.filter(pk=exhausted.pk).update(status='running', started_at=long_ago, attempts=3)
+
+        requeued = self.service.requeue_stale(stale_after_seconds=300, max_attempts=3)
+
+        self.assertEqual(requeued, 1)
+        retry.refresh_from_db()
+        exhausted.refresh_from_db()
+        self.assertEqual(retry.status, PDFGenerationJob.STATUS_PENDING)
+        self.assertEqual(exhausted.status, PDFGenerationJob.STATUS_FAILED)
+
+    def test_worker_command_drains_queue(self):
+        self.service.enqueue_renewal(None, date(2025, 3, 1), self.user)
+
+        with patch.object(PDFJobService, 'run', side_effect=lambda job: job) as run:
+            call_command('process_pdf_jobs', '--once', stdout=StringIO())
+
+        run.assert_called_once()
+        self.assertFalse(PDFGenerationJob.objects.filter(status=PDFGenerationJob.STATUS_PENDING).exists())
+
+
+class TestPDFJobStatusView(TestCase):
+
+    def setUp(self):
+        self.user = Usuario.objects.create_user(email="dono@example.com", password="testpass123", is_medico=True)
+        self.other = Usuario.objects.create_user(email="outro@example.com", password="testpass123", is_medico=True)
+        self.job = PDFJobService().enqueue_renewal(None, date(2025, 3, 1), self.user)
+        self.url = reverse('processos-pdf-job-status', kwargs={'job_id': self.job.pk})
+
+    def test_pending_job_reports_status(self):
+        self.client.force_login(self.user)
+
+        data = self.client.get(self.url).json()
+
+        self.assertTrue(data['success'])
+        self.assertEqual(data['status'], 'pending')
+        self.assertNotIn('pdf_url', data)
+
+    def test_done_job_reports_pdf_url(self):
+        PDFGenerationJob.objects.filter(pk=self.job.pk).update(status='done', pdf_url='/processos/serve-pdf/x.pdf/')
+        self.client.force_login(self.user)
+
+        data = self.client.get(self.url).json()
+
+        self.assertEqual(data['pdf_url'], '/processos/serve-pdf/x.pdf/')
+        self.assertEqual(data['filename'], 'x.pdf')
+
+    def test_other_users_job_is_not_found(self):
+        self.client.force_login(self.other)
+
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_renewal_of_other_users_process_is_refused_before_queueing(self):
+        from processos.utils.pdf_json_response_helper import PDFJsonResponseHelper
+        from processos.views.renewal_views import _handle_renewal_pdf_enqueue
+
+        response = _handle_renewal_pdf_enqueue(PDFJsonResponseHelper(), 999999, date(2025, 3, 1), self.other)
+
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(PDFGenerationJob.objects.count(), 1)
@@ -0,0 +1,138 @@
+"""
+PDF Linearization Testing Module
+
+Tests the optional qpdf linearization / object stream stage:
+- Linearized output replaces the generated document when enabled
+- Object streams are generated in the same qpdf pass, or alone
+- A missing or failing qpdf leaves the document unchanged
+- linearize_protocols rewrites protocol PDFs in place and skips linearized ones
+
+qpdf itself is replaced by a small script that marks its output as linearized.
+"""
+
+import os
+import shutil
+import stat
+import sys
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from processos.services.pdf_engines import PypdfBackend
+from processos.services.pdf_linearization import PDFLinearizer
+from processos.services.pdf_operations import PDFGenerator
+
+
+SADT_TEMPLATE = os.path.join(settings.BASE_DIR, "static", "autocusto", "processos", "sadt.pdf")
+LINEARIZED_HEADER = b'%PDF-1.7\n1 0 obj\n<< /Linearized 1 >>\nendobj\n'
+OBJECT_STREAMS_MARKER = b'%ObjStm\n'
+
+FAKE_QPDF = f"""#!{sys.executable}
+import sys
+data = open(sys.argv[-2], 'rb').read()
+if '--object-streams=generate' in sys.argv:
+    data = {OBJECT_STREAMS_MARKER!r} + data
+if '--linearize' in sys.argv:
+    data = {LINEARIZED_HEADER!r} + data
+open(sys.argv[-1], 'wb').write(data)
+"""
+FAILING_QPDF = f"""#!{sys.executable}
+import sys
+sys.stderr.write('qpdf: not a PDF file')
+sys.exit(2)
+"""
+
+
+class LinearizerFixture:
+
+    def create_binaries(self):
+        self.directory = tempfile.mkdtemp()
+        self.qpdf = self.write_script('qpdf', FAKE_QPDF)
+        self.failing_qpdf = self.write_script('qpdf-failing', FAILING_QPDF)
+
+    def write_script(self, name, source):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as f:
+            f.write(source)
+        os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+        return path
+
+
+class TestPDFLinearizer(LinearizerFixture, TestCase):
+
+    def setUp(self):
+        self.create_binaries()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_bytes_are_linearized(self):
+        result = PDFLinearizer(binary=self.qpdf).linearize_bytes(b'%PDF-1.7 documento')
+
+        self.assertEqual(result, LINEARIZED_HEADER + b'%PDF-1.7 documento')
+
+    def test_linearized_bytes_are_not_rewritten(self):
+        pdf_bytes = LINEARIZED_HEADER + b'%%EOF'
+
+        self.assertIs(PDFLinearizer(binary=self.failing_qpdf).linearize_bytes(pdf_bytes), pdf_bytes)
+
+    def test_missing_or_failing_qpdf_keeps_original(self):
+        for binary in (os.path.join(self.directory, 'missing'), self.failing_qpdf):
+            with self.subTest(binary=binary):
+                pdf_bytes = b'%PDF-1.7 documento'
+
+                self.assertIs(PDFLinearizer(binary=binary).linearize_bytes(pdf_bytes), pdf_bytes)
+
+    def test_object_streams_in_same_pass(self):
+        linearizer = PDFLinearizer(binary=self.qpdf, object_streams=True)
+
+        self.assertEqual(
+            linearizer.linearize_bytes(b'%PDF-1.7 documento'),
+            LINEARIZED_HEADER + OBJECT_STREAMS_MARKER + b'%PDF-1.7 documento',
+        )
+        self.assertEqual(linearizer.compact_bytes(b'%PDF-1.7 documento'), OBJECT_STREAMS_MARKER + b'%PDF-1.7 documento')
+
+    @override_settings(PDF_OBJECT_STREAMS=True)
+    def test_generator_packs_object_streams_without_linearizing(self):
+        with override_settings(PDF_QPDF_BINARY=self.qpdf):
+            pdf_bytes = PDFGenerator(backend=PypdfBackend(), linearize=False).fill_and_concatenate([SADT_TEMPLATE], {})
+
+        self.assertTrue(pdf_bytes.startswith(OBJECT_STREAMS_MARKER))
+
+    def test_generator_linearizes_when_enabled(self):
+        with override_settings(PDF_QPDF_BINARY=self.qpdf):
+            enabled = PDFGenerator(backend=PypdfBackend(), linearize=True).fill_and_concatenate([SADT_TEMPLATE], {})
+            disabled = PDFGenerator(backend=PypdfBackend(), linearize=False).fill_and_concatenate([SADT_TEMPLATE], {})
+
+        self.assertTrue(enabled.startswith(LINEARIZED_HEADER))
+        self.assertFalse(PDFLinearizer.is_linearized(disabled))
+
+
+class TestLinearizeProtocolsCommand(LinearizerFixture, TestCase):
+
+    def setUp(self):
+        self.create_binaries()
+        self.protocols = os.path.join(self.directory, 'protocolos')
+        os.makedirs(os.path.join(self.protocols, 'esclerose_multipla'))
+        with open(os.path.join(self.protocols, 'ame.pdf'), 'wb') as f:
+            f.write(b'%PDF-1.7 ame')
+        with open(os.path.join(self.protocols, 'esclerose_multipla', 'consentimento.pdf'), 'wb') as f:
+            f.write(LINEARIZED_HEADER + b'consentimento')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_protocols_linearized_in_place(self):
+        stdout = StringIO()
+        with override_settings(PDF_QPDF_BINARY=self.qpdf):
+            call_command('linearize_protocols', directory=self.protocols, stdout=stdout)
+
+        with open(os.path.join(self.protocols, 'ame.pdf'), 'rb') as f:
+            self.assertEqual(f.read(), LINEARIZED_HEADER + b'%PDF-1.7 ame')
+        with open(os.path.join(self.protocols, 'esclerose_multipla', 'consentimento.pdf'), 'rb') as f:
+            self.assertEqual(f.read(), LINEARIZED_HEADER + b'consentimento')
+        self.assertIn('1 linearized, 1 already linearized, 0 failed', stdout.getvalue())
+        self.assertEqual(sorted(os.listdir(self.protocols)), ['ame.pdf', 'esclerose_multipla'])
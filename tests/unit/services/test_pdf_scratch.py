@@ -0,0 +1,156 @@
+"""
+PDF Scratch Space Testing Module
+
+Tests the tmpfs scratch quota:
+- Reservations are counted against the quota shared by all workers
+- An exhausted quota blocks until space is released, then falls back to disk
+- Space held by dead workers is reclaimed
+- PDFGenerator writes its tmpfs files within reservations and releases them
+- Usage is exposed to the health metrics
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from unittest.mock import patch
+
+from django.conf import settings
+from django.test import TestCase
+
+from analytics.health_utils import get_pdf_scratch_usage
+from processos.services.pdf_operations import PDFGenerator
+from processos.services.pdf_scratch import ScratchSpace
+
+
+SADT_TEMPLATE = os.path.join(settings.BASE_DIR, "static", "autocusto", "processos", "sadt.pdf")
+
+
+class FileBackend:
+    """File-based backend writing copies of the templates, like pdftk."""
+
+    name = 'file'
+    in_memory = False
+
+    def fill_form(self, template_path, form_data, output_path):
+        shutil.copyfile(template_path, output_path)
+        return output_path
+
+    def concat(self, pdf_paths, output_path):
+        with open(output_path, 'wb') as output:
+            for path in pdf_paths:
+                with open(path, 'rb') as f:
+                    output.write(f.read())
+        return output_path
+
+
+class ScratchFixture:
+
+    def create_space(self, quota_bytes=1000, wait_seconds=0):
+        self.directory = tempfile.mkdtemp()
+        self.fallback_dir = os.path.join(self.directory, 'disk')
+        os.makedirs(self.fallback_dir)
+        return ScratchSpace(
+            directory=os.path.join(self.directory, 'shm'), quota_bytes=quota_bytes,
+            wait_seconds=wait_seconds, fallback_dir=self.fallback_dir,
+        )
+
+
+class TestScratchSpace(ScratchFixture, TestCase):
+
+    def setUp(self):
+        self.space = self.create_space()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_reservations_counted_against_quota(self):
+        first = self.space.reserve(600)
+        second = self.space.reserve(300)
+
+        self.assertFalse(first.on_disk)
+        self.assertEqual(first.directory, os.path.join(self.directory, 'shm', str(os.getpid())))
+        self.assertEqual(self.space.stats()['current_bytes'], 900)
+
+        self.space.settle(second, 100)
+        self.space.release(first)
+
+        stats = self.space.stats()
+        self.assertEqual(stats['current_bytes'], 100)
+        self.assertEqual(stats['peak_bytes'], 900)
+        self.assertEqual(stats['rejected'], 0)
+
+    def test_exhausted_quota_falls_back_to_disk(self):
+        self.space.reserve(800)
+
+        with patch.object(self.space._released, 'wait') as wait:
+            reservation = self.space.reserve(300)
+
+        wait.assert_not_called()
+        self.assertTrue(reservation.on_disk)
+        self.assertEqual(os.path.dirname(reservation.path('pdf_temp')), self.fallback_dir)
+        self.assertEqual(self.space.stats()['rejected'], 1)
+        self.assertEqual(self.space.stats()['current_bytes'], 800)
+
+    def test_exhausted_quota_waits_for_release(self):
+        self.space.wait_seconds = 5
+        held = self.space.reserve(800)
+        releaser = threading.Timer(0.1, self.space.release, args=(held,))
+        releaser.start()
+
+        start = time.monotonic()
+        reservation = self.space.reserve(300)
+        releaser.join()
+
+        self.assertFalse(reservation.on_disk)
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual(self.space.stats()['rejected'], 0)
+
+    def test_dead_worker_space_reclaimed(self):
+        self.space.reserve(10)  # Creates this worker's directory and the ledger
+        dead_pid = subprocess.Popen([sys.executable, '-c', 'pass']).pid
+        os.waitpid(dead_pid, 0)
+        os.makedirs(os.path.join(self.space.directory, str(dead_pid)))
+        self.space.ledger.reserve(dead_pid, 900, quota=0)
+
+        reservation = self.space.reserve(500)
+
+        self.assertFalse(reservation.on_disk)
+        self.assertFalse(os.path.exists(os.path.join(self.space.directory, str(dead_pid))))
+        self.assertEqual(self.space.stats()['current_bytes'], 510)
+
+
+class TestGeneratorScratch(ScratchFixture, TestCase):
+
+    def setUp(self):
+        self.space = self.create_space(quota_bytes=10 * 1024 * 1024)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_tmpfs_files_written_within_released_reservations(self):
+        generator = PDFGenerator(backend=FileBackend(), parallel=False, linearize=False)
+        with patch('processos.services.pdf_operations.scratch_space', self.space):
+            filled = generator._fill_pdf_forms([SADT_TEMPLATE, SADT_TEMPLATE], {'nome_paciente': 'Maria'})
+            self.assertEqual(self.space.stats()['current_bytes'], 2 * os.path.getsize(SADT_TEMPLATE))
+            self.assertTrue(all(os.path.dirname(path) == os.path.join(self.space.directory, str(os.getpid()))
+                                for path in filled))
+
+            pdf_bytes = generator._concatenate_pdfs(filled)
+            generator._cleanup_temp_files()
+
+        self.assertEqual(len(pdf_bytes), 2 * os.path.getsize(SADT_TEMPLATE))
+        self.assertEqual(self.space.stats()['current_bytes'], 0)
+        self.assertEqual(os.listdir(os.path.join(self.space.directory, str(os.getpid()))), [])
+
+    def test_usage_exposed_to_health_metrics(self):
+        self.space.reserve(1234)
+
+        with patch('analytics.health_utils.scratch_space', self.space):
+            usage = get_pdf_scratch_usage()
+
+        self.assertEqual(usage['current_bytes'], 1234)
+        self.assertEqual(usage['quota_bytes'], 10 * 1024 * 1024)
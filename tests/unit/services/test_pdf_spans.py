@@ -0,0 +1,95 @@
+"""
+PDF Generation Spans Testing Module
+
+Tests the per-stage timings stored with PDFGenerationLog:
+- Spans are only recorded inside a recording
+- Prescription generation records protocol lookup, template selection,
+  one fill per template and concat, plus template count and output size
+- Saving the response adds a save span, also for streamed generation
+  whose fills run after the generation call returned
+"""
+
+import os
+import shutil
+import tempfile
+from unittest.mock import Mock
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+
+from analytics.models import PDFGenerationLog
+from processos.models import Doenca, Protocolo
+from processos.services.io_services import PDFFileService
+from processos.services.pdf_engines import PypdfBackend
+from processos.services.pdf_operations import PDFGenerator
+from processos.services.pdf_spans import current_recorder, recording
+from processos.services.prescription.pdf_generation import PrescriptionPDFService
+from usuarios.models import Usuario
+
+
+SADT_TEMPLATE = os.path.join(settings.BASE_DIR, "static", "autocusto", "processos", "sadt.pdf")
+LME_TEMPLATE = os.path.join(settings.BASE_DIR, "static", "autocusto", "processos", "lme_base_modelo.pdf")
+
+
+class TestPDFSpanRecorder(TestCase):
+
+    def test_spans_recorded_only_inside_recording(self):
+        with current_recorder().span('fill'):
+            pass
+
+        with recording() as spans:
+            with current_recorder().span('fill', template='sadt.pdf'):
+                pass
+            current_recorder().annotate(template_count=1)
+
+        self.assertEqual(len(spans.spans), 1)
+        self.assertEqual(spans.spans[0]['stage'], 'fill')
+        self.assertEqual(spans.spans[0]['template'], 'sadt.pdf')
+        self.assertEqual(spans.attributes, {'template_count': 1})
+        self.assertEqual(current_recorder().spans, [])
+
+
+class TestPrescriptionSpans(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.user = Usuario.objects.create_user(email="spans@example.com", password="testpass123", is_medico=True)
+        protocolo = Protocolo.objects.create(nome='esclerose_multipla', arquivo='esclerose.pdf')
+        self.doenca = Doenca.objects.create(cid='G35', nome='Esclerose Múltipla', protocolo=protocolo)
+        self.prescription_data = {'cpf_paciente': '11144477735', 'cid': 'G35', 'data_1': '01/01/2025', 'nome_paciente': 'Maria'}
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _service(self):
+        service = PrescriptionPDFService()
+        service.pdf_generator = PDFGenerator(backend=PypdfBackend(), parallel=False, linearize=False)
+        service.template_selector.select_prescription_templates = Mock(return_value=[LME_TEMPLATE, SADT_TEMPLATE])
+        return service
+
+    def test_stages_stored_with_log(self):
+        response = self._service().generate_prescription_pdf(dict(self.prescription_data), user=self.user, stream=False)
+
+        log = PDFGenerationLog.objects.get(user=self.user)
+        stages = [span['stage'] for span in log.stage_timings]
+        self.assertEqual(stages, ['protocol_lookup', 'template_selection', 'fill', 'fill', 'concat'])
+        self.assertEqual([span.get('template') for span in log.stage_timings if span['stage'] == 'fill'],
+                         ['lme_base_modelo.pdf', 'sadt.pdf'])
+        self.assertEqual(log.template_count, 2)
+        self.assertEqual(log.file_size_bytes, len(response.content))
+        self.assertEqual(log.doenca, self.doenca)
+        self.assertIs(response.pdf_spans.log_id, log.pk)
+
+    def test_streamed_fills_and_save_stored_after_saving(self):
+        response = self._service().generate_prescription_pdf(dict(self.prescription_data), user=self.user, stream=True)
+        log = PDFGenerationLog.objects.get(user=self.user)
+        self.assertEqual([span['stage'] for span in log.stage_timings], ['protocol_lookup', 'template_selection', 'fill'])
+
+        with override_settings(PDF_OUTPUT_DIR=self.directory):
+            PDFFileService().save_pdf_and_get_url(response, self.user)
+
+        log.refresh_from_db()
+        self.assertEqual([span['stage'] for span in log.stage_timings],
+                         ['protocol_lookup', 'template_selection', 'fill', 'fill', 'save'])
+        saved = [name for name in os.listdir(self.directory) if name.endswith('.pdf')]
+        self.assertEqual(log.file_size_bytes, os.path.getsize(os.path.join(self.directory, saved[0])))
@@ -0,0 +1,195 @@
+"""
+Generated PDF Storage Testing Module
+
+Tests opaque-id storage and signed, expiring PDF links:
+- Each generation gets its own file, even for identical content
+- Links only verify for the user they were issued to, before they expire
+- Tampered or malformed links are rejected
+- serve_generated_pdf serves valid links and 404s everything else
+- The reaper deletes expired files and evicts LRU files over the byte budget
+- cleanup_pdfs also deletes old legacy pdf_final_* files
+"""
+
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from processos.services.io_services import PDFFileService
+from processos.services.pdf_storage import GeneratedPDFStore
+from usuarios.models import Usuario
+
+
+class TestGeneratedPDFStore(TestCase):
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.store = GeneratedPDFStore(directory=self.output_dir, ttl=60)
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir, ignore_errors=True)
+
+    def test_identical_documents_get_separate_files(self):
+        first = self.store.save(b'%PDF-1.7 same')
+        second = self.store.save(b'%PDF-1.7 same')
+
+        self.assertNotEqual(first, second)
+        self.assertNotEqual(self.store.path(first), self.store.path(second))
+
+    def test_token_verifies_for_owner_only(self):
+        token = self.store.sign('a' * 32, user_id=7)
+
+        self.assertEqual(self.store.verify(token, 7), 'a' * 32)
+        self.assertIsNone(self.store.verify(token, 8))
+
+    def test_expired_token_rejected(self):
+        token = self.store.sign('a' * 32, user_id=7, expires=int(time.time()) - 1)
+
+        self.assertIsNone(self.store.verify(token, 7))
+
+    def test_tampered_and_malformed_tokens_rejected(self):
+        doc_id, user_id, expires, signature = self.store.sign('a' * 32, user_id=7).split('.')
+
+        for token in (
+            f"{doc_id}.{user_id}.{int(expires) + 3600}.{signature}",  # extended expiry
+            f"{'b' * 32}.{user_id}.{expires}.{signature}",  # other document
+            f"{doc_id}.8.{expires}.{signature}",  # other user
+            f"../etc/passwd.{user_id}.{expires}.{signature}",
+            "not-a-token",
+        ):
+            with self.subTest(token=token):
+                self.assertIsNone(self.store.verify(token, 7))
+                self.assertIsNone(self.store.verify(token, 8))
+
+    def test_path_rejects_non_opaque_ids(self):
+        with self.assertRaises(ValueError):
+            self.store.path('../pdf_final_11144477735_G35')
+
+
+@override_settings(PDF_OUTPUT_MAX_BYTES=1000, PDF_REAP_INTERVAL_SECONDS=3600)
+class TestGeneratedPDFReaper(TestCase):
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.store = GeneratedPDFStore(directory=self.output_dir, ttl=60)
+        GeneratedPDFStore._last_reap[self.output_dir] = time.monotonic()  # No reaping on save
+
+    def tearDown(self):
+        GeneratedPDFStore._last_reap.pop(self.output_dir, None)
+        shutil.rmtree(self.output_dir, ignore_errors=True)
+
+    def test_expired_files_are_deleted(self):
+        expired = self.store.save(b'%PDF expired')
+        fresh = self.store.save(b'%PDF fresh')
+        self.store.index.add(expired, time.time() - 1, 12)
+
+        self.assertEqual(self.store.reap(), 1)
+
+        self.assertFalse(os.path.exists(self.store.path(expired)))
+        self.assertTrue(os.path.exists(self.store.path(fresh)))
+
+    def test_least_recently_used_files_evicted_over_budget(self):
+        old = self.store.save(b'x' * 400)
+        used = self.store.save(b'x' * 400)
+        self.store.touch(old)  # "used" is now the least recently used
+        new = self.store.save(b'x' * 400)
+
+        self.store.reap()
+
+        self.assertTrue(os.path.exists(self.store.path(old)))
+        self.assertFalse(os.path.exists(self.store.path(used)))
+        self.assertTrue(os.path.exists(self.store.path(new)))
+        self.assertLessEqual(self.store.index.total_bytes(), 1000)
+
+    def test_save_reaps_at_most_once_per_interval(self):
+        GeneratedPDFStore._last_reap.pop(self.output_dir)
+        with patch.object(GeneratedPDFStore, 'reap') as reap:
+            self.store.save(b'%PDF')
+            self.store.save(b'%PDF')
+
+        reap.assert_called_once()
+
+    def test_cleanup_command_reaps_all_expired(self):
+        GeneratedPDFStore.reap_batch_size = 2
+        try:
+            for _ in range(5):
+                self.store.index.add(self.store.save(b'%PDF'), time.time() - 1, 4)
+            with override_settings(PDF_OUTPUT_DIR=self.output_dir):
+                call_command('cleanup_pdfs', stdout=StringIO())
+        finally:
+            GeneratedPDFStore.reap_batch_size = 100
+
+        self.assertEqual(self.store.index.total_bytes(), 0)
+        self.assertEqual([f for f in os.listdir(self.output_dir) if f.endswith('.pdf')], [])
+
+    def test_index_is_kept_out_of_the_served_directory(self):
+        self.store.save(b'%PDF')
+
+        self.assertTrue(all(name.startswith(GeneratedPDFStore.file_prefix) for name in os.listdir(self.output_dir)))
+        self.assertNotEqual(os.path.dirname(self.store.index.path), self.output_dir)
+        self.assertEqual(GeneratedPDFStore(directory=self.output_dir).index.path, self.store.index.path)
+
+    def test_cleanup_command_deletes_old_legacy_files(self):
+        old = tempfile.NamedTemporaryFile(prefix='pdf_final_', suffix='.pdf', dir='/tmp', delete=False).name
+        recent = tempfile.NamedTemporaryFile(prefix='pdf_final_', suffix='.pdf', dir='/tmp', delete=False).name
+        os.utime(old, (time.time() - 600, time.time() - 600))
+        try:
+            with override_settings(PDF_OUTPUT_DIR=self.output_dir):
+                call_command('cleanup_pdfs', stdout=StringIO())
+
+            self.assertFalse(os.path.exists(old))
+            self.assertTrue(os.path.exists(recent))
+        finally:
+            for path in (old, recent):
+                if os.path.exists(path):
+                    os.remove(path)
+
+
+class TestServeGeneratedPDF(TestCase):
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(PDF_OUTPUT_DIR=self.output_dir, PDF_ACCEL_REDIRECT_PREFIX='')
+        self.settings_override.enable()
+        self.user = Usuario.objects.create_user(email="dono@example.com", password="testpass123", is_medico=True)
+        self.other = Usuario.objects.create_user(email="outro@example.com", password="testpass123", is_medico=True)
+        self.url = PDFFileService().save_pdf_and_get_url(HttpResponse(b'%PDF-1.7 gerado'), self.user)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.output_dir, ignore_errors=True)
+
+    def test_owner_downloads_document(self):
+        self.client.force_login(self.user)
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF-1.7 gerado')
+
+    def test_other_user_gets_404(self):
+        self.client.force_login(self.other)
+
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_expired_link_gets_404(self):
+        self.client.force_login(self.user)
+
+        store = GeneratedPDFStore()
+        doc_id = store.save(b'%PDF-1.7')
+        token = store.sign(doc_id, self.user.pk, expires=int(time.time()) - 1)
+
+        response = self.client.get(reverse('processos-serve-generated-pdf', kwargs={'token': token}))
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_url_does_not_expose_patient_data(self):
+        self.assertNotIn('pdf_final_', self.url)
@@ -17,10 +17,13 @@ WHY THESE TESTS MATTER:
 import os
 from unittest.mock import patch, MagicMock
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django import forms
 
-from processos.services.pdf_strategies import DataDrivenStrategy, get_conditional_fields
+from django.conf import settings
+
+from processos.services.pdf_strategies import DataDrivenStrategy, get_conditional_fields, template_plans
+from processos.services.prescription.template_selection import PrescriptionTemplateSelector
 from processos.models import Protocolo, Doenca
 
 
@@ -222,6 +225,83 @@ class TestDataDrivenStrategy(TestCase):
         self.assertEqual(med_files, [], "Simple protocols should need no extra medication files")
 
 
+@override_settings(REFERENCE_DATA_CACHE_ENABLED=True)
+class TestTemplatePlanCache(TestCase):
+    """
+    WHAT THIS TESTS: The per-worker cache of compiled template plans behind
+    DataDrivenStrategy and PrescriptionTemplateSelector.
+    
+    WHY IT MATTERS: Template selection runs on every prescription; the protocol
+    configuration must be parsed and its files checked once, but an edited
+    protocol must be picked up immediately.
+    """
+    
+    def setUp(self):
+        self.protocolo = Protocolo.objects.create(
+            nome="esclerose_multipla",
+            arquivo="esclerose_multipla.pdf",
+            dados_condicionais={
+                "medications": {"fingolimod": {"files": ["monitoramento_fingolimode_modelo.pdf"]}}
+            }
+        )
+        self.lme_data = {"med1": "Fingolimode 0,5mg", "cpf_paciente": "11144477735", "cid": "G35"}
+    
+    def test_plan_compiled_once(self):
+        with patch('processos.services.pdf_strategies.template_registry.exists', return_value=True) as exists:
+            first = DataDrivenStrategy(self.protocolo).get_medication_specific_paths(self.lme_data)
+            checks = exists.call_count
+            second = DataDrivenStrategy(self.protocolo).get_medication_specific_paths(self.lme_data)
+        
+        self.assertEqual(first, second)
+        self.assertEqual(exists.call_count, checks, "Files should only be checked when compiling")
+        self.assertIs(template_plans.get(self.protocolo), template_plans.get(self.protocolo))
+    
+    def test_nothing_cached_without_snapshot(self):
+        template_plans.invalidate()
+        
+        with override_settings(REFERENCE_DATA_CACHE_ENABLED=False):
+            plan = template_plans.get(self.protocolo)
+        
+        self.assertEqual(len(plan.medication_paths), 1)
+        self.assertEqual(template_plans._plans, {})
+    
+    def test_invalid_configuration_compiles_without_protocol_templates(self):
+        with patch('processos.services.pdf_strategies.get_static_path', side_effect=ValueError("bad file name")):
+            plan = template_plans.get(Protocolo.objects.get(pk=self.protocolo.pk))
+        
+        self.assertEqual(plan.medication_paths, ())
+        self.assertEqual(plan.disease_paths, ())
+    
+    def test_saved_protocol_recompiled(self):
+        self.assertEqual(len(DataDrivenStrategy(self.protocolo).get_medication_specific_paths(self.lme_data)), 1)
+        
+        self.protocolo.dados_condicionais = {"medications": {}}
+        self.protocolo.save()
+        
+        self.assertEqual(DataDrivenStrategy(self.protocolo).get_medication_specific_paths(self.lme_data), [])
+    
+    def test_protocol_changed_by_another_worker_recompiled(self):
+        template_plans.get(self.protocolo)
+        
+        # No post_save in this process: the reloaded snapshot (or the query) returns a new instance
+        Protocolo.objects.filter(pk=self.protocolo.pk).update(dados_condicionais={"disease_files": ["consentimento.pdf"]})
+        plan = template_plans.get(Protocolo.objects.get(pk=self.protocolo.pk))
+        
+        self.assertEqual(plan.medication_paths, ())
+        self.assertEqual([os.path.basename(path) for path in plan.disease_paths], ["consentimento.pdf"])
+    
+    def test_selector_uses_plan_for_optional_documents(self):
+        form_data = {**self.lme_data, "consentimento": "True", "emitir_exames": True, "exames": "Hemograma"}
+        
+        paths = PrescriptionTemplateSelector().select_prescription_templates(self.protocolo, form_data, settings.PATH_LME_BASE)
+        
+        self.assertEqual(
+            [os.path.basename(path) for path in paths],
+            ["lme_base_modelo.pdf", "monitoramento_fingolimode_modelo.pdf", "consentimento.pdf",
+             os.path.basename(settings.PATH_EXAMES)],
+        )
+
+
 class TestConditionalFields(TestCase):
     """
     WHAT THIS TESTS: Dynamic form fields that appear based on the medical protocol
@@ -409,7 +489,12 @@ class TestConditionalFields(TestCase):
 #    - Handles unknown medications safely
 #    - Works with simple protocols that need no extra files
 #
-# 2. get_conditional_fields Function:
+# 2. TemplatePlanCache:
+#    - Compiles each protocol's configuration once
+#    - Recompiles protocols saved in this worker or changed by another one
+#    - Feeds the optional documents of PrescriptionTemplateSelector
+#
+# 3. get_conditional_fields Function:
 #    - Creates dropdown fields for standardized medical scores  
 #    - Creates checkboxes for yes/no medical questions
 #    - Creates number fields for quantitative medical data
@@ -0,0 +1,133 @@
+"""
+Streaming PDF Generation Testing Module
+
+Tests the streamed output mode:
+- The incremental merge writes each document before the next is filled
+- Streamed output is a valid PDF with every page
+- PDFGenerator fills the first template before returning and the rest lazily
+- PrescriptionPDFService returns a StreamingHttpResponse that is saved
+  chunk by chunk and stored in the result cache once complete
+"""
+
+import io
+import os
+import shutil
+import tempfile
+from unittest.mock import Mock, patch
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.test import TestCase, override_settings
+from pypdf import PdfReader
+
+from processos.services.io_services import PDFFileService
+from processos.services.pdf_engines import PdftkBackend, PypdfBackend
+from processos.services.pdf_operations import PDFGenerator
+from processos.services.pdf_storage import GeneratedPDFStore
+from processos.services.prescription.pdf_generation import PrescriptionPDFService
+from usuarios.models import Usuario
+
+from .test_pdf_cache import file_cache_settings
+
+
+SADT_TEMPLATE = os.path.join(settings.BASE_DIR, "static", "autocusto", "processos", "sadt.pdf")
+LME_TEMPLATE = os.path.join(settings.BASE_DIR, "static", "autocusto", "processos", "lme_base_modelo.pdf")
+
+
+class TestIncrementalMerge(TestCase):
+
+    def setUp(self):
+        self.backend = PypdfBackend()
+
+    def test_documents_are_written_as_they_arrive(self):
+        consumed = []
+
+        def documents():
+            for name in ('Joaquim', 'Bernardo'):
+                consumed.append(name)
+                yield self.backend.fill_in_memory(SADT_TEMPLATE, {'nome_paciente': name})
+
+        chunks = self.backend.merge_incrementally(documents())
+        header = next(chunks)
+        first_document = next(chunks)
+
+        self.assertTrue(header.startswith(b'%PDF'))
+        self.assertEqual(consumed, ['Joaquim'])
+        self.assertIn(b' 0 obj', first_document)
+
+        pdf_bytes = header + first_document + b''.join(chunks)
+        reader = PdfReader(io.BytesIO(pdf_bytes), strict=True)
+        self.assertEqual(len(reader.pages), 2)
+        self.assertIn('Joaquim', reader.pages[0].extract_text())
+        self.assertIn('Bernardo', reader.pages[1].extract_text())
+
+    def test_cross_reference_offsets_point_at_objects(self):
+        pdf_bytes = b''.join(self.backend.merge_incrementally([
+            self.backend.fill_in_memory(LME_TEMPLATE, {'nome_paciente': 'Maria'}),
+            self.backend.fill_in_memory(SADT_TEMPLATE, {'nome_paciente': 'Maria'}),
+        ]))
+
+        reader = PdfReader(io.BytesIO(pdf_bytes), strict=True)
+        for idnum, offset in reader.xref[0].items():
+            self.assertTrue(pdf_bytes[offset:].startswith(f"{idnum} 0 obj".encode()), idnum)
+
+
+class TestFillAndStream(TestCase):
+
+    def test_first_template_filled_before_returning(self):
+        generator = PDFGenerator(backend=PypdfBackend())
+
+        with patch.object(PDFGenerator, '_fill_in_memory', wraps=generator._fill_in_memory) as fill:
+            chunks = generator.fill_and_stream([SADT_TEMPLATE, LME_TEMPLATE], {'nome_paciente': 'Maria'})
+            self.assertEqual(fill.call_count, 1)
+            pdf_bytes = b''.join(chunks)
+
+        self.assertEqual(fill.call_count, 2)
+        self.assertEqual(len(PdfReader(io.BytesIO(pdf_bytes)).pages), 8)
+        self.assertEqual(generator.temp_files, [])
+
+    def test_unstreamable_or_failed_generation_returns_none(self):
+        self.assertIsNone(PDFGenerator(backend=PdftkBackend()).fill_and_stream([SADT_TEMPLATE], {}))
+        self.assertIsNone(PDFGenerator(backend=PypdfBackend()).fill_and_stream(['/nonexistent/template.pdf'], {}))
+
+
+class TestStreamedPrescription(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.prescription_data = {'cpf_paciente': '11144477735', 'cid': 'G35', 'data_1': '01/01/2025', 'nome_paciente': 'Maria'}
+        self.user = Usuario.objects.create_user(email="stream@example.com", password="testpass123", is_medico=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _service(self):
+        service = PrescriptionPDFService()
+        service.pdf_generator = PDFGenerator(backend=PypdfBackend())
+        service._get_medical_protocol = Mock(return_value=Mock(nome='Esclerose Múltipla'))
+        service.template_selector.select_prescription_templates = Mock(return_value=[SADT_TEMPLATE, SADT_TEMPLATE])
+        return service
+
+    def test_streamed_response_saved_to_storage(self):
+        with override_settings(PDF_OUTPUT_DIR=self.directory):
+            response = self._service().generate_prescription_pdf(dict(self.prescription_data), stream=True)
+            url = PDFFileService().save_pdf_and_get_url(response, self.user)
+
+        self.assertIsInstance(response, StreamingHttpResponse)
+        doc_id = GeneratedPDFStore(directory=self.directory).verify(url.rstrip('/').split('/')[-1], self.user.pk)
+        reader = PdfReader(os.path.join(self.directory, f"pdf_gen_{doc_id}.pdf"))
+        self.assertEqual(len(reader.pages), 2)
+        self.assertIn('Maria', reader.pages[1].extract_text())
+
+    def test_completed_stream_is_cached(self):
+        cache_dir = os.path.join(self.directory, 'cache')
+        with override_settings(CACHES=file_cache_settings(cache_dir)):
+            streamed = b''.join(
+                self._service().generate_prescription_pdf(dict(self.prescription_data), stream=True).streaming_content
+            )
+            service = self._service()
+            service.pdf_generator.fill_and_stream = Mock()
+            response = service.generate_prescription_pdf(dict(self.prescription_data), stream=True)
+
+        service.pdf_generator.fill_and_stream.assert_not_called()
+        self.assertEqual(response.content, streamed)
@@ -0,0 +1,174 @@
+"""
+PDF Template Registry Testing Module
+
+Tests the per-worker registry that keeps parsed PDF templates in memory:
+- Templates are parsed once and reused while the file is unchanged
+- A modified template on disk is transparently re-parsed
+- Missing files are never served from cache
+- Each template's field index prunes the form data it receives
+- Static templates are flattened once and reused
+"""
+
+import io
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from django.conf import settings
+from django.test import TestCase
+from pypdf import PdfReader, PdfWriter
+
+from processos.services.pdf_engines import PdftkBackend, PypdfBackend
+from processos.services.pdf_operations import PDFGenerator
+from processos.services.pdf_templates import FlattenedTemplateCache, PDFTemplateRegistry, flattened_cache
+
+
+SADT_TEMPLATE = os.path.join(settings.BASE_DIR, "static", "autocusto", "processos", "sadt.pdf")
+
+
+class TestPDFTemplateRegistry(TestCase):
+
+    def setUp(self):
+        self.registry = PDFTemplateRegistry()
+        self.work_dir = tempfile.mkdtemp()
+        self.template_path = os.path.join(self.work_dir, "sadt.pdf")
+        shutil.copy(SADT_TEMPLATE, self.template_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def test_template_is_parsed_once(self):
+        first = self.registry.get(self.template_path)
+        second = self.registry.get(self.template_path)
+
+        self.assertIs(first, second)
+        self.assertEqual(first.page_count, 1)
+        self.assertIn('nome_paciente', first.field_names)
+        self.assertEqual(len(first.content_hash), 64)
+
+    def test_modified_template_is_reloaded(self):
+        first = self.registry.get(self.template_path)
+        stat = os.stat(self.template_path)
+        os.utime(self.template_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+        second = self.registry.get(self.template_path)
+
+        self.assertIsNot(first, second)
+        self.assertEqual(first.content_hash, second.content_hash)
+
+    def test_missing_template_returns_none(self):
+        self.registry.get(self.template_path)
+        os.remove(self.template_path)
+
+        self.assertIsNone(self.registry.get(self.template_path))
+        self.assertEqual(len(self.registry), 0)
+
+    def test_warm_loads_given_paths(self):
+        loaded = self.registry.warm([self.template_path, os.path.join(self.work_dir, "missing.pdf")])
+
+        self.assertEqual(loaded, 1)
+        self.assertTrue(self.registry.exists(self.template_path))
+
+    def test_discovery_skips_backups_and_protocol_documents(self):
+        paths = PDFTemplateRegistry.discover_template_paths()
+
+        self.assertIn(settings.PATH_LME_BASE, paths)
+        self.assertFalse([p for p in paths if p.endswith("_backup.pdf")])
+        self.assertFalse([p for p in paths if os.path.dirname(p) == settings.PATH_PDF_DIR])
+
+
+class TestTemplateFieldIndex(TestCase):
+    """Field index extracted once per template and used to prune payloads."""
+
+    def setUp(self):
+        self.registry = PDFTemplateRegistry()
+
+    def test_index_describes_field_types_and_export_values(self):
+        template = self.registry.get(settings.PATH_LME_BASE)
+
+        self.assertEqual(template.fields['etnia'].field_type, '/Btn')
+        self.assertIn('etnia_parda', template.fields['etnia'].export_values)
+        self.assertEqual(template.fields['nome_paciente'].field_type, '/Tx')
+        self.assertEqual(set(template.field_names), set(template.fields))
+
+    def test_prune_keeps_only_template_fields(self):
+        template = self.registry.get(SADT_TEMPLATE)
+
+        payload = template.prune_form_data({'nome_paciente': 'Maria', 'med1_repetir_posologia': 'True'})
+
+        self.assertEqual(payload, {'nome_paciente': 'Maria'})
+
+    def test_unknown_fields_are_counted(self):
+        template = self.registry.get(SADT_TEMPLATE)
+
+        unknown = self.registry.count_unknown_fields([template], {'nome_paciente': 'Maria', 'chave_antiga': 'x'})
+        self.registry.count_unknown_fields([template], {'chave_antiga': 'y'})
+
+        self.assertEqual(unknown, ['chave_antiga'])
+        self.assertEqual(self.registry.unknown_field_counts['chave_antiga'], 2)
+
+    def test_generator_sends_each_template_its_own_fields(self):
+        generator = PDFGenerator(backend=PypdfBackend())
+
+        with patch.object(PypdfBackend, 'fill_in_memory') as fill_in_memory:
+            generator._fill_pdf_forms(
+                [SADT_TEMPLATE, settings.PATH_LME_BASE],
+                {'nome_paciente': 'Maria', 'etnia': 'etnia_parda', 'chave_antiga': None},
+            )
+
+        sadt_payload = fill_in_memory.call_args_list[0].args[1]
+        lme_payload = fill_in_memory.call_args_list[1].args[1]
+        self.assertEqual(sadt_payload, {'nome_paciente': 'Maria'})
+        self.assertEqual(lme_payload, {'nome_paciente': 'Maria', 'etnia': 'etnia_parda'})
+
+
+class TestStaticTemplateRenditions(TestCase):
+    """Templates that do not vary per patient are flattened once and reused."""
+
+    def setUp(self):
+        flattened_cache.clear()
+        self.work_dir = tempfile.mkdtemp()
+        self.fieldless_path = os.path.join(self.work_dir, "consentimento.pdf")
+        writer = PdfWriter()
+        writer.add_blank_page(width=595, height=842)
+        with open(self.fieldless_path, 'wb') as f:
+            writer.write(f)
+
+    def tearDown(self):
+        flattened_cache.clear()
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def test_fieldless_template_is_filled_once(self):
+        generator = PDFGenerator(backend=PypdfBackend())
+
+        with patch.object(PypdfBackend, 'fill_in_memory', wraps=generator.backend.fill_in_memory) as fill_in_memory:
+            first = generator.fill_and_concatenate([SADT_TEMPLATE, self.fieldless_path], {'nome_paciente': 'Ana'})
+            second = generator.fill_and_concatenate([SADT_TEMPLATE, self.fieldless_path], {'nome_paciente': 'Bia'})
+
+        filled_paths = [call.args[0] for call in fill_in_memory.call_args_list]
+        self.assertEqual(filled_paths.count(self.fieldless_path), 1)
+        self.assertEqual(filled_paths.count(SADT_TEMPLATE), 2)
+        self.assertEqual(len(PdfReader(io.BytesIO(second)).pages), 2)
+        self.assertIn('Bia', PdfReader(io.BytesIO(second)).pages[0].extract_text())
+        self.assertIn('Ana', PdfReader(io.BytesIO(first)).pages[0].extract_text())
+
+    def test_patient_fields_are_never_cached(self):
+        generator = PDFGenerator(backend=PypdfBackend())
+        template = PDFTemplateRegistry().get(SADT_TEMPLATE)
+
+        self.assertTrue(generator._is_static(template, {'nome_medico': 'Dr. Silva'}))
+        self.assertFalse(generator._is_static(template, {'nome_medico': 'Dr. Silva', 'nome_paciente': 'Ana'}))
+        self.assertFalse(PDFGenerator(backend=PdftkBackend())._is_static(template, {}))
+
+    def test_cache_evicts_least_recently_used(self):
+        cache = FlattenedTemplateCache(max_entries=2)
+        template = PDFTemplateRegistry().get(SADT_TEMPLATE)
+
+        cache.set(template, {'crm': '1'}, 'first')
+        cache.set(template, {'crm': '2'}, 'second')
+        cache.get(template, {'crm': '1'})
+        cache.set(template, {'crm': '3'}, 'third')
+
+        self.assertEqual(cache.get(template, {'crm': '1'}), 'first')
+        self.assertIsNone(cache.get(template, {'crm': '2'}))
@@ -0,0 +1,87 @@
+"""
+Reference Data Testing Module
+
+Tests the per-worker snapshot of diseases, protocols and medications:
+- Repository lookups are served from the snapshot without queries
+- Committed edits reload the snapshot in the worker that made them
+- Edits made by other workers are seen after the check interval
+- Missing CIDs raise DoesNotExist like the queries they replace
+"""
+
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+
+from processos.models import Doenca, Medicamento, Protocolo
+from processos.repositories.domain_repository import DomainRepository
+from processos.repositories.medication_repository import MedicationRepository
+from processos.services.reference_data import GenerationCounter, reference_data
+
+
+@override_settings(REFERENCE_DATA_CACHE_ENABLED=True, REFERENCE_DATA_CHECK_SECONDS=60)
+class TestReferenceData(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.generation_file = os.path.join(self.directory, 'generation')
+        for patcher in (
+            patch.object(reference_data, '_counter', GenerationCounter(self.generation_file)),
+            patch.object(reference_data, '_snapshot', None),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.medicamento = Medicamento.objects.create(nome="Fingolimode", dosagem="0,5mg", apres="28 cápsulas")
+        self.protocolo = Protocolo.objects.create(nome="esclerose_multipla", arquivo="esclerose_multipla.pdf")
+        self.protocolo.medicamentos.add(self.medicamento)
+        self.doenca = Doenca.objects.create(cid="G35", nome="Esclerose Múltipla", protocolo=self.protocolo)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_lookups_served_without_queries(self):
+        reference_data.snapshot()
+
+        with self.assertNumQueries(0):
+            doenca = DomainRepository().get_disease_by_cid("G35")
+            protocolo = DomainRepository().get_protocol_by_cid("G35")
+            medicamentos = MedicationRepository().list_medications_by_cid("G35")
+
+        self.assertEqual(doenca, self.doenca)
+        self.assertIs(doenca.protocolo, protocolo)
+        self.assertEqual(medicamentos, (
+            ("nenhum", "Escolha o medicamento..."),
+            (self.medicamento.id, "Fingolimode 0,5mg - 28 cápsulas"),
+        ))
+
+    def test_committed_edit_reloads_snapshot(self):
+        reference_data.snapshot()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            outro = Medicamento.objects.create(nome="Natalizumabe", dosagem="300mg", apres="1 frasco")
+            self.protocolo.medicamentos.add(outro)
+
+        self.assertEqual(GenerationCounter(self.generation_file).read(), 2)
+        self.assertEqual(len(MedicationRepository().list_medications_by_cid("G35")), 3)
+
+    def test_edit_by_another_worker_seen_after_check_interval(self):
+        reference_data.snapshot()
+        Doenca.objects.filter(pk=self.doenca.pk).update(nome="Esclerose Múltipla Remitente")
+        GenerationCounter(self.generation_file).bump()  # Committed by another worker
+
+        self.assertEqual(DomainRepository().get_disease_by_cid("G35").nome, "Esclerose Múltipla")
+        with override_settings(REFERENCE_DATA_CHECK_SECONDS=0):
+            self.assertEqual(DomainRepository().get_disease_by_cid("G35").nome, "Esclerose Múltipla Remitente")
+
+    def test_missing_cid_raises_does_not_exist(self):
+        Doenca.objects.create(cid="A00", nome="Sem protocolo")
+
+        with self.assertRaises(Doenca.DoesNotExist):
+            DomainRepository().get_disease_by_cid("Z99")
+        with self.assertRaises(Protocolo.DoesNotExist):
+            DomainRepository().get_protocol_by_cid("A00")
+        self.assertEqual(MedicationRepository().list_medications_by_cid("A00"),
+                         (("nenhum", "Nenhum medicamento disponível"),))